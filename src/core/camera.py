@@ -0,0 +1,66 @@
+# Caméra qui suit le joueur : décale l'affichage du level et des entités,
+# et dit quelles entités sont à l'écran (les autres ne sont ni animées ni dessinées)
+from typing import Hashable, Optional, Set, Tuple
+
+import pygame
+
+from settings import CAMERA_SMOOTHING, SIM_RATE
+from world.spatial_grid import SpatialGrid
+
+# Marge autour de l'écran (pixels) : une entité dont la position est juste à côté est quand même dessinée
+# (son sprite dépasse de sa position, et elle est prête quand elle entre dans l'écran)
+CAMERA_MARGIN = 128
+# Taille des cases de la grille des entités, de l'ordre de la taille de l'écran
+ENTITY_GRID_CELL_SIZE = 512
+
+
+class Camera:
+    # Suit une cible (le joueur local) avec un peu de retard, sans sortir du niveau
+
+    def __init__(self, width: int, height: int, level_size: Optional[Tuple[int, int]] = None,
+                 smoothing: float = CAMERA_SMOOTHING):
+        # width, height = taille de l'écran, level_size = taille du niveau en pixels (la caméra n'en sort pas)
+        # smoothing = part du chemin vers la cible faite à chaque tick de simulation (1 = pas de lissage)
+        self.width = width
+        self.height = height
+        self.level_size = level_size
+        self.smoothing = smoothing
+        self.x = 0.0  # Coin haut gauche de ce qu'on voit, en pixels du niveau
+        self.y = 0.0
+        self.has_target = False  # La première cible est prise directement, sans glisser depuis (0, 0)
+
+    def update(self, target_x: float, target_y: float, dt: float):
+        # Rapproche la caméra de la cible (le centre de l'écran), dt = temps écoulé depuis l'image d'avant
+        # En puissance de dt pour que le lissage soit le même quel que soit le nombre d'images par seconde
+        goal_x, goal_y = self._clamp(target_x - self.width / 2, target_y - self.height / 2)
+        if not self.has_target:
+            self.x, self.y = goal_x, goal_y
+            self.has_target = True
+            return
+        factor = 1 - (1 - self.smoothing) ** (dt * SIM_RATE)
+        self.x += (goal_x - self.x) * factor
+        self.y += (goal_y - self.y) * factor
+
+    def _clamp(self, x: float, y: float) -> Tuple[float, float]:
+        # Garde la caméra dans le niveau (collée en haut / à gauche si le niveau est plus petit que l'écran)
+        if self.level_size is None:
+            return x, y
+        level_width, level_height = self.level_size
+        return (max(0.0, min(x, level_width - self.width)) if level_width > self.width else 0.0,
+                max(0.0, min(y, level_height - self.height)) if level_height > self.height else 0.0)
+
+    @property
+    def offset(self) -> Tuple[int, int]:
+        # Décalage à passer aux draw() (en pixels entiers, pour que le niveau et les entités bougent ensemble)
+        return -round(self.x), -round(self.y)
+
+    def viewport(self, margin: int = 0) -> pygame.Rect:
+        # Ce que voit la caméra, en pixels du niveau, agrandi de margin de chaque côté
+        return pygame.Rect(round(self.x) - margin, round(self.y) - margin,
+                           self.width + 2 * margin, self.height + 2 * margin)
+
+    def visible(self, grid: SpatialGrid, margin: int = CAMERA_MARGIN) -> Set[Hashable]:
+        # Les entités de grid dont la position est à l'écran (plus margin) :
+        # on ne regarde que les cases de la grille sous l'écran, pas toutes les entités du niveau
+        view = self.viewport(margin)
+        return grid.query_rect(view.left, view.top, view.right, view.bottom)
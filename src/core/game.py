@@ -1,9 +1,24 @@
+import time
 import pygame
 from settings import *
-from entities.player import Player
-from world.tilemap import TileMap
+from entities.player import Player, input_from_keys, INPUT_RESET
+from world.level import load_tilemap
+from world.spatial_grid import SpatialGrid
+from core.camera import Camera, ENTITY_GRID_CELL_SIZE
 from network.network_manager import NetworkMode, NetworkServer, NetworkClient, PlayerState
-from typing import Dict, Optional
+from network.async_server import AsyncNetworkServer
+from network.process_client import ProcessNetworkClient
+from network.protocol import Codec, Transport, MAX_INPUT_COMMANDS
+from network.send_rate import SendRateController
+from server.game_state import GameState
+from typing import Dict, List, Optional, Tuple
+
+# Nombre max d'inputs gardés pour être rejoués (~2 secondes à 60 ticks/s), au delà le serveur est trop en retard
+MAX_PENDING_INPUTS = 120
+# Net graph (F3) : taille du panneau et RTT correspondant au haut du graphe
+NET_GRAPH_WIDTH = 240
+NET_GRAPH_HEIGHT = 60
+NET_GRAPH_MAX_RTT = 0.25
 
 
 class MultiplayerGame:    
@@ -12,6 +27,8 @@ class MultiplayerGame:
         # Initialisation du jeu multijouieur
         self.screen = screen
         self.clock = pygame.time.Clock()
+        self.sim_dt = 1 / SIM_RATE  # Durée d'un tick de simulation (pas fixe, voir run)
+        self.render_alpha = 1.0  # Avancement entre les deux derniers ticks au moment de l'affichage
         self.font = pygame.font.Font(None, 16)
         self.running = True
         self.network_mode = network_mode
@@ -22,21 +39,44 @@ class MultiplayerGame:
         self.local_player_id: Optional[int] = None  # Notre propre ID
         self.local_player: Optional[Player] = None  # Notre joueur local
         self.remote_players: Dict[int, Player] = {}  # Les joueurs des autres dictionnaire du type {id: Player}
+        self.game_state: Optional[GameState] = None  # (serveur) Simulation des joueurs des clients
+        
+        # Inputs
+        self.current_input = 0  # Touches de cette frame (bitmask INPUT_*)
+        self.reset_requested = False
+        # Prédiction côté client : on applique nos inputs tout de suite sans attendre le serveur,
+        # et on garde ceux que le serveur n'a pas encore simulés pour les rejouer quand il nous corrige
+        self.input_seq = 0
+        self.pending_inputs: List[Tuple[int, int]] = []  # [(seq, touches)]
         
         # World
-        self.tilemap = TileMap()
-        self.colliders = self.tilemap.get_colliders()
+        self.tilemap, spawn = load_tilemap(LEVEL_FILE, LEVEL_STREAMING)
+        
+        # Spawn Point (celui du niveau s'il en a un)
+        self.spawn_x, self.spawn_y = spawn or (100, 100)
         
-        # Spawn Point
-        self.spawn_x = 100
-        self.spawn_y = 100
+        # Caméra, et grille des joueurs distants pour ne dessiner que ceux qu'elle voit
+        self.camera = Camera(*screen.get_size(), level_size=self.tilemap.get_size())
+        self.entity_grid = SpatialGrid(ENTITY_GRID_CELL_SIZE)
+        self.frame_time = 0.0  # Durée de la dernière image (pour le lissage de la caméra)
+        self.visible_players = 0  # Joueurs distants dessinés à la dernière image (debug)
         
         # Timing Sync 
-        self.sync_counter = 0
-        self.sync_interval = 3  # On envoie notre état toutes les 3 frames (~50ms à 60 FPS)
+        # Le client envoie plus ou moins souvent selon son mouvement et l'état du lien (voir network/send_rate.py)
+        # L'hôte envoie ses snapshots à fréquence fixe, comme le serveur dédié
+        # Même budget épuisé on envoie au moins toutes les MAX_INPUT_COMMANDS / 2 ticks : chaque input part
+        # au moins deux fois (un message en porte MAX_INPUT_COMMANDS) avant de sortir de la fenêtre
+        self.send_rate = SendRateController(
+            NETWORK_SEND_RATE_MIN, NETWORK_SEND_RATE_MAX, NETWORK_SEND_BUDGET, PLAYER_DASH_SPEED,
+            max_interval=MAX_INPUT_COMMANDS // 2 / SIM_RATE
+        )
+        self.previous_input = 0  # Touches de la frame d'avant, un changement déclenche un envoi immédiat
+        self.input_changed = False
+        self.snapshot_accumulator = 0.0
         
         # Network Info Display
         self.connection_status = "Initializing..."
+        self.show_net_graph = False  # F3 : RTT, jitter, débits... (client seulement)
         
         self._initialize_network()
     
@@ -44,7 +84,15 @@ class MultiplayerGame:
         """Initialize network based on mode"""
         if self.network_mode == NetworkMode.SERVER:
             # Mode serveur : on crée un serveur
-            self.server = NetworkServer(host='0.0.0.0', port=5555)
+            server_class = AsyncNetworkServer if NETWORK_SERVER_BACKEND == "asyncio" else NetworkServer
+            self.server = server_class(
+                host='0.0.0.0', port=NETWORK_PORT,
+                codec=Codec(NETWORK_CODEC), transport=Transport(NETWORK_TRANSPORT),
+                authoritative=True, interest_radius=SERVER_INTEREST_RADIUS,
+                shared_memory=NETWORK_SHARED_MEMORY
+            )
+            # Le serveur simule lui-même les joueurs des clients à partir de leurs inputs
+            self.game_state = GameState(self.tilemap, self.spawn_x, self.spawn_y)
             
             if self.server.start():
                 self.local_player_id = 0  # Le serveur est toujours le joueur 0
@@ -65,7 +113,12 @@ class MultiplayerGame:
     
     def connect_as_client(self, server_ip: str) -> bool:
         # Renvoie True si connexion réussie, False sinon
-        self.client = NetworkClient(server_ip, port=5555)
+        # Avec NETWORK_CLIENT_PROCESS le client tourne dans un autre process, même API
+        client_class = ProcessNetworkClient if NETWORK_CLIENT_PROCESS else NetworkClient
+        self.client = client_class(
+            server_ip, port=NETWORK_PORT,
+            codec=Codec(NETWORK_CODEC), transport=Transport(NETWORK_TRANSPORT), room=NETWORK_ROOM
+        )
         
         if self.client.connect():
             self.local_player_id = -1  # -1 temporaire, le serveur va nous donner notre vrai ID
@@ -85,6 +138,7 @@ class MultiplayerGame:
         new_players = self.server.get_new_players()
         for player_id in new_players:
             print(f"Player {player_id} joined!")
+            self.game_state.add_player(player_id)
             # +1 car on compte le serveur lui-même
             self.connection_status = f"Players connected: {len(self.server.clients) + 1}"
         
@@ -92,6 +146,7 @@ class MultiplayerGame:
         left_players = self.server.get_left_players()
         for player_id in left_players:
             print(f"Player {player_id} left!")
+            self.game_state.remove_player(player_id)
             # Supprime le joueur de notre liste locale
             if player_id in self.remote_players:
                 del self.remote_players[player_id]
@@ -141,8 +196,9 @@ class MultiplayerGame:
             self.local_player_id = self.client.player_id
             self.connection_status = "Connected to server!"
         
-        # Récupère les états de tous les joueurs distants
-        remote_states = self.client.get_remote_player_states()
+        # Récupère les états de tous les joueurs distants, interpolés entre les snapshots reçus
+        # (sinon ils se téléportent à chaque snapshot et ça saccade)
+        remote_states = self.client.get_interpolated_states()
         
         for player_id, state in remote_states.items():
             # On skip notre propre joueur
@@ -161,6 +217,11 @@ class MultiplayerGame:
             remote_player.health = state.health
             remote_player.direction = state.direction
             remote_player.rect.topleft = (int(remote_player.x), int(remote_player.y))
+        
+        # Supprime les joueurs qui ne sont plus dans les snapshots du serveur (déconnectés)
+        for player_id in list(self.remote_players):
+            if player_id not in remote_states:
+                del self.remote_players[player_id]
     
     def handle_event(self, event):
         # Events pygame
@@ -169,42 +230,115 @@ class MultiplayerGame:
         elif event.type == pygame.KEYDOWN:
             if event.key == pygame.K_ESCAPE:
                 self.running = False
+            elif event.key == pygame.K_F3:
+                self.show_net_graph = not self.show_net_graph
             elif event.key == pygame.K_r:
-                # Reset la position du joueur au spawn
-                if self.local_player:
-                    self.local_player.reset_position(self.spawn_x, self.spawn_y)
+                # Reset la position du joueur au spawn (passe par les inputs pour que le serveur le fasse aussi)
+                self.reset_requested = True
     
     def handle_input(self):
-        # Inputs clavier
-        if self.local_player:
-            keys = pygame.key.get_pressed()
-            self.local_player.handle_input(keys)
+        # Inputs clavier, appliqués au joueur local dans update()
+        keys = pygame.key.get_pressed()
+        self.current_input = input_from_keys(keys)
+        if self.reset_requested:
+            self.current_input |= INPUT_RESET  # Jusqu'au prochain tick (il n'y en a pas forcément à chaque image)
+    
+    def _is_predicting(self) -> bool:
+        # Vrai si c'est le serveur qui simule notre joueur (on prédit en local et il nous corrige)
+        return (self.client is not None and self.client.authoritative
+                and self.local_player_id is not None and self.local_player_id != -1)
+    
+    def _reconcile(self, dt: float):
+        # Applique la dernière correction du serveur puis rejoue par dessus les inputs qu'il n'a pas encore vus
+        ack = self.client.pop_input_ack()
+        if ack is None:
+            return
+        
+        self.pending_inputs = [(seq, buttons) for seq, buttons in self.pending_inputs if seq > ack['seq']]
+        self.local_player.set_sim_state(ack['state'])
+        for _, buttons in self.pending_inputs:
+            self.local_player.apply_input(buttons)
+            self.local_player.update(dt, self.tilemap)
     
     def update(self, dt: float):
-        # Logique d'update de la syncrho
+        # Un tick de simulation (dt = self.sim_dt, toujours le même)
+        if self.client:
+            self.client.poll()  # Relit ce que le réseau a reçu, une seule fois par tick
+        
+        # Positions de départ du tick, pour l'interpolation à l'affichage
+        if self.local_player:
+            self.local_player.store_previous_position()
+        for player in self.remote_players.values():
+            player.store_previous_position()
+        
+        # Niveau en streaming : garde chargé ce qu'il y a autour de notre joueur
+        # (l'hôte donne aussi les joueurs qu'il simule, dans game_state.update)
+        if self.local_player and not self.game_state:
+            self.tilemap.update_focus([(self.local_player.x, self.local_player.y)])
         
         # Met à jour notre joueur local
         if self.local_player:
-            self.local_player.update(dt, self.colliders)
+            predicting = self._is_predicting()
+            if predicting:
+                self._reconcile(dt)
+            
+            self.local_player.apply_input(self.current_input)
+            self.local_player.update(dt, self.tilemap)
+            self.input_changed = self.current_input != self.previous_input
+            self.previous_input = self.current_input
+            
+            if predicting:
+                self.input_seq += 1
+                self.pending_inputs.append((self.input_seq, self.current_input))
+                del self.pending_inputs[:-MAX_PENDING_INPUTS]
+            self.current_input &= ~INPUT_RESET  # Le reset ne compte qu'une fois
+            self.reset_requested = False
         
         # Vérifie les événements réseau et met à jour les joueurs distants
         if self.server:
             self._check_server_events()  # Check qui a rejoint/quitté
+            focus = [(self.local_player.x, self.local_player.y)] if self.local_player else []
+            self.game_state.update(self.server, dt, focus)  # Simule les inputs reçus des clients
+            if self.local_player and self.local_player_id is not None:
+                self.server.set_local_state(self.local_player_id, self._make_local_state())
+            self.server.swap_states()  # Publie les états de ce tick (lus ci-dessous et par broadcast_state)
             self._update_server_players()  # Met à jour les positions des autres
         elif self.client:
             self._update_client_players()  # Met à jour les positions depuis le serveur
+            self.client.send_ping()  # Mesure du RTT (le client limite lui-même la fréquence)
+        
+        # Range les joueurs distants dans la grille (la caméra y cherche ceux à l'écran)
+        self.entity_grid.clear()
+        for player_id, player in self.remote_players.items():
+            self.entity_grid.insert(player_id, player.x, player.y)
         
         # Synchronisation réseau, on envoie pas à chaque frame pour économiser la bande passante
-        self.sync_counter += 1
-        if self.sync_counter >= self.sync_interval:
-            self.sync_counter = 0
-            self._sync_network()  # Envoie notre état sur le réseau
+        if self.server:
+            self.snapshot_accumulator += dt
+            if self.snapshot_accumulator >= 1 / SERVER_SNAPSHOT_RATE:
+                self.snapshot_accumulator -= 1 / SERVER_SNAPSHOT_RATE
+                self._sync_network()  # Envoie l'état de tout le monde aux clients
+        elif self.client and self._should_send(dt):
+            self._sync_network()  # Envoie notre état (ou nos inputs) au serveur
     
-    def _sync_network(self):
-        # Envoie l'état du joueur local sur le réseau
+    def _should_send(self, dt: float) -> bool:
+        # Demande au SendRateController si c'est le moment d'envoyer
         if not self.local_player:
-            return
-        
+            return False
+        stats = self.client.stats
+        rtt = stats.rtt
+        backlog = 0
+        if self.client.authoritative:
+            # Inputs pas acquittés alors qu'ils auraient dû l'être (aller-retour + un envoi), le serveur ne suit pas
+            expected = int(((rtt or 0) + 1 / self.send_rate.rate) * SIM_RATE)
+            backlog = max(0, len(self.pending_inputs) - expected)
+        speed = (self.local_player.velocity_x ** 2 + self.local_player.velocity_y ** 2) ** 0.5
+        return self.send_rate.update(
+            dt, stats.bytes_out, speed, dashing=self.local_player.dash_active,
+            urgent=self.input_changed, rtt=rtt, backlog=backlog
+        )
+    
+    def _make_local_state(self) -> PlayerState:
         # Crée un objet PlayerState avec notre état actuel
         local_state = PlayerState(
             player_id=self.local_player_id or 0,
@@ -215,16 +349,24 @@ class MultiplayerGame:
         local_state.velocity_y = self.local_player.velocity_y
         local_state.health = self.local_player.health
         local_state.direction = self.local_player.direction
+        return local_state
+    
+    def _sync_network(self):
+        # Envoie l'état du joueur local sur le réseau
+        if not self.local_player:
+            return
         
         if self.server:
-            # Si on est serveur : on met à jour notre propre état et on broadcast à tous
-            if self.local_player_id is not None:
-                self.server.player_states[self.local_player_id] = local_state
+            # Si on est serveur : notre état a déjà été publié dans update(), on broadcast à tous
             self.server.broadcast_state()  # Envoie à tous les clients
         
         elif self.client:
-            # Si on est client : on envoie juste notre état au serveur
-            self.client.send_state(local_state)
+            if self.client.authoritative:
+                # Le serveur simule notre joueur : on lui envoie nos inputs pas encore acquittés
+                self.client.send_inputs(self.pending_inputs)
+            else:
+                # Sinon on envoie juste notre état au serveur
+                self.client.send_state(self._make_local_state())
     
     def check_global_collisions(self):
         # Check les collisions globales (pas encore implementé TODO)
@@ -236,19 +378,33 @@ class MultiplayerGame:
         # Background
         self.screen.fill(BLACK)
         
-        # Dessine la carte
-        self.tilemap.draw(self.screen, offset=(0, 0))
+        # La caméra suit notre joueur (sa position affichée, pour ne pas trembler entre deux ticks)
+        if self.local_player:
+            x, y = self.local_player.get_render_position(self.render_alpha)
+            self.camera.update(x + self.local_player.width / 2, y + self.local_player.height / 2, self.frame_time)
+        offset = self.camera.offset
+        
+        # Dessine la carte (seulement les chunks à l'écran)
+        self.tilemap.draw(self.screen, offset=offset)
         
         # Dessine notre joueur local
         if self.local_player:
-            self.local_player.draw(self.screen, offset=(0, 0))
+            self.local_player.update_animation()
+            self.local_player.draw(self.screen, offset=offset, alpha=self.render_alpha)
         
         # Dessine les joueurs distants en cyan pour les distinguer
-        for player_id, player in self.remote_players.items():
-            player.draw(self.screen, offset=(0, 0))
+        # Seulement ceux que voit la caméra : le coût dépend de ce qui est à l'écran, pas du nombre de joueurs
+        visible = self.camera.visible(self.entity_grid)
+        self.visible_players = len(visible)
+        for player_id in visible:
+            player = self.remote_players[player_id]
+            player.update_animation()
+            player.draw(self.screen, offset=offset, alpha=self.render_alpha)
         
         # Dessine les infos de debug
         self._draw_debug_info()
+        if self.show_net_graph and self.client:
+            self._draw_net_graph()
         
         pygame.display.flip()
     
@@ -263,7 +419,7 @@ class MultiplayerGame:
         debug_texts = [
             f"Mode: {self.network_mode.value.upper()}",
             f"Status: {self.connection_status}",
-            f"Remote Players: {len(self.remote_players)}",
+            f"Remote Players: {len(self.remote_players)} ({self.visible_players} on screen)",
             f"ID: {self.local_player_id}",
             f"FPS: {int(self.clock.get_fps())}",
             f"Position: ({state['position'][0]:.1f}, {state['position'][1]:.1f})",
@@ -276,21 +432,77 @@ class MultiplayerGame:
             surf = self.font.render(text, True, WHITE)
             self.screen.blit(surf, (10, 10 + i * 20))
     
+    def _draw_net_graph(self):
+        # Affiche la santé de la connexion en haut à droite : valeurs + graphe du RTT
+        stats = self.client.stats.summary()
+        
+        def ms(value) -> str:
+            return f"{value * 1000:.1f} ms" if value is not None else "-"
+        
+        lines = [
+            f"RTT: {ms(stats['rtt'])}  Jitter: {ms(stats['jitter'])}",
+            f"Clock offset: {ms(stats['clock_offset'])}",
+            f"In: {stats['bytes_in'] / 1024:.1f} KB/s  {stats['messages_in']:.0f} msg/s",
+            f"Out: {stats['bytes_out'] / 1024:.1f} KB/s  {stats['messages_out']:.0f} msg/s",
+            f"Decode: {stats['decode_time_per_message'] * 1e6:.0f} us/msg",
+            f"Snapshot age: {ms(stats['snapshot_age'])}",
+        ]
+        
+        x = WINDOW_WIDTH - NET_GRAPH_WIDTH - 10
+        height = len(lines) * 16 + NET_GRAPH_HEIGHT + 12
+        panel = pygame.Surface((NET_GRAPH_WIDTH, height), pygame.SRCALPHA)
+        panel.fill((0, 0, 0, 160))
+        self.screen.blit(panel, (x, 10))
+        for i, text in enumerate(lines):
+            surf = self.font.render(text, True, WHITE)
+            self.screen.blit(surf, (x + 6, 14 + i * 16))
+        
+        # Une barre par mesure de RTT, verte -> jaune -> rouge quand ça monte
+        bottom = 10 + height - 6
+        history = stats['rtt_history'][-(NET_GRAPH_WIDTH - 12) // 2:]
+        for i, rtt in enumerate(history):
+            ratio = min(rtt / NET_GRAPH_MAX_RTT, 1)
+            bar_height = max(1, int(ratio * NET_GRAPH_HEIGHT))
+            color = GREEN if ratio < 0.4 else YELLOW if ratio < 0.8 else RED
+            pygame.draw.rect(self.screen, color, (x + 6 + i * 2, bottom - bar_height, 2, bar_height))
+    
     def run(self):
         # Boucle principale du jeu
+        # La simulation avance par ticks fixes de sim_dt, autant qu'il en faut pour rattraper le temps écoulé,
+        # l'affichage se fait une fois par tour de boucle (une machine lente affiche moins d'images,
+        # mais le jeu va toujours à la même vitesse et le serveur reçoit le même nombre d'inputs)
+        accumulator = 0.0
+        previous_time = time.perf_counter()
         while self.running:
+            now = time.perf_counter()
+            self.frame_time = now - previous_time
+            accumulator += self.frame_time
+            previous_time = now
+            
             for event in pygame.event.get():
                 self.handle_event(event)
-            
             self.handle_input()
-            self.update(1 / FPS)
-            self.check_global_collisions()
+            
+            steps = 0
+            while accumulator >= self.sim_dt and steps < MAX_SIM_STEPS:
+                self.update(self.sim_dt)
+                self.check_global_collisions()
+                accumulator -= self.sim_dt
+                steps += 1
+            if steps == MAX_SIM_STEPS:
+                # Trop de retard (machine bloquée, fenêtre déplacée...), on abandonne le reste au lieu
+                # de faire encore plus de ticks au prochain tour, et ainsi de suite
+                accumulator = min(accumulator, self.sim_dt)
+            
+            self.render_alpha = accumulator / self.sim_dt
             self.draw()
             
-            self.clock.tick(FPS)
+            # Le vsync attend déjà l'écran, FPS = 0 -> pas de limite
+            self.clock.tick(0 if RENDER_VSYNC else FPS)
         
         # Nettoyage à la fin, ferme les connexions proprement
         if self.server:
             self.server.stop()
         if self.client:
-            self.client.disconnect()
\ No newline at end of file
+            self.client.disconnect()
+        self.tilemap.close()
\ No newline at end of file
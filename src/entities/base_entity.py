@@ -14,6 +14,9 @@ class BaseEntity(pygame.sprite.Sprite):
         # Position et Dimensions
         self.x = float(x)
         self.y = float(y)
+        # Position au tick de simulation d'avant, pour l'affichage entre deux ticks (voir get_render_position)
+        self.previous_x = self.x
+        self.previous_y = self.y
         self.width = width
         self.height = height
         
@@ -40,6 +43,17 @@ class BaseEntity(pygame.sprite.Sprite):
         self.y = y
         self.rect.topleft = (int(self.x), int(self.y))
     
+    def store_previous_position(self):
+        # À appeler au début de chaque tick de simulation
+        self.previous_x = self.x
+        self.previous_y = self.y
+    
+    def get_render_position(self, alpha: float = 1.0) -> Tuple[float, float]:
+        # Position à afficher : entre le tick d'avant (alpha = 0) et le tick actuel (alpha = 1)
+        # (on affiche plus souvent qu'on ne simule, sans ça le mouvement saccade)
+        return (self.previous_x + (self.x - self.previous_x) * alpha,
+                self.previous_y + (self.y - self.previous_y) * alpha)
+    
     def apply_velocity(self, velocity_x: float, velocity_y: float):
         # Applique une vélocité / vitesse à l'entité
         self.velocity_x = velocity_x
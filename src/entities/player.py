@@ -2,6 +2,7 @@
 # Gère les déplacements, sauts, double saut, dash et collisions
 import pygame
 from entities.base_entity import BaseEntity
+from world.tilemap import TileMap
 from settings import (
     PLAYER_WIDTH, PLAYER_HEIGHT, PLAYER_SPEED, PLAYER_ACCELERATION,
     PLAYER_DECELERATION, PLAYER_JUMP_FORCE, PLAYER_FALL_ACCELERATION,
@@ -9,14 +10,45 @@ from settings import (
     PLAYER_DOUBLE_JUMP_ENABLED, PLAYER_DASH_SPEED,
     PLAYER_DASH_DURATION, PLAYER_DASH_COOLDOWN, PLAYER_MAX_HEALTH
 )
-from typing import Optional, List
+from typing import Optional
+
+# Touches du joueur sous forme de bitmask (c'est ce qu'on envoie au serveur, 1 byte par frame)
+INPUT_LEFT = 1
+INPUT_RIGHT = 2
+INPUT_JUMP = 4
+INPUT_DASH = 8
+INPUT_RESET = 16  # Retour au point de spawn (touche R)
+
+# Bits du champ 'flags' de get_sim_state
+_FLAG_GROUNDED = 1
+_FLAG_DOUBLE_JUMP = 2
+_FLAG_DASH_ACTIVE = 4
+_FLAG_DASH_AVAILABLE = 8
+_FLAG_JUMP_PRESSED = 16
+
+
+def input_from_keys(keys) -> int:
+    # Convertit l'état du clavier (pygame.key.get_pressed()) en bitmask INPUT_*
+    buttons = 0
+    if keys[pygame.K_q] or keys[pygame.K_LEFT]:
+        buttons |= INPUT_LEFT
+    elif keys[pygame.K_d] or keys[pygame.K_RIGHT]:
+        buttons |= INPUT_RIGHT
+    if keys[pygame.K_UP] or keys[pygame.K_SPACE]:
+        buttons |= INPUT_JUMP
+    if keys[pygame.K_LSHIFT] or keys[pygame.K_RSHIFT]:
+        buttons |= INPUT_DASH
+    return buttons
 
 
 class Player(BaseEntity):    
-    def __init__(self, x: float, y: float):
+    def __init__(self, x: float, y: float, headless: bool = False):
         # Initialise le joueur à la position donnée
+        # headless=True -> pas de sprite (simulation côté serveur, sans fenêtre)
 
         super().__init__(x, y, PLAYER_WIDTH, PLAYER_HEIGHT)
+        self.spawn_x = x
+        self.spawn_y = y
         
         # État du joueur
         self.health = PLAYER_MAX_HEALTH
@@ -46,28 +78,39 @@ class Player(BaseEntity):
         self.collision_bottom = False
         
         # Apparence (bleu par défaut, à remplacer par sprite)
-        self.sprite = pygame.image.load('src\\assets\\player\\player-0\\0-Standing-0.png').convert_alpha()
+        self.sprite = None
         self.sprite_size = 64
-        self.sprite = pygame.transform.scale(self.sprite, (self.sprite_size, self.sprite_size)) # taille du sprite du personnage
-        self.image = self.sprite
+        if not headless:
+            self.sprite = pygame.image.load('src\\assets\\player\\player-0\\0-Standing-0.png').convert_alpha()
+            self.sprite = pygame.transform.scale(self.sprite, (self.sprite_size, self.sprite_size)) # taille du sprite du personnage
+            self.sprite_flipped = pygame.transform.flip(self.sprite, True, False)  # Regard vers la gauche, fait une seule fois
+            self.image = self.sprite
 
         
     
     def handle_input(self, keys):
         # Traite les entrées du clavier pour le mouvement
         # keys = état des touches du clavier (pygame.key.get_pressed())
+        self.apply_input(input_from_keys(keys))
+    
+    def apply_input(self, buttons: int):
+        # Applique un bitmask de touches INPUT_* (même chose que handle_input, mais sans clavier :
+        # c'est ce que fait le serveur avec les inputs reçus, et le client quand il les rejoue)
+        
+        if buttons & INPUT_RESET:
+            self.reset_position(self.spawn_x, self.spawn_y)
         
         # Mouvement horizontal (Q/D ou flèches)
         self.input_direction = 0
-        if keys[pygame.K_q] or keys[pygame.K_LEFT]:
+        if buttons & INPUT_LEFT:
             self.input_direction = -1
             self.direction = -1
-        elif keys[pygame.K_d] or keys[pygame.K_RIGHT]:
+        elif buttons & INPUT_RIGHT:
             self.input_direction = 1
             self.direction = 1
         
         # Saut (Z/Espace ou flèche haut)
-        if keys[pygame.K_UP] or keys[pygame.K_SPACE]:
+        if buttons & INPUT_JUMP:
             if not self.jump_pressed:
                 self.jump_pressed = True
                 self.jump_buffer_counter = PLAYER_JUMP_BUFFER_TIME
@@ -75,17 +118,14 @@ class Player(BaseEntity):
             self.jump_pressed = False
         
         # Dash (Shift gauche ou droit)
-        if keys[pygame.K_LSHIFT] or keys[pygame.K_RSHIFT]:
+        if buttons & INPUT_DASH:
             self.start_dash()
     
-    def update(self, dt: float, colliders: Optional[List[pygame.Rect]] = None):
+    def update(self, dt: float, tilemap: Optional[TileMap] = None):
         # Met à jour le jouer chaque frame
         # dt = delta time (temps écoulé)
-        # colliders = liste des rectangles de collision
+        # tilemap = le niveau, pour les collisions (None = pas de collisions)
 
-        if colliders is None:
-            colliders = []
-        
         # Mise à jour des compteurs de temps
         self._update_timers()
         
@@ -96,28 +136,37 @@ class Player(BaseEntity):
         self._apply_gravity()
         
         # Appliquer le mouvement et gérer les collisions
-        self._move_and_collide(colliders)
+        if tilemap is None:
+            self.x += self.velocity_x
+            self.y += self.velocity_y
+            self.collision_top = self.collision_bottom = self.is_grounded = False
+        else:
+            self._move_and_collide(tilemap)
         
         # Mise à jour du rect pour le rendu
         self.rect.topleft = (int(self.x), int(self.y))
-
+    
+    def update_animation(self):
+        # Met à jour l'image affichée, seulement pour les joueurs à l'écran (voir core/camera.py)
         # Retourne l'image en fonction de la direction
+        if self.sprite is None:
+            return  # Pas d'affichage (headless)
         if self.direction == -1 :
-            self.image = pygame.transform.flip(self.sprite, True, False)
+            self.image = self.sprite_flipped
         else :
             self.image = self.sprite
     
     
-    def _move_and_collide(self, colliders: List[pygame.Rect]):
+    def _move_and_collide(self, tilemap: TileMap):
         # Déplace le joueur et gère les collisions séparément pour X et Y
-        # colliders = liste des rectangles de collision
+        # On ne teste que les colliders sous le joueur (colliders_overlapping), pas tout le niveau
 
         # Mouvement Horizontal
         self.x += self.velocity_x
         player_rect = self.get_rect()
         
         # Vérifier collisions horizontales et corriger position
-        for collider in colliders:
+        for collider in tilemap.colliders_overlapping(player_rect):
             if not player_rect.colliderect(collider):
                 continue
             
@@ -144,7 +193,7 @@ class Player(BaseEntity):
         self.collision_bottom = False
         
         # Vérifier collisions verticales et corriger position
-        for collider in colliders:
+        for collider in tilemap.colliders_overlapping(player_rect):
             if not player_rect.colliderect(collider):
                 continue
             
@@ -178,10 +227,7 @@ class Player(BaseEntity):
             # Vérifier si on est assis sur quelque chose sans tomber
             test_rect = player_rect.copy()
             test_rect.y += 1  # Vérifier juste en-dessous
-            for collider in colliders:
-                if test_rect.colliderect(collider):
-                    self.is_grounded = True
-                    break
+            self.is_grounded = tilemap.overlaps_solid(test_rect)
     
     def _update_timers(self):
         # Mets à jour les compteurs de délai
@@ -293,15 +339,17 @@ class Player(BaseEntity):
         # Soigne le joueur HAHA
         self.health = min(PLAYER_MAX_HEALTH, self.health + amount)
     
-    def draw(self, surface: pygame.Surface, offset=(0, 0)):
-        render_x = self.x + offset[0] - (self.sprite_size - PLAYER_WIDTH)//2
-        render_y = self.y + offset[1] - (self.sprite_size - PLAYER_HEIGHT)
+    def draw(self, surface: pygame.Surface, offset=(0, 0), alpha: float = 1.0):
+        # alpha = avancement entre le tick de simulation d'avant et l'actuel (voir get_render_position)
+        x, y = self.get_render_position(alpha)
+        render_x = x + offset[0] - (self.sprite_size - PLAYER_WIDTH)//2
+        render_y = y + offset[1] - (self.sprite_size - PLAYER_HEIGHT)
         surface.blit(self.image, (render_x, render_y))
 
         # Dessiner le rectangle du joueur
         draw_rect = self.rect.copy()
-        draw_rect.x += offset[0]
-        draw_rect.y += offset[1]
+        draw_rect.x = int(x) + offset[0]
+        draw_rect.y = int(y) + offset[1]
         pygame.draw.rect(surface, (0, 255, 0), draw_rect, 1)
         
         
@@ -314,6 +362,7 @@ class Player(BaseEntity):
     def reset_position(self, x: float, y: float):
         # Reset la position du joueur aux coordonnées données
         self.set_position(x, y)
+        self.store_previous_position()  # Téléportation : pas d'interpolation depuis l'ancienne position
         self.velocity_x = 0
         self.velocity_y = 0
         self.is_grounded = False
@@ -332,3 +381,51 @@ class Player(BaseEntity):
             'dash_available': self.dash_available,
             'dash_active': self.dash_active,
         }
+    
+    def get_sim_state(self) -> dict:
+        # Tout ce qu'il faut pour reprendre la simulation exactement au même point
+        # (le serveur l'envoie au client, qui repart de là pour rejouer ses inputs)
+        flags = 0
+        if self.is_grounded:
+            flags |= _FLAG_GROUNDED
+        if self.double_jump_available:
+            flags |= _FLAG_DOUBLE_JUMP
+        if self.dash_active:
+            flags |= _FLAG_DASH_ACTIVE
+        if self.dash_available:
+            flags |= _FLAG_DASH_AVAILABLE
+        if self.jump_pressed:
+            flags |= _FLAG_JUMP_PRESSED
+        return {
+            'x': self.x,
+            'y': self.y,
+            'velocity_x': self.velocity_x,
+            'velocity_y': self.velocity_y,
+            'health': self.health,
+            'direction': self.direction,
+            'flags': flags,
+            'coyote_counter': self.coyote_counter,
+            'jump_buffer_counter': self.jump_buffer_counter,
+            'dash_direction': self.dash_direction,
+            'dash_counter': self.dash_counter,
+            'dash_cooldown_counter': self.dash_cooldown_counter,
+        }
+    
+    def set_sim_state(self, state: dict):
+        # Inverse de get_sim_state
+        self.set_position(state['x'], state['y'])
+        self.velocity_x = state['velocity_x']
+        self.velocity_y = state['velocity_y']
+        self.health = state['health']
+        self.direction = state['direction']
+        flags = state['flags']
+        self.is_grounded = bool(flags & _FLAG_GROUNDED)
+        self.double_jump_available = bool(flags & _FLAG_DOUBLE_JUMP)
+        self.dash_active = bool(flags & _FLAG_DASH_ACTIVE)
+        self.dash_available = bool(flags & _FLAG_DASH_AVAILABLE)
+        self.jump_pressed = bool(flags & _FLAG_JUMP_PRESSED)
+        self.coyote_counter = state['coyote_counter']
+        self.jump_buffer_counter = state['jump_buffer_counter']
+        self.dash_direction = state['dash_direction']
+        self.dash_counter = state['dash_counter']
+        self.dash_cooldown_counter = state['dash_cooldown_counter']
@@ -233,7 +233,11 @@ def launch_game():
     pygame.init()
     pygame.mixer.init()
     
-    screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
+    # Le vsync de pygame n'est disponible qu'avec SCALED (ou OPENGL)
+    if RENDER_VSYNC:
+        screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT), pygame.SCALED, vsync=1)
+    else:
+        screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
     pygame.display.set_caption("Abyssal Ascension - Multiplayer")
     
     launcher = Launcher(screen)
@@ -4,10 +4,18 @@ from .network_manager import (
     NetworkServer,
     NetworkClient
 )
+from .async_server import AsyncNetworkServer
+from .process_client import ProcessNetworkClient
+from .protocol import Codec, Transport, MessageType
 
 __all__ = [
     'NetworkMode',
     'PlayerState',
     'NetworkServer',
-    'NetworkClient'
+    'NetworkClient',
+    'AsyncNetworkServer',
+    'ProcessNetworkClient',
+    'Codec',
+    'Transport',
+    'MessageType'
 ]
@@ -0,0 +1,211 @@
+import asyncio
+import threading
+from typing import Dict, Optional
+
+from network.network_manager import NetworkServer, KEYFRAME_INTERVAL
+from network.protocol import Codec, Transport, MessageType, DATAGRAM, ProtocolError, encode_message, decode_message
+from network.utils import FRAME_LENGTH, MAX_FRAME_SIZE, pack_frame
+from network.send_queue import MAX_DROPPED_SNAPSHOTS
+from network.shared_ring import poll_delay
+
+# Au-delà de ces bytes en attente d'envoi pour un client, on ne lui ajoute plus de snapshots (il est en retard)
+MAX_WRITE_BUFFER = 256 * 1024
+
+
+class _DatagramProtocol(asyncio.DatagramProtocol):
+    # Redirige les paquets UDP reçus vers le serveur
+
+    def __init__(self, server: 'AsyncNetworkServer'):
+        self.server = server
+
+    def datagram_received(self, data: bytes, addr: tuple):
+        self.server._handle_datagram(data, addr, self.server.loop_received)
+
+
+class AsyncNetworkServer(NetworkServer):
+    # Même serveur que NetworkServer (même API publique, même protocole) mais avec asyncio :
+    # toutes les connexions sont gérées par UNE seule boucle d'événements dans UN seul thread,
+    # au lieu d'un thread par client. Ça tient des centaines de clients sans se battre pour le GIL
+
+    def __init__(self, host: str = '0.0.0.0', port: int = 5555, codec: Codec = Codec.BINARY,
+                 keyframe_interval: int = KEYFRAME_INTERVAL, transport: Transport = Transport.TCP,
+                 max_players: Optional[int] = None, authoritative: bool = False,
+                 interest_radius: Optional[float] = None, shared_memory: bool = False):
+        super().__init__(
+            host, port, codec, keyframe_interval, transport, max_players, authoritative, interest_radius, shared_memory
+        )
+        self.clients: Dict[int, asyncio.StreamWriter] = {}  # Dictionnaire {id_joueur: writer}
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.thread: Optional[threading.Thread] = None
+        self.udp_transport: Optional[asyncio.DatagramTransport] = None
+        self._stop_event: Optional[asyncio.Event] = None
+        self._tasks = set()  # Une tâche par client connecté
+        self.dropped_snapshots: Dict[int, int] = {}  # {id_joueur: snapshots sautés d'affilée (client trop lent)}
+        self._started = threading.Event()
+        self._start_error: Optional[Exception] = None
+        # Tout est lu dans le thread de la boucle : un seul compteur de bytes reçus (voir ReceiveCounters)
+        self.loop_received = self.received.open()
+
+    def start(self) -> bool:
+        # Lance la boucle asyncio dans son thread et attend que les sockets soient ouverts
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run_loop, daemon=True)
+        self.thread.start()
+        self._started.wait()
+        if self._start_error is not None:
+            print(f"Server error: {self._start_error}")
+            return False
+        return True
+
+    def stop(self):
+        # Stop le serv : la boucle ferme toutes les connexions puis s'arrête
+        self.running = False
+        if self.loop and self._stop_event and self.loop.is_running():
+            self.loop.call_soon_threadsafe(self._stop_event.set)
+        if self.thread:
+            self.thread.join(timeout=2)
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self._serve())
+        finally:
+            self.loop.close()
+
+    async def _serve(self):
+        self._stop_event = asyncio.Event()
+        try:
+            server = await asyncio.start_server(self._handle_connection, self.host, self.port, reuse_address=True)
+            if self.transport == Transport.UDP:
+                self.udp_transport, _ = await self.loop.create_datagram_endpoint(
+                    lambda: _DatagramProtocol(self), local_addr=(self.host, self.port)
+                )
+        except Exception as e:
+            self._start_error = e
+            self._started.set()
+            return
+
+        self.running = True
+        self._started.set()
+        async with server:
+            await self._stop_event.wait()
+            # Ferme tous les clients proprement
+            with self.lock:
+                writers = list(self.clients.values())
+            for writer in writers:
+                writer.close()
+            # Fermer le writer réveille le reader (fin de flux), on laisse les tâches se terminer
+            if self._tasks:
+                await asyncio.wait(self._tasks, timeout=1)
+        with self.lock:
+            shm_task = self.shm_poller
+        if shm_task:
+            shm_task.cancel()
+        self._close_shared_memory()
+        if self.udp_transport:
+            self.udp_transport.close()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        # Équivalent de _accept_connections + _handle_client, pour un client
+        player_id = self._register_client(writer)
+        if player_id is None:
+            writer.close()  # Serveur plein, on refuse
+            return
+        task = asyncio.current_task()
+        self._tasks.add(task)
+        try:
+            # Dit au client comment marche le serveur, puis lui envoie son ID pour qu'il sache qui il est
+            writer.write(pack_frame(encode_message(MessageType.SERVER_INFO, self._server_info(player_id), self.codec)))
+            writer.write(pack_frame(encode_message(MessageType.PLAYER_ID, player_id, self.codec)))
+            offer = self._offer_shared_memory(
+                player_id, writer.get_extra_info('peername')[0], writer.get_extra_info('sockname')[0]
+            )
+            if offer:
+                writer.write(pack_frame(offer))
+            while self.running:
+                # Même format que recv_frame : 4 bytes de taille puis le message
+                raw_length = await reader.readexactly(FRAME_LENGTH.size)
+                length = FRAME_LENGTH.unpack(raw_length)[0]
+                if length > MAX_FRAME_SIZE:
+                    raise ProtocolError(f"Frame too large ({length} bytes)")  # Coupe la connexion
+                payload = await reader.readexactly(length)
+                self.loop_received[0] += len(raw_length) + len(payload)
+                self._handle_message(player_id, *decode_message(payload))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass  # Le client s'est déconnecté
+        except Exception as e:
+            print("Network error:", e)
+        finally:
+            self._tasks.discard(task)
+            self.dropped_snapshots.pop(player_id, None)
+            self._remove_client(player_id)
+
+    def _start_shared_memory_poller(self):
+        # Une tâche de la boucle au lieu d'un thread (appelé depuis _handle_connection, donc dans la boucle)
+        if self.shm_poller is None:
+            self.shm_poller = self.loop.create_task(self._poll_shared_memory_loop())
+
+    async def _poll_shared_memory_loop(self):
+        # Lit les anneaux des clients locaux dans la boucle (pas dans un thread : les réponses écrivent sur les writers)
+        idle_polls = 0
+        while not self._shared_memory_done():
+            if self._poll_shared_memory(self.loop_received):
+                idle_polls = 0
+                await asyncio.sleep(0)  # Laisse passer les autres clients
+            else:
+                await asyncio.sleep(poll_delay(idle_polls))
+                idle_polls += 1
+
+    def _send_to_client(self, player_id: int, msg_type: MessageType, data):
+        # Exécuté dans la boucle (on répond aux messages reçus), on peut écrire directement
+        payload = encode_message(msg_type, data, self.codec)
+        with self.lock:
+            ring = self._shared_memory_ring(player_id)
+            address = self.udp_addresses.get(player_id)
+            writer = self.clients.get(player_id)
+            seq = self.snapshot_seq
+        if ring:
+            packet = pack_frame(payload)
+            if not ring.write(packet):
+                return
+        elif address and self.udp_transport:
+            packet = DATAGRAM.pack(seq, 0, 1) + payload
+            self.udp_transport.sendto(packet, address)
+        elif writer and not writer.is_closing():
+            packet = pack_frame(payload)
+            writer.write(packet)
+        else:
+            return
+        with self.lock:
+            self.bytes_sent += len(packet)
+    
+    def broadcast_state(self):
+        # L'encodage se fait ici (thread du jeu), l'envoi est confié à la boucle asyncio
+        if not self.running:
+            return
+        tcp_out, udp_out = self._encode_snapshot()
+        self._send_shared_memory(tcp_out)  # Pas besoin de la boucle, les anneaux ne bloquent jamais
+        self.loop.call_soon_threadsafe(self._write_snapshot, tcp_out, udp_out)
+
+    def _write_snapshot(self, tcp_out, udp_out):
+        # Exécuté dans la boucle : write() ne bloque jamais, asyncio vide les buffers tout seul
+        # Par contre ces buffers grossissent sans limite si un client ne lit plus, donc on surveille leur taille
+        for player_id, (address, datagrams) in udp_out.items():
+            for datagram in datagrams:
+                self.udp_transport.sendto(datagram, address)
+
+        with self.lock:
+            writers = list(self.clients.items())
+        for player_id, writer in writers:
+            if player_id not in tcp_out or writer.is_closing():
+                continue
+            if writer.transport.get_write_buffer_size() > MAX_WRITE_BUFFER:
+                # Le précédent n'est pas parti, on saute ce snapshot (le prochain le remplacera)
+                dropped = self.dropped_snapshots.get(player_id, 0) + 1
+                self.dropped_snapshots[player_id] = dropped
+                if dropped > MAX_DROPPED_SNAPSHOTS:
+                    print(f"Player {player_id} is too slow, disconnecting")
+                    writer.transport.abort()  # close() attendrait que le buffer soit vidé
+                continue
+            self.dropped_snapshots[player_id] = 0
+            writer.writelines(tcp_out[player_id])
@@ -0,0 +1,68 @@
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+# Les joueurs distants sont affichés un peu dans le passé (INTERPOLATION_DELAY secondes)
+# comme ça on a presque toujours deux snapshots autour du moment affiché et on peut interpoler entre les deux
+# Avec des snapshots à 20 Hz (50 ms), 100 ms de retard = on supporte la perte d'un snapshot
+INTERPOLATION_DELAY = 0.1
+# Si les snapshots arrivent en retard, on prolonge le mouvement pendant ce temps max (en secondes)
+MAX_EXTRAPOLATION = 0.25
+
+# Champs continus qu'on peut interpoler, les autres (santé, direction) sont pris tels quels
+INTERPOLATED_FIELDS = ('x', 'y', 'velocity_x', 'velocity_y')
+
+
+class SnapshotBuffer:
+    # Historique horodaté des états reçus pour UN joueur distant
+
+    def __init__(self, max_size: int = 32):
+        self.snapshots: Deque[Tuple[float, Dict]] = deque(maxlen=max_size)  # (timestamp, état)
+        self.velocity = (0.0, 0.0)  # Vitesse mesurée entre les deux derniers snapshots (pixels/seconde)
+
+    def add(self, timestamp: float, state: Dict):
+        # Ajoute un état reçu à l'instant timestamp (les timestamps doivent croître)
+        if self.snapshots:
+            last_time, last = self.snapshots[-1]
+            if timestamp <= last_time:
+                self.snapshots[-1] = (last_time, dict(state))  # Même instant, on garde le plus récent
+                return
+            elapsed = timestamp - last_time
+            self.velocity = ((state['x'] - last['x']) / elapsed, (state['y'] - last['y']) / elapsed)
+        self.snapshots.append((timestamp, dict(state)))
+
+    def sample(self, render_time: float, max_extrapolation: float = MAX_EXTRAPOLATION) -> Optional[Dict]:
+        # Retourne l'état du joueur à l'instant render_time
+        # Interpolé entre les deux snapshots qui entourent render_time,
+        # ou extrapolé (un peu) si on a rien reçu d'assez récent
+        if not self.snapshots:
+            return None
+
+        # On n'a plus besoin des snapshots plus vieux que celui juste avant render_time
+        while len(self.snapshots) >= 2 and self.snapshots[1][0] <= render_time:
+            self.snapshots.popleft()
+
+        first_time, first = self.snapshots[0]
+        if render_time <= first_time:
+            return dict(first)
+
+        if len(self.snapshots) >= 2:
+            # Cas normal : render_time est entre les deux premiers snapshots
+            next_time, following = self.snapshots[1]
+            alpha = (render_time - first_time) / (next_time - first_time)
+            return _lerp_state(first, following, alpha)
+
+        # Un seul snapshot et il est dans le passé : le suivant est en retard, on extrapole
+        # avec la vitesse qu'on avait, mais pas plus de max_extrapolation pour ne pas partir dans le mur
+        state = dict(first)
+        elapsed = min(render_time - first_time, max_extrapolation)
+        state['x'] += self.velocity[0] * elapsed
+        state['y'] += self.velocity[1] * elapsed
+        return state
+
+
+def _lerp_state(a: Dict, b: Dict, alpha: float) -> Dict:
+    # Mélange deux états : alpha=0 -> a, alpha=1 -> b
+    state = dict(b)
+    for field in INTERPOLATED_FIELDS:
+        state[field] = a[field] + (b[field] - a[field]) * alpha
+    return state
@@ -0,0 +1,129 @@
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+# Un ping toutes les N secondes suffit pour suivre le RTT sans charger la connexion
+PING_INTERVAL = 0.5
+# Nombre de mesures de RTT gardées pour le graphe
+RTT_HISTORY_SIZE = 120
+# Les débits (bytes/s, messages/s) sont calculés sur des fenêtres de cette durée (secondes)
+RATE_WINDOW = 1.0
+# Valeurs brutes copiées par counters() / load_counters(), pour suivre un client qui tourne dans un autre process
+COUNTER_FIELDS = (
+    'bytes_in', 'bytes_out', 'messages_in', 'messages_out', 'decode_time',
+    'rtt', 'last_rtt', 'jitter', 'clock_offset', 'pongs', 'last_snapshot_time'
+)
+
+
+class NetStats:
+    # Compteurs réseau d'UNE connexion
+    # Remplis par les threads réseau (réception) et le jeu (envoi), lus par le jeu pour le net graph
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Totaux depuis la connexion
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.messages_in = 0
+        self.messages_out = 0
+        self.decode_time = 0.0  # Temps passé à décoder les messages reçus (secondes)
+
+        # Ping : RTT lissé, jitter (variation moyenne du RTT) et décalage d'horloge serveur - client
+        self.rtt: Optional[float] = None
+        self.last_rtt: Optional[float] = None
+        self.jitter = 0.0
+        self.clock_offset: Optional[float] = None
+        self.rtt_history: Deque[float] = deque(maxlen=RTT_HISTORY_SIZE)
+        self.pongs = 0  # Nombre de réponses reçues
+        self.last_ping_time = 0.0
+        self.last_snapshot_time: Optional[float] = None
+
+        # Débits calculés sur la dernière fenêtre terminée
+        self.rates = {'bytes_in': 0.0, 'bytes_out': 0.0, 'messages_in': 0.0, 'messages_out': 0.0, 'decode_time': 0.0}
+        self._window_start = time.monotonic()
+        self._window_totals = self._totals()
+
+    def _totals(self) -> Dict[str, float]:
+        return {
+            'bytes_in': self.bytes_in, 'bytes_out': self.bytes_out,
+            'messages_in': self.messages_in, 'messages_out': self.messages_out,
+            'decode_time': self.decode_time,
+        }
+
+    def record_received(self, size: int, decode_time: float):
+        # Un message reçu de size bytes, décodé en decode_time secondes
+        with self.lock:
+            self.bytes_in += size
+            self.messages_in += 1
+            self.decode_time += decode_time
+
+    def record_sent(self, size: int):
+        with self.lock:
+            self.bytes_out += size
+            self.messages_out += 1
+
+    def record_snapshot(self, now: float):
+        # Un snapshot vient d'être appliqué
+        with self.lock:
+            self.last_snapshot_time = now
+
+    def ping_due(self, now: float) -> bool:
+        # Vrai s'il est temps d'envoyer un nouveau ping (et note qu'on l'envoie)
+        with self.lock:
+            if now - self.last_ping_time < PING_INTERVAL:
+                return False
+            self.last_ping_time = now
+            return True
+
+    def record_pong(self, client_time: float, server_time: float, now: float):
+        # Réponse à un ping envoyé à client_time, reçue à now
+        rtt = now - client_time
+        # On suppose que l'aller et le retour prennent le même temps : le serveur a lu son heure à mi-chemin
+        offset = server_time - (client_time + rtt / 2)
+        with self.lock:
+            self.rtt_history.append(rtt)
+            self.pongs += 1
+            if self.rtt is None:
+                self.rtt = rtt
+                self.clock_offset = offset
+            else:
+                # Lissages classiques : RTT comme TCP (1/8), jitter comme RTP (1/16)
+                self.rtt += (rtt - self.rtt) / 8
+                self.jitter += (abs(rtt - self.last_rtt) - self.jitter) / 16
+                self.clock_offset += (offset - self.clock_offset) / 8
+            self.last_rtt = rtt
+
+    def counters(self) -> Dict:
+        # Valeurs brutes (totaux, RTT lissé...), voir COUNTER_FIELDS
+        with self.lock:
+            return {name: getattr(self, name) for name in COUNTER_FIELDS}
+    
+    def load_counters(self, counters: Dict):
+        # Remplace nos valeurs par celles d'un autre NetStats (counters()), les débits se calculent ensuite normalement
+        with self.lock:
+            if counters['pongs'] > self.pongs:
+                self.rtt_history.append(counters['last_rtt'])  # Au pire on rate une mesure, c'est juste pour le graphe
+            for name in COUNTER_FIELDS:
+                setattr(self, name, counters[name])
+    
+    def summary(self, now: Optional[float] = None) -> Dict:
+        # Valeurs à afficher (débits par seconde, temps en secondes)
+        if now is None:
+            now = time.monotonic()
+        with self.lock:
+            elapsed = now - self._window_start
+            if elapsed >= RATE_WINDOW:
+                totals = self._totals()
+                self.rates = {name: (totals[name] - self._window_totals[name]) / elapsed for name in totals}
+                self._window_start = now
+                self._window_totals = totals
+            return {
+                **self.rates,
+                'decode_time_per_message': self.decode_time / self.messages_in if self.messages_in else 0.0,
+                'rtt': self.rtt,
+                'jitter': self.jitter,
+                'clock_offset': self.clock_offset,
+                'snapshot_age': now - self.last_snapshot_time if self.last_snapshot_time is not None else None,
+                'rtt_history': list(self.rtt_history),
+            }
@@ -1,10 +1,32 @@
+import secrets
 import socket
-import json
 import threading
-from typing import Optional, Dict
+import time
+from types import MappingProxyType
+from typing import Optional, Dict, List, Mapping, Set, Tuple
 from enum import Enum
 
 from network.utils import *
+from network.send_queue import ClientSendQueue
+from network.net_stats import NetStats
+from network.shared_ring import SharedRing, client_poller, poll_delay, is_local_peer
+from network.interpolation import SnapshotBuffer, INTERPOLATION_DELAY, MAX_EXTRAPOLATION
+from world.spatial_grid import SpatialGrid
+from network.protocol import (
+    Codec, Transport, MessageType, DATAGRAM, MAX_DATAGRAM_SIZE, MAX_INPUT_COMMANDS,
+    encode_message, decode_message, quantize_fields, diff_states, split_delta
+)
+
+# Nombre de snapshots gardés en mémoire pour servir de baseline aux deltas
+SNAPSHOT_HISTORY_SIZE = 64
+# Toutes les N snapshots on renvoie tout (keyframe), au cas où un client est perdu
+KEYFRAME_INTERVAL = 60
+# Temps max (secondes) pour qu'un serveur de salles nous dise où aller
+JOIN_ROOM_TIMEOUT = 5.0
+# UDP_HELLO renvoyé au plus une fois par UDP_HELLO_INTERVAL secondes, UDP_HELLO_ATTEMPTS fois en tout
+# (au-delà l'UDP ne passe sans doute pas, on reste en TCP)
+UDP_HELLO_INTERVAL = 1.0
+UDP_HELLO_ATTEMPTS = 5
 
 
 class NetworkMode(Enum):
@@ -45,25 +67,179 @@ class PlayerState:
         self.velocity_y = data.get('velocity_y', self.velocity_y)
         self.health = data.get('health', self.health)
         self.direction = data.get('direction', self.direction)
+    
+    def copy(self) -> 'PlayerState':
+        state = PlayerState(self.player_id)
+        state.from_dict(self.to_dict())
+        return state
+
+
+class PlayerStateStore:
+    # États des joueurs en double buffer :
+    # les threads réseau écrivent dans le buffer arrière (avec un petit lock rien qu'à lui),
+    # le jeu lit le buffer avant, une photo figée qu'on remplace d'un coup à chaque tick (swap)
+    # -> le jeu lit sans lock et voit un état cohérent pendant tout le tick
+    
+    def __init__(self):
+        self.lock = threading.Lock()  # Protège seulement le buffer arrière
+        self.back: Dict[int, PlayerState] = {}
+        self.dirty: Set[int] = set()  # Joueurs modifiés (ou ajoutés / supprimés) depuis le dernier swap
+        # Buffer avant : jamais modifié, swap() en crée un nouveau (les lecteurs gardent l'ancien s'ils l'ont déjà)
+        self.front: Mapping[int, PlayerState] = MappingProxyType({})
+    
+    def __contains__(self, player_id: int) -> bool:
+        with self.lock:
+            return player_id in self.back
+    
+    def add(self, player_id: int):
+        with self.lock:
+            self.back[player_id] = PlayerState(player_id)
+            self.dirty.add(player_id)
+    
+    def remove(self, player_id: int):
+        with self.lock:
+            self.back.pop(player_id, None)
+            self.dirty.add(player_id)
+    
+    def update(self, player_id: int, data: Dict) -> bool:
+        # Met à jour un joueur à partir d'un dictionnaire (comme PlayerState.from_dict), False s'il n'existe pas
+        with self.lock:
+            state = self.back.get(player_id)
+            if state is None:
+                return False
+            state.from_dict(data)
+            self.dirty.add(player_id)
+            return True
+    
+    def set(self, player_id: int, state: PlayerState):
+        # Remplace (ou ajoute) l'état d'un joueur
+        with self.lock:
+            self.back[player_id] = state.copy()
+            self.dirty.add(player_id)
+    
+    def swap(self) -> Mapping[int, PlayerState]:
+        # Publie le buffer arrière dans un nouveau buffer avant, retourne ce dernier
+        # On ne recopie que les joueurs qui ont changé, les autres sont partagés avec l'ancien buffer avant
+        with self.lock:
+            if not self.dirty:
+                return self.front
+            front = dict(self.front)
+            for player_id in self.dirty:
+                state = self.back.get(player_id)
+                if state is None:
+                    front.pop(player_id, None)
+                else:
+                    front[player_id] = state.copy()
+            self.dirty.clear()
+            self.front = MappingProxyType(front)
+            return self.front
+
+
+class ReceiveCounters:
+    # Bytes reçus par le serveur, avec un compteur par lecteur (thread d'un client, thread UDP, boucle asyncio...) :
+    # chaque lecteur n'écrit que le sien, sans lock, au lieu de prendre le lock du serveur à chaque message
+    # Le lock (rien qu'à lui) sert seulement à ajouter / retirer un compteur et à faire la somme
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters: List[List[int]] = []  # [bytes] par lecteur actif
+        self.finished = 0  # Total des lecteurs terminés
+    
+    def open(self) -> List[int]:
+        # Nouveau compteur pour un lecteur : counter[0] += n, depuis ce lecteur seulement
+        counter = [0]
+        with self.lock:
+            self.counters.append(counter)
+        return counter
+    
+    def close(self, counter: List[int]):
+        # Le lecteur a fini, son total est gardé
+        with self.lock:
+            self.counters.remove(counter)
+            self.finished += counter[0]
+    
+    def total(self) -> int:
+        with self.lock:
+            return self.finished + sum(counter[0] for counter in self.counters)
 
 
 class NetworkServer:
     # Serveur multijoueur, gère les connexions clients et la synchronisation d'états
     
-    def __init__(self, host: str = '0.0.0.0', port: int = 5555):
+    def __init__(self, host: str = '0.0.0.0', port: int = 5555, codec: Codec = Codec.BINARY,
+                 keyframe_interval: int = KEYFRAME_INTERVAL, transport: Transport = Transport.TCP,
+                 max_players: Optional[int] = None, authoritative: bool = False,
+                 interest_radius: Optional[float] = None, shared_memory: bool = False):
         # Initialise le serveur sur host et port (host:port)
+        # codec = format des messages envoyés (Codec.JSON pour debug, le décodage accepte les deux)
+        # transport = Transport.UDP pour faire passer les états des joueurs en UDP (même port)
+        # max_players = nombre max de clients connectés (None = pas de limite), les suivants sont refusés
+        # authoritative = les clients envoient leurs inputs et c'est le jeu côté serveur qui les simule
+        #                 (pop_inputs / set_simulated_state), sinon les clients envoient directement leur état
+        # interest_radius = chaque client ne reçoit que les joueurs à moins de ce rayon (pixels) de lui,
+        #                   None = tout le monde reçoit tout le monde
+        # shared_memory = les clients sur la même machine échangent les messages non fiables (états, snapshots,
+        #                 inputs, acks, pings) par mémoire partagée au lieu d'UDP / TCP (voir network/shared_ring.py)
         self.host = host
         self.port = port
+        self.codec = codec
+        self.keyframe_interval = keyframe_interval
+        self.transport = transport
+        self.max_players = max_players
+        self.authoritative = authoritative
+        self.interest_radius = interest_radius
+        self.shared_memory = shared_memory
         self.socket: Optional[socket.socket] = None
+        self.udp_socket: Optional[socket.socket] = None
         self.running = False
         self.clients: Dict[int, socket.socket] = {}  # Dictionnaire {id_joueur: socket}
-        self.player_states: Dict[int, PlayerState] = {}  # Dictionnaire {id_joueur: état}
+        self.send_queues: Dict[int, ClientSendQueue] = {}  # File d'envoi TCP de chaque client (son propre thread)
+        # États des joueurs {id_joueur: état}, écrits par les threads réseau, publiés une fois par tick (swap_states)
+        self.state_store = PlayerStateStore()
         self.next_player_id = 1  # Le prochain ID qu'on va donner à un joueur
         self.lock = threading.Lock()  # Pour éviter que 2 threads modifient les données en même temps
         
         # Listes simples pour savoir qui a rejoint/quitté, tu les check dans ta boucle de jeu
         self.new_players = []  # Les joueurs qui viennent d'arriver
         self.left_players = []  # Les joueurs qui viennent de partir
+        
+        # Delta compression : on garde les derniers snapshots envoyés {seq: {id_joueur: champs quantifiés}}
+        # et pour chaque client le dernier snapshot qu'il a acquitté, on lui envoie seulement la différence
+        self.snapshot_seq = 0
+        self.snapshot_history: Dict[int, Dict[int, tuple]] = {}
+        self.client_baselines: Dict[int, int] = {}  # {id_joueur: seq acquitté}, 0 = rien
+        
+        # Zone d'intérêt : grille des positions des joueurs, reconstruite à chaque snapshot
+        # et pour chaque snapshot envoyé, les joueurs que chaque client a reçus {seq: {id_joueur: ids visibles}}
+        # (None = il a tout reçu), pour savoir qui entre et qui sort de sa zone
+        self.interest_grid = SpatialGrid(interest_radius) if interest_radius else None
+        self.snapshot_views: Dict[int, Dict[int, Optional[frozenset]]] = {}
+        
+        # UDP : adresse de chaque joueur (apprise grâce à son UDP_HELLO) et dernier seq reçu de lui
+        # Tant qu'on a pas son adresse, on lui envoie tout en TCP
+        # Le HELLO doit contenir le jeton envoyé au joueur en TCP (SERVER_INFO) : les IDs se devinent,
+        # sans jeton n'importe qui pourrait se faire passer pour un joueur en envoyant un HELLO avec son ID
+        self.udp_tokens: Dict[int, int] = {}
+        self.udp_addresses: Dict[int, tuple] = {}
+        self.udp_players: Dict[tuple, int] = {}
+        self.udp_last_seq: Dict[int, int] = {}
+        
+        # Mémoire partagée : anneaux proposés à chaque client local {id_joueur: (vers le client, vers le serveur)}
+        # et clients qui s'en servent (on a reçu leur SHM_HELLO), pour eux ça remplace UDP
+        self.shm_rings: Dict[int, Tuple[SharedRing, SharedRing]] = {}
+        self.shm_players: Set[int] = set()
+        # Lecteur des anneaux, lancé seulement quand il y en a à lire : un serveur sans client local
+        # ne se réveille pas des milliers de fois par seconde pour rien (il prendrait le GIL au jeu de l'hôte)
+        self.shm_poller = None
+        
+        # Mode autoritaire : inputs reçus pas encore simulés, dernier input reçu, et résultat à renvoyer
+        self.pending_inputs: Dict[int, List[Tuple[int, int]]] = {}  # {id_joueur: [(seq, touches)]}
+        self.last_input_seq: Dict[int, int] = {}
+        self.input_acks: Dict[int, Dict] = {}  # {id_joueur: {'seq', 'state'}}
+        
+        # Compteurs de trafic depuis le démarrage (en bytes, TCP + UDP), pour les stats et les tests de charge
+        self.bytes_sent = 0  # Snapshots et acks préparés pour les clients
+        self.received = ReceiveCounters()  # Voir bytes_received
     
     def start(self) -> bool:
         # Start du serv
@@ -76,11 +252,18 @@ class NetworkServer:
             self.socket.bind((self.host, self.port))
             # On écoute, max 5 connexions en attente
             self.socket.listen(5)
+            
+            if self.transport == Transport.UDP:
+                # Socket UDP sur le même port que le TCP
+                self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                self.udp_socket.bind((self.host, self.port))
             self.running = True
             
             # Lance un thread séparé qui va accepter les connexions en continu
             # daemon=True = le thread meurt quand le programme principal meurt
             threading.Thread(target=self._accept_connections, daemon=True).start()
+            if self.udp_socket:
+                threading.Thread(target=self._receive_datagrams, daemon=True).start()
             return True
         except Exception as e:
             print(f"Server error: {e}")
@@ -91,13 +274,22 @@ class NetworkServer:
         self.running = False
         with self.lock: # On verrouille pour éviter les problèmes de threads (plusieurs modifications en même temps)
             # Ferme tous les sockets des clients proprement
+            for queue in self.send_queues.values():
+                queue.close()
             for client in self.clients.values():
                 try:
                     client.close()
                 except:
                     pass
+        self._close_shared_memory()
         if self.socket:
             self.socket.close()
+        if self.udp_socket:
+            self.udp_socket.close()
+    
+    @property
+    def bytes_received(self) -> int:
+        return self.received.total()
     
     def get_new_players(self):
         # Donne la liste des joueurs qui ont rejoint depuis le dernier check
@@ -121,25 +313,29 @@ class NetworkServer:
                 client_socket, address = self.socket.accept()
 
                 # Si un client se connecte alors le code continue ici
+                player_id = self._register_client(client_socket)
+                if player_id is None:
+                    client_socket.close()  # Serveur plein, on refuse
+                    continue
                 
-                # Donne un ID unique au nouveau joueur
-                player_id = self.next_player_id
-                self.next_player_id += 1
-                
+                # Tout ce qu'on envoie à ce client passe par sa file, comme ça un client lent ne bloque que son thread
+                queue = ClientSendQueue(client_socket)
+                # Dit au client comment marche le serveur, puis lui envoie son ID pour qu'il sache qui il est
+                frames = [
+                    pack_frame(encode_message(MessageType.SERVER_INFO, self._server_info(player_id), self.codec)),
+                    pack_frame(encode_message(MessageType.PLAYER_ID, player_id, self.codec)),
+                ]
+                offer = self._offer_shared_memory(player_id, address[0], client_socket.getsockname()[0])
+                if offer:
+                    frames.append(pack_frame(offer))
+                if not all(queue.put(frame) for frame in frames):
+                    # File plus petite que la poignée de main : le client ne saurait même pas qui il est
+                    print(f"Player {player_id}: send queue too small, disconnecting")
+                    self._remove_client(player_id)
+                    continue
                 with self.lock:
-                    # Enregistre le client et crée son état initial
-                    self.clients[player_id] = client_socket
-                    self.player_states[player_id] = PlayerState(player_id)
-                    self.new_players.append(player_id)  # Ajoute à la liste des nouveaux
-                
-                # Envoie son ID au client pour qu'il sache qui il est
-                try:
-                    identification = json.dumps({'__player_id__': player_id})
-                    #client_socket.send(identification.encode('utf-8'))
-                    send_json(client_socket, {"__player_id__": player_id})
-                except Exception as e:
-                    print("Network error:", e)
-                    break
+                    self.send_queues[player_id] = queue
+                queue.start()
                 
                 # Lance un thread qui va gérer ce client en continu
                 threading.Thread(
@@ -153,143 +349,882 @@ class NetworkServer:
     
     def _handle_client(self, player_id: int, client_socket: socket.socket):
         # Gère les messages reçus d'un client
+        reader = FrameReader(client_socket)
+        counter = self.received.open()
         try:
             while self.running:
-                data = recv_json(client_socket)
-                if data is None:
+                # Un seul recv peut ramener plusieurs messages, on les traite tous
+                frames = reader.read_frames()
+                if frames is None:
                     break
 
-                with self.lock:
-                    if player_id in self.player_states:
-                        self.player_states[player_id].from_dict(data)
+                counter[0] += sum(FRAME_LENGTH.size + len(frame) for frame in frames)
+                for frame in frames:
+                    self._handle_message(player_id, *decode_message(frame))
         except Exception as e:
             print("Network error:", e)
         finally:
             # Quand le client se déconnecte, on nettoie tout
-            with self.lock:
-                if player_id in self.clients:
-                    try:
-                        self.clients[player_id].close()
-                    except:
-                        pass
-                    del self.clients[player_id]
-                if player_id in self.player_states:
-                    del self.player_states[player_id]
-                self.left_players.append(player_id)  # Marque qu'il est parti
+            self.received.close(counter)
+            self._remove_client(player_id)
     
-    def broadcast_state(self):
-        # Envoie l'état de tous les joueurs à tous les clients
+    def _register_client(self, client) -> Optional[int]:
+        # Enregistre un nouveau client et crée son état initial, retourne son ID (None si le serveur est plein)
         with self.lock:
-            # Convertit tous les états en dictionnaires pour l'envoi
-            states = {pid: state.to_dict() for pid, state in self.player_states.items()}
-        
-        # Convertit le tout en JSON (format texte)
-        message = json.dumps(states)
+            if self.max_players is not None and len(self.clients) >= self.max_players:
+                return None
+            
+            # Donne un ID unique au nouveau joueur
+            player_id = self.next_player_id
+            self.next_player_id += 1
+            
+            self.clients[player_id] = client
+            self.udp_tokens[player_id] = secrets.randbits(64)
+            self.state_store.add(player_id)
+            self.client_baselines[player_id] = 0
+            self.new_players.append(player_id)  # Ajoute à la liste des nouveaux
+        return player_id
+    
+    def _remove_client(self, player_id: int):
+        # Oublie tout ce qui concerne un client déconnecté
         with self.lock:
-            # Envoie à tous les clients connectés
-            for player_id, client in list(self.clients.items()):
+            queue = self.send_queues.pop(player_id, None)
+            if queue:
+                queue.close()
+            if player_id in self.clients:
                 try:
-                    #client.send(message.encode('utf-8'))
-                    send_json(client, states)
+                    self.clients[player_id].close()
+                except:
+                    pass
+                del self.clients[player_id]
+            self.state_store.remove(player_id)
+            self.client_baselines.pop(player_id, None)
+            self.udp_tokens.pop(player_id, None)
+            address = self.udp_addresses.pop(player_id, None)
+            self.udp_players.pop(address, None)
+            self.udp_last_seq.pop(player_id, None)
+            for ring in self.shm_rings.pop(player_id, ()):
+                ring.close()
+            self.shm_players.discard(player_id)
+            self.pending_inputs.pop(player_id, None)
+            self.last_input_seq.pop(player_id, None)
+            self.input_acks.pop(player_id, None)
+            self.left_players.append(player_id)  # Marque qu'il est parti
+    
+    def _server_info(self, player_id: int) -> Dict:
+        # Infos envoyées à chaque client à sa connexion (avec son jeton UDP, lui seul le reçoit)
+        with self.lock:
+            return {'authoritative': self.authoritative, 'udp_token': self.udp_tokens.get(player_id, 0)}
+    
+    def _offer_shared_memory(self, player_id: int, peer_host: str, local_host: str) -> Optional[bytes]:
+        # Si le client est sur la même machine, crée ses deux anneaux et retourne le message SHM_OFFER à lui envoyer
+        if not self.shared_memory or not is_local_peer(peer_host, local_host):
+            return None
+        try:
+            rings = (SharedRing.create(), SharedRing.create())
+        except OSError as e:
+            print("Network error:", e)  # Pas de mémoire partagée dispo, il restera sur les sockets
+            return None
+        with self.lock:
+            if player_id not in self.clients:
+                for ring in rings:
+                    ring.close()
+                return None  # Déjà parti
+            self.shm_rings[player_id] = rings
+            self._start_shared_memory_poller()
+        offer = {'to_client': rings[0].name, 'to_server': rings[1].name}
+        return encode_message(MessageType.SHM_OFFER, offer, self.codec)
+    
+    def _close_shared_memory(self):
+        with self.lock:
+            for rings in self.shm_rings.values():
+                for ring in rings:
+                    ring.close()
+            self.shm_rings.clear()
+            self.shm_players.clear()
+    
+    def _start_shared_memory_poller(self):
+        # Lance le thread qui lit les anneaux s'il ne tourne pas déjà (à appeler avec le lock)
+        if self.shm_poller is None:
+            self.shm_poller = threading.Thread(target=self._receive_shared_memory, daemon=True)
+            self.shm_poller.start()
+    
+    def _shared_memory_done(self) -> bool:
+        # Vrai s'il n'y a plus d'anneau à lire : le poller s'arrête, _offer_shared_memory le relancera
+        with self.lock:
+            if self.running and self.shm_rings:
+                return False
+            self.shm_poller = None
+            return True
+    
+    def _receive_shared_memory(self):
+        # Lit les anneaux de tous les clients locaux (un seul thread pour tout le monde, comme l'UDP)
+        idle_polls = 0
+        counter = self.received.open()
+        while not self._shared_memory_done():
+            if self._poll_shared_memory(counter):
+                idle_polls = 0
+            else:
+                time.sleep(poll_delay(idle_polls))
+                idle_polls += 1
+        self.received.close(counter)
+    
+    def _poll_shared_memory(self, counter: List[int]) -> bool:
+        # Traite tout ce que les clients locaux ont écrit depuis la dernière fois, retourne False s'il n'y avait rien
+        # counter = compteur de bytes reçus du lecteur (voir ReceiveCounters)
+        with self.lock:
+            rings = [(player_id, rings[1]) for player_id, rings in self.shm_rings.items()]
+        received = False
+        for player_id, ring in rings:
+            frames = ring.read_frames()
+            if not frames:
+                continue
+            received = True
+            counter[0] += sum(FRAME_LENGTH.size + len(frame) for frame in frames)
+            for frame in frames:
+                try:
+                    msg_type, data = decode_message(frame)
                 except Exception as e:
                     print("Network error:", e)
-                    client.close()
-                    del self.clients[player_id]
+                    continue
+                if msg_type == MessageType.SHM_HELLO:
+                    # Le client lit bien nos anneaux, on ne passe plus que par là pour lui
+                    with self.lock:
+                        if data == player_id and player_id in self.shm_rings:
+                            self.shm_players.add(player_id)
+                    continue
+                self._handle_message(player_id, msg_type, data)
+        return received
     
-    def get_player_states(self) -> Dict[int, PlayerState]:
-        # Retourne l'état de tous les joueurs
+    def _shared_memory_ring(self, player_id: int) -> Optional[SharedRing]:
+        # Anneau vers ce client s'il utilise la mémoire partagée (à appeler avec le lock)
+        if player_id not in self.shm_players:
+            return None
+        return self.shm_rings[player_id][0]
+    
+    def _send_shared_memory(self, tcp_out: Dict[int, List[bytes]]):
+        # Écrit les trames des clients locaux dans leurs anneaux et les retire de tcp_out
+        # (si un anneau est plein le client ne lit plus, le snapshot est perdu comme en UDP)
+        with self.lock:
+            rings = {player_id: self._shared_memory_ring(player_id) for player_id in self.shm_players}
+        for player_id, ring in rings.items():
+            for frame in tcp_out.pop(player_id, ()):
+                ring.write(frame)
+    
+    def _receive_datagrams(self):
+        # Reçoit les messages UDP de tous les clients (un seul thread pour tout le monde)
+        counter = self.received.open()
+        while self.running:
+            try:
+                packet, address = self.udp_socket.recvfrom(65535)
+            except OSError:
+                break  # Socket fermé par stop()
+            self._handle_datagram(packet, address, counter)
+        self.received.close(counter)
+    
+    def _handle_datagram(self, packet: bytes, address: tuple, counter: List[int]):
+        # Traite un paquet UDP reçu d'un client (counter = compteur de bytes reçus du lecteur, voir ReceiveCounters)
+        try:
+            seq = DATAGRAM.unpack_from(packet)[0]
+            msg_type, data = decode_message(memoryview(packet)[DATAGRAM.size:])
+        except Exception as e:
+            print("Network error:", e)
+            return  # Un paquet pourri ne doit pas tuer le serveur
+        
+        counter[0] += len(packet)
+        with self.lock:
+            if msg_type == MessageType.UDP_HELLO:
+                # Le client nous donne son adresse UDP, on ne l'accepte que s'il est connecté en TCP
+                # et qu'il connaît le jeton qu'on lui a envoyé par TCP
+                player_id = data.get('player_id') if isinstance(data, dict) else None
+                token = self.udp_tokens.get(player_id)
+                if token is not None and data.get('token') == token:
+                    old_address = self.udp_addresses.get(player_id)
+                    self.udp_players.pop(old_address, None)
+                    self.udp_addresses[player_id] = address
+                    self.udp_players[address] = player_id
+                return
+            
+            player_id = self.udp_players.get(address)
+            if player_id is None:
+                return  # Inconnu
+            # Les paquets UDP peuvent arriver dans le désordre, on jette ceux qui sont plus vieux
+            if seq <= self.udp_last_seq.get(player_id, 0):
+                return
+            self.udp_last_seq[player_id] = seq
+        
+        self._handle_message(player_id, msg_type, data)
+    
+    def _handle_message(self, player_id: int, msg_type: MessageType, data):
+        # Traite un message reçu d'un client (en TCP, en UDP ou par mémoire partagée)
+        if msg_type == MessageType.PING:
+            # On répond tout de suite avec notre heure, par le même chemin que les snapshots
+            self._send_to_client(player_id, MessageType.PONG, {'client_time': data, 'server_time': time.monotonic()})
+            return
+        
+        if msg_type == MessageType.PLAYER_STATE:
+            # En mode autoritaire on ne croit pas la position envoyée par le client
+            # (pas besoin du gros lock, le store a le sien)
+            if not self.authoritative:
+                self.state_store.update(player_id, data)
+            return
+        
+        with self.lock:
+            if msg_type == MessageType.INPUT_COMMANDS:
+                if not self.authoritative or player_id not in self.clients:
+                    return
+                # Les inputs sont renvoyés tant qu'ils ne sont pas acquittés, on garde seulement les nouveaux
+                last_seq = self.last_input_seq.get(player_id, 0)
+                new_commands = [(seq, buttons) for seq, buttons in data if seq > last_seq]
+                if new_commands:
+                    if new_commands[0][0] > last_seq + 1:
+                        # Des inputs ne sont jamais arrivés (tous les messages qui les portaient perdus) :
+                        # on simule la suite quand même, et l'INPUT_ACK (état complet) recale la prédiction du client
+                        print(f"Player {player_id}: inputs {last_seq + 1}-{new_commands[0][0] - 1} lost, resyncing")
+                    self.pending_inputs.setdefault(player_id, []).extend(new_commands)
+                    self.last_input_seq[player_id] = new_commands[-1][0]
+            elif msg_type == MessageType.SNAPSHOT_ACK:
+                # Le client a reçu ce snapshot, il devient sa nouvelle baseline
+                if data > self.client_baselines.get(player_id, 0):
+                    self.client_baselines[player_id] = data
+    
+    def _send_to_client(self, player_id: int, msg_type: MessageType, data):
+        # Envoie un message à un seul client : par mémoire partagée s'il est local, en UDP si on connaît son adresse,
+        # sinon par sa file TCP
+        payload = encode_message(msg_type, data, self.codec)
+        with self.lock:
+            ring = self._shared_memory_ring(player_id)
+            address = self.udp_addresses.get(player_id)
+            queue = self.send_queues.get(player_id)
+            seq = self.snapshot_seq
+        if ring:
+            frame = pack_frame(payload)
+            if not ring.write(frame):
+                return
+            sent = len(frame)
+        elif address:
+            datagram = DATAGRAM.pack(seq, 0, 1) + payload
+            try:
+                self.udp_socket.sendto(datagram, address)
+            except OSError as e:
+                print("Network error:", e)
+                return
+            sent = len(datagram)
+        elif queue:
+            frame = pack_frame(payload)
+            if not queue.put(frame):
+                # Sa file de messages est pleine : il ne lit plus, on le coupe plutôt que de perdre le message
+                self._disconnect_slow_client(player_id, queue)
+                return
+            sent = len(frame)
+        else:
+            return
+        with self.lock:
+            self.bytes_sent += sent
+    
+    def broadcast_state(self):
+        # Envoie l'état de tous les joueurs à tous les clients
+        # (les états publiés au dernier swap_states, à appeler depuis la boucle de jeu)
+        tcp_out, udp_out = self._encode_snapshot()
+        self._send_shared_memory(tcp_out)
+        
+        # Les paquets UDP ne bloquent pas, pas besoin du lock
+        for player_id, (address, datagrams) in udp_out.items():
+            for datagram in datagrams:
+                try:
+                    self.udp_socket.sendto(datagram, address)
+                except OSError as e:
+                    print("Network error:", e)
+        
+        with self.lock:
+            queues = dict(self.send_queues)
+        # On ne fait que déposer les trames dans les files, ce sont les threads d'envoi qui attendent les clients lents
+        for player_id, frames in tcp_out.items():
+            queue = queues.get(player_id)
+            if queue is None:
+                continue  # Déjà parti
+            if not queue.put_snapshot(frames):
+                self._disconnect_slow_client(player_id, queue)  # Ne lit plus depuis trop longtemps
+    
+    def _disconnect_slow_client(self, player_id: int, queue: ClientSendQueue):
+        # Coupe un client dont la file d'envoi déborde (son thread de réception fait le ménage)
+        # On retire sa file tout de suite : sinon on recommencerait à chaque envoi jusqu'au ménage
+        with self.lock:
+            if self.send_queues.get(player_id) is not queue:
+                return  # Déjà coupé entre temps
+            del self.send_queues[player_id]
+        print(f"Player {player_id} is too slow, disconnecting")
+        queue.close()
+    
+    def _encode_snapshot(self):
+        # Prépare le prochain snapshot pour tous les clients
+        # Chaque client reçoit seulement ce qui a changé depuis son dernier snapshot acquitté
+        # Retourne ({id_joueur: [trames TCP]}, {id_joueur: (adresse, [datagrammes UDP])})
+        # (les clients en mémoire partagée sont dans les trames TCP, même format, voir _send_shared_memory)
+        # Les listes de deux clients qui ont la même baseline contiennent les MÊMES objets bytes
+        # Le buffer avant ne bouge pas pendant qu'on le lit, pas besoin du lock pour ça
+        states = self.state_store.front
+        # Quantifie les états, comme ça un changement invisible sur le réseau ne compte pas
+        current = {pid: quantize_fields(state.to_dict()) for pid, state in states.items()}
+        with self.lock:
+            self.snapshot_seq += 1
+            seq = self.snapshot_seq
+            views = self._compute_views(states)
+            self.snapshot_history[seq] = current
+            self.snapshot_views[seq] = views
+            self.snapshot_history.pop(seq - SNAPSHOT_HISTORY_SIZE, None)
+            self.snapshot_views.pop(seq - SNAPSHOT_HISTORY_SIZE, None)
+            
+            keyframe = seq % self.keyframe_interval == 0
+            baselines = {}
+            groups = {}  # {(baseline, joueurs visibles dans la baseline, joueurs visibles maintenant): [id_joueur]}
+            for player_id in self.clients:
+                base_seq = self.client_baselines.get(player_id, 0)
+                if keyframe or base_seq not in self.snapshot_history or player_id not in self.snapshot_views[base_seq]:
+                    base_seq = 0  # Pas de baseline utilisable -> snapshot complet
+                baselines[player_id] = base_seq
+                base_view = self.snapshot_views[base_seq][player_id] if base_seq else None
+                groups.setdefault((base_seq, base_view, views[player_id]), []).append(player_id)
+            udp_addresses = {
+                pid: address for pid, address in self.udp_addresses.items()
+                if pid in baselines and pid not in self.shm_players
+            }
+            bases = {base_seq: self.snapshot_history.get(base_seq) for base_seq in set(baselines.values())}
+            # Résultat de la simulation des inputs, chaque client reçoit le sien
+            input_acks = {pid: ack for pid, ack in self.input_acks.items() if pid in baselines}
+            self.input_acks.clear()
+        
+        # On encode UNE seule fois par groupe de clients qui ont la même baseline et voient les mêmes joueurs
+        # (sans zone d'intérêt, en général tous les clients) et le même buffer part à tout le groupe
+        frames = {}
+        datagrams = {}
+        for group, player_ids in groups.items():
+            base_seq, base_view, view = group
+            # Un joueur qui entre dans la zone n'est pas dans la baseline filtrée -> envoyé en entier
+            # Un joueur qui sort de la zone n'est plus dans le snapshot filtré -> dans 'removed'
+            base = _visible(bases[base_seq], base_view) if base_seq else None
+            players, removed = diff_states(base, _visible(current, view))
+            delta = {'seq': seq, 'base': base_seq, 'players': players, 'removed': removed}
+            if any(pid not in udp_addresses for pid in player_ids):
+                frames[group] = pack_frame(encode_message(MessageType.DELTA_SNAPSHOT, delta, self.codec))
+            if any(pid in udp_addresses for pid in player_ids):
+                # En UDP on découpe pour que chaque paquet tienne dans le MTU
+                parts = split_delta(delta, MAX_DATAGRAM_SIZE - DATAGRAM.size, self.codec)
+                datagrams[group] = [
+                    DATAGRAM.pack(seq, index, len(parts)) + part for index, part in enumerate(parts)
+                ]
+        
+        tcp_out = {}
+        udp_out = {}
+        for group, player_ids in groups.items():
+            for player_id in player_ids:
+                ack = input_acks.get(player_id)
+                if player_id in udp_addresses:
+                    packets = list(datagrams[group])
+                    if ack is not None:
+                        packets.append(DATAGRAM.pack(seq, 0, 1) + encode_message(MessageType.INPUT_ACK, ack, self.codec))
+                    udp_out[player_id] = (udp_addresses[player_id], packets)
+                else:
+                    packets = [frames[group]]
+                    if ack is not None:
+                        packets.append(pack_frame(encode_message(MessageType.INPUT_ACK, ack, self.codec)))
+                    tcp_out[player_id] = packets
+        
+        sent = sum(len(packet) for packets in tcp_out.values() for packet in packets)
+        sent += sum(len(packet) for _, packets in udp_out.values() for packet in packets)
+        with self.lock:
+            self.bytes_sent += sent
+        return tcp_out, udp_out
+    
+    def _compute_views(self, states: Mapping[int, PlayerState]) -> Dict[int, Optional[frozenset]]:
+        # Pour chaque client, les joueurs qu'il doit recevoir (None = tous)
+        # (à appeler avec le lock)
+        if self.interest_grid is None:
+            return {player_id: None for player_id in self.clients}
+        
+        # On range tous les joueurs dans la grille, puis chaque client ne regarde que les cases autour de lui
+        self.interest_grid.clear()
+        for player_id, state in states.items():
+            self.interest_grid.insert(player_id, state.x, state.y)
+        views = {}
+        for player_id in self.clients:
+            state = states.get(player_id)
+            if state is None:
+                views[player_id] = frozenset()  # Arrivé après le dernier swap, il aura le prochain snapshot
+                continue
+            views[player_id] = frozenset(self.interest_grid.query(state.x, state.y, self.interest_radius))
+        return views
+    
+    def swap_states(self) -> Mapping[int, PlayerState]:
+        # Publie les états reçus depuis le dernier appel, à faire UNE fois par tick au début de la boucle de jeu
+        # get_player_states() et broadcast_state() utilisent ensuite tous les deux cette même version
+        return self.state_store.swap()
+    
+    def get_player_states(self) -> Mapping[int, PlayerState]:
+        # Retourne l'état de tous les joueurs publié au dernier swap_states (lecture seule, sans lock ni copie)
+        return self.state_store.front
+    
+    def set_local_state(self, player_id: int, state: PlayerState):
+        # Met à jour l'état d'un joueur qui n'est pas un client (le joueur de l'hôte), visible au prochain swap
+        self.state_store.set(player_id, state)
+    
+    def pop_inputs(self) -> Dict[int, List[Tuple[int, int]]]:
+        # (mode autoritaire) Donne les inputs reçus depuis le dernier appel {id_joueur: [(seq, touches)]}
         with self.lock:
-            return dict(self.player_states)  # Retourne une copie du dictionnaire
+            inputs = self.pending_inputs
+            self.pending_inputs = {}
+            return inputs
+    
+    def set_simulated_state(self, player_id: int, sim_state: Dict, input_seq: int):
+        # (mode autoritaire) Enregistre l'état d'un joueur après simulation de ses inputs jusqu'à input_seq
+        # Il part dans les snapshots pour les autres, et au joueur lui-même (INPUT_ACK) pour qu'il se corrige
+        if not self.state_store.update(player_id, sim_state):
+            return
+        with self.lock:
+            self.input_acks[player_id] = {'seq': input_seq, 'state': sim_state}
+
+
+def _visible(states: Dict[int, tuple], view: Optional[frozenset]) -> Dict[int, tuple]:
+    # Garde seulement les joueurs de view dans un snapshot (view=None -> tous)
+    if view is None:
+        return states
+    return {player_id: states[player_id] for player_id in view if player_id in states}
 
 
 class NetworkClient:
     # Client réseau pour se connecter au serveur et synchroniser l'état
     
-    def __init__(self, server_ip: str, port: int = 5555):
+    def __init__(self, server_ip: str, port: int = 5555, codec: Codec = Codec.BINARY,
+                 transport: Transport = Transport.TCP, interpolation_delay: float = INTERPOLATION_DELAY,
+                 room: Optional[str] = None):
         # Initiliase le client avec l'IP et port du serveur
+        # interpolation_delay = retard d'affichage des joueurs distants (secondes), voir network/interpolation.py
+        # room = salle à rejoindre si le serveur est un serveur multi-salles (server/room_manager.py),
+        #        "" = n'importe laquelle, None = serveur simple (on s'y connecte directement)
         self.server_ip = server_ip
         self.server_port = port
+        self.room = room
+        self.room_port: Optional[int] = None  # Port de notre salle (donné par le serveur de salles)
+        self.codec = codec
+        self.transport = transport
+        self.interpolation_delay = interpolation_delay
         self.socket: Optional[socket.socket] = None
+        self.udp_socket: Optional[socket.socket] = None
         self.connected = False
         self.player_id: Optional[int] = None  # Notre ID sera donné par le serveur
+        self.authoritative = False  # Le serveur simule nos inputs (il nous le dit à la connexion)
+        self.udp_token = 0  # Jeton à mettre dans nos UDP_HELLO (donné à la connexion)
+        self.input_ack: Optional[Dict] = None  # Dernière correction reçue du serveur, pas encore lue
+        self.last_input_ack_seq = 0
         self.local_player_state: Optional[PlayerState] = None
         self.remote_player_states: Dict[int, PlayerState] = {}  # États de tous les autres joueurs
+        self.snapshot_buffers: Dict[int, SnapshotBuffer] = {}  # Historique horodaté de chaque joueur distant
+        self.stats = NetStats()  # RTT, débits, temps de décodage... (pour le net graph)
         self.lock = threading.Lock()
+        self.send_lock = threading.Lock()  # Le thread de réception envoie aussi (les acks), un seul à la fois
+        
+        # Snapshots reconstruits {seq: {id_joueur: état}}, servent de base pour appliquer les deltas
+        self.snapshot_history: Dict[int, Dict[int, Dict]] = {}
+        self.last_snapshot_seq = 0
+        
+        # UDP : on passe en UDP seulement quand le serveur nous a envoyé un premier paquet
+        self.udp_confirmed = False
+        self.udp_hello_attempts = 0
+        self.last_udp_hello = 0.0
+        self.udp_seq = 0  # seq de nos paquets envoyés
+        self.pending_seq = 0  # Snapshot en cours de reconstitution (s'il est découpé en plusieurs paquets)
+        self.pending_parts: Dict[int, Dict] = {}
+        
+        # Mémoire partagée : si le serveur est sur la même machine il nous propose ses anneaux (SHM_OFFER),
+        # ils remplacent alors UDP pour les messages non fiables
+        self.shm_to_client: Optional[SharedRing] = None
+        self.shm_to_server: Optional[SharedRing] = None
     
     def connect(self) -> bool:
         # Connexion au serveur
         try:
+            port = self.server_port
+            if self.room is not None:
+                port = self._join_room()  # Le serveur de salles nous dit sur quel port est notre salle
+            
             # Crée un socket et se connecte au serveur
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.socket.connect((self.server_ip, self.server_port))
+            self.socket.connect((self.server_ip, port))
+            
+            if self.transport == Transport.UDP:
+                # connect() en UDP = on n'accepte que les paquets du serveur, et send() sans adresse
+                self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                self.udp_socket.connect((self.server_ip, port))
             self.connected = True
             
             # Lance un thread qui va recevoir les messages du serveur en continu
             threading.Thread(target=self._receive_messages, daemon=True).start()
+            if self.udp_socket:
+                threading.Thread(target=self._receive_datagrams, daemon=True).start()
             return True
         except Exception as e:
             print(f"Client connection error: {e}")
             return False
     
+    def _join_room(self) -> int:
+        # Demande au serveur de salles où aller, retourne le port de la salle
+        with socket.create_connection((self.server_ip, self.server_port), timeout=JOIN_ROOM_TIMEOUT) as sock:
+            send_message(sock, MessageType.JOIN_ROOM, self.room, self.codec)
+            message = recv_message(sock)
+        if message is None or message[0] != MessageType.ROOM_REDIRECT or message[1]['port'] == 0:
+            raise ConnectionError("no room available")
+        self.room = message[1]['room']  # Si on a demandé n'importe laquelle, on sait maintenant laquelle
+        self.room_port = message[1]['port']
+        return self.room_port
+    
     def disconnect(self):
         # Déconnexion du serveur
         self.connected = False
         if self.socket:
             try:
-                self.socket.close()
-            except:
+                # shutdown d'abord : close() seul n'envoie rien tant que le thread de réception est bloqué dans recv,
+                # le serveur ne verrait pas qu'on est parti (et garderait nos anneaux de mémoire partagée)
+                self.socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
                 pass
+        for sock in (self.socket, self.udp_socket):
+            if sock:
+                try:
+                    sock.close()
+                except:
+                    pass
+        if self.shm_to_client:
+            client_poller.remove(self.shm_to_client)
+        for ring in (self.shm_to_client, self.shm_to_server):
+            if ring:
+                ring.close()
     
     def is_connected(self) -> bool:
         # Vérifie si le client est toujours connecté
         return self.connected
     
+    def poll(self):
+        # À appeler une fois par frame avant de lire quoi que ce soit (états, acks, stats)
+        # Rien à faire ici, les threads de réception mettent tout à jour (voir ProcessNetworkClient)
+        pass
+    
     def _receive_messages(self):
         # Réception des mises à jour d'état du serveur
+        reader = FrameReader(self.socket)
         try:
             while self.connected:
-                # Attend de recevoir des données du serveur (bloque ici)
-                data = recv_json(self.socket)
-                if data is None:
+                # Attend de recevoir des données du serveur (bloque ici), parfois plusieurs messages d'un coup
+                frames = reader.read_frames()
+                if frames is None:
                     self.disconnect()
                     break
                 
-                # Cas spécial : le serveur nous envoie notre ID
-                if '__player_id__' in data:
-                    with self.lock:
-                        self.player_id = data['__player_id__']
-                    continue  # On passe au prochain message
-                
-                # Sinon c'est une mise à jour des états de tous les joueurs
-                with self.lock:
-                    for player_id_str, state_data in data.items():
-                        player_id = int(player_id_str)  # Convertit la clé en int
-                        if player_id == self.player_id:
-                            continue
-                        # Crée l'état du joueur s'il existe pas encore
-                        if player_id not in self.remote_player_states:
-                            self.remote_player_states[player_id] = PlayerState(player_id)
-                        # Met à jour l'état du joueur
-                        self.remote_player_states[player_id].from_dict(state_data)
+                for frame in frames:
+                    started = time.perf_counter()
+                    message = decode_message(frame)
+                    self.stats.record_received(FRAME_LENGTH.size + len(frame), time.perf_counter() - started)
+                    self._handle_message(*message)
         except Exception as e:
             print("Network error:", e)
             self.disconnect()
     
+    def _receive_datagrams(self):
+        # Réception des snapshots envoyés en UDP
+        while self.connected:
+            try:
+                packet = self.udp_socket.recv(65535)
+            except OSError:
+                break  # Socket fermé par disconnect()
+            
+            try:
+                started = time.perf_counter()
+                seq, part, part_count = DATAGRAM.unpack_from(packet)
+                msg_type, data = decode_message(memoryview(packet)[DATAGRAM.size:])
+                self.stats.record_received(len(packet), time.perf_counter() - started)
+            except Exception as e:
+                print("Network error:", e)
+                continue
+            
+            self.udp_confirmed = True  # Le serveur connaît notre adresse UDP
+            if msg_type != MessageType.DELTA_SNAPSHOT:
+                self._handle_message(msg_type, data)
+                continue
+            
+            # Paquet en retard : on a déjà un snapshot plus récent, on le jette
+            if seq <= self.last_snapshot_seq or seq < self.pending_seq:
+                continue
+            if seq != self.pending_seq:
+                # Nouveau snapshot, on abandonne celui qui n'était pas complet
+                self.pending_seq = seq
+                self.pending_parts = {}
+            self.pending_parts[part] = data
+            if len(self.pending_parts) < part_count:
+                continue
+            
+            # Toutes les parties sont là, on les recolle en un seul delta
+            delta = {'seq': seq, 'base': data['base'], 'players': {}, 'removed': []}
+            for part_data in self.pending_parts.values():
+                delta['players'].update(part_data['players'])
+                delta['removed'].extend(part_data['removed'])
+            self.pending_parts = {}
+            self._handle_message(MessageType.DELTA_SNAPSHOT, delta)
+    
+    def _receive_shared_memory(self, frames: List[memoryview]):
+        # Messages écrits par le serveur dans notre anneau (entiers, dans l'ordre)
+        # Appelé par le thread de client_poller, qui lit les anneaux de tous les clients du process
+        for frame in frames:
+            try:
+                started = time.perf_counter()
+                message = decode_message(frame)
+                self.stats.record_received(FRAME_LENGTH.size + len(frame), time.perf_counter() - started)
+            except Exception as e:
+                print("Network error:", e)
+                continue
+            self._handle_message(*message)
+    
+    def _attach_shared_memory(self, offer: Dict):
+        # Le serveur est sur la même machine : on s'attache à ses anneaux et on lui dit qu'on les lit
+        rings = []
+        try:
+            for name in (offer['to_client'], offer['to_server']):
+                rings.append(SharedRing.attach(name))
+        except (OSError, ValueError) as e:
+            # Ex : serveur dans un autre conteneur, on reste sur les sockets
+            print("Shared memory unavailable:", e)
+            for ring in rings:
+                ring.close()
+            return
+        self.shm_to_client, self.shm_to_server = rings
+        client_poller.add(self.shm_to_client, self._receive_shared_memory)
+        self._send_shared_memory(MessageType.SHM_HELLO, self.player_id)
+    
+    def _handle_message(self, msg_type: MessageType, data):
+        # Traite un message du serveur (reçu en TCP, en UDP ou par mémoire partagée)
+        
+        if msg_type == MessageType.SERVER_INFO:
+            self.authoritative = data['authoritative']
+            self.udp_token = data.get('udp_token', 0)
+            return
+        
+        if msg_type == MessageType.PONG:
+            self.stats.record_pong(data['client_time'], data['server_time'], time.monotonic())
+            return
+        
+        if msg_type == MessageType.SHM_OFFER:
+            self._attach_shared_memory(data)
+            return
+        
+        if msg_type == MessageType.INPUT_ACK:
+            # Résultat de nos inputs simulés par le serveur (peut arriver dans le désordre en UDP)
+            with self.lock:
+                if data['seq'] > self.last_input_ack_seq:
+                    self.last_input_ack_seq = data['seq']
+                    self.input_ack = data
+            return
+        
+        # Cas spécial : le serveur nous envoie notre ID
+        if msg_type == MessageType.PLAYER_ID:
+            with self.lock:
+                self.player_id = data
+            if self.udp_socket:
+                self._send_udp_hello()  # On donne notre adresse UDP au serveur
+            return
+        
+        # Sinon c'est une mise à jour des états de tous les joueurs
+        with self.lock:
+            if msg_type == MessageType.DELTA_SNAPSHOT:
+                # Reconstruit le snapshot complet à partir de la baseline + le delta
+                states = self._apply_delta(data)
+                if states is None:
+                    return  # Baseline inconnue (on attend la prochaine keyframe) ou trop vieux
+            elif msg_type == MessageType.SNAPSHOT:
+                states = data
+            else:
+                return
+            
+            received_at = time.monotonic()
+            self.stats.record_snapshot(received_at)
+            self._apply_states(states, received_at)
+        
+        if msg_type == MessageType.DELTA_SNAPSHOT:
+            try:
+                self._send(MessageType.SNAPSHOT_ACK, data['seq'], unreliable=True)
+            except OSError as e:
+                if self.connected:  # Sinon c'est juste disconnect() qui a fermé le socket entre temps
+                    print("Network error:", e)
+    
+    def _apply_states(self, states: Dict[int, Dict], received_at: float):
+        # Met à jour les joueurs distants avec un snapshot complet reçu à received_at (à appeler avec le lock)
+        for player_id, state_data in states.items():
+            if player_id == self.player_id:
+                continue
+            # Crée l'état du joueur s'il existe pas encore
+            if player_id not in self.remote_player_states:
+                self.remote_player_states[player_id] = PlayerState(player_id)
+                self.snapshot_buffers[player_id] = SnapshotBuffer()
+            # Met à jour l'état du joueur
+            self.remote_player_states[player_id].from_dict(state_data)
+            self.snapshot_buffers[player_id].add(received_at, self.remote_player_states[player_id].to_dict())
+        # Les joueurs absents du snapshot sont partis (ou sortis de notre zone d'intérêt)
+        for player_id in list(self.remote_player_states):
+            if player_id not in states:
+                del self.remote_player_states[player_id]
+                del self.snapshot_buffers[player_id]
+    
+    def _apply_delta(self, delta: Dict) -> Optional[Dict[int, Dict]]:
+        # Applique un delta sur la baseline indiquée, retourne le snapshot complet (ou None si impossible)
+        seq = delta['seq']
+        if seq <= self.last_snapshot_seq:
+            return None  # Vieux snapshot, on a déjà mieux
+        
+        if delta['base'] == 0:
+            states = {}  # Keyframe : on repart de zéro
+        elif delta['base'] in self.snapshot_history:
+            states = dict(self.snapshot_history[delta['base']])
+        else:
+            return None
+        
+        for player_id in delta['removed']:
+            states.pop(player_id, None)
+        for player_id, fields in delta['players'].items():
+            state = dict(states.get(player_id, {'player_id': player_id}))
+            state.update(fields)
+            states[player_id] = state
+        
+        self.snapshot_history[seq] = states
+        # Des seq peuvent manquer, on supprime tout ce qui est trop vieux
+        for old_seq in [old for old in self.snapshot_history if old <= seq - SNAPSHOT_HISTORY_SIZE]:
+            del self.snapshot_history[old_seq]
+        self.last_snapshot_seq = seq
+        return states
+    
+    def _send(self, msg_type: MessageType, data, unreliable: bool = False):
+        # Envoie un message au serveur (thread-safe)
+        # unreliable=True -> passe par la mémoire partagée ou en UDP si possible
+        # (états, acks : si un message est perdu le suivant le remplace)
+        if unreliable and self.shm_to_server:
+            self._send_shared_memory(msg_type, data)
+            return
+        if unreliable and self.udp_socket:
+            if self.udp_confirmed:
+                self._send_datagram(msg_type, data)
+                return
+            # Le serveur n'a peut-être pas reçu notre HELLO, on le renvoie et on passe par TCP en attendant
+            if self.player_id is not None:
+                self._retry_udp_hello()
+        payload = encode_message(msg_type, data, self.codec)
+        with self.send_lock:
+            send_frame(self.socket, payload)
+        self.stats.record_sent(FRAME_LENGTH.size + len(payload))
+    
+    def _send_datagram(self, msg_type: MessageType, data):
+        # Envoie un message en UDP avec un numéro de séquence (le serveur jette les paquets en retard)
+        payload = encode_message(msg_type, data, self.codec)
+        with self.send_lock:
+            self.udp_seq += 1
+            self.udp_socket.send(DATAGRAM.pack(self.udp_seq, 0, 1) + payload)
+        self.stats.record_sent(DATAGRAM.size + len(payload))
+    
+    def _send_udp_hello(self):
+        # Donne notre adresse UDP au serveur, avec le jeton qui prouve qu'on est bien ce joueur
+        self.udp_hello_attempts += 1
+        self.last_udp_hello = time.monotonic()
+        self._send_datagram(MessageType.UDP_HELLO, {'player_id': self.player_id, 'token': self.udp_token})
+    
+    def _retry_udp_hello(self):
+        # Renvoie le HELLO sans inonder le serveur, et abandonne l'UDP après UDP_HELLO_ATTEMPTS essais
+        if self.udp_hello_attempts > UDP_HELLO_ATTEMPTS:
+            return
+        if time.monotonic() - self.last_udp_hello < UDP_HELLO_INTERVAL:
+            return
+        if self.udp_hello_attempts == UDP_HELLO_ATTEMPTS:
+            print(f"No UDP reply after {UDP_HELLO_ATTEMPTS} hellos, staying on TCP")
+            self.udp_hello_attempts += 1
+            return
+        self._send_udp_hello()
+    
+    def _send_shared_memory(self, msg_type: MessageType, data):
+        # Écrit un message dans l'anneau vers le serveur (perdu s'il est plein, comme un paquet UDP)
+        frame = pack_frame(encode_message(msg_type, data, self.codec))
+        if self.shm_to_server.write(frame):
+            self.stats.record_sent(len(frame))
+    
     def send_state(self, player_state: PlayerState):
         # Envoie l'état local du joueur au serveur
-        if not self.connected:
+        # On attend d'avoir reçu notre ID, le serveur sait de toute façon qui envoie
+        if not self.connected or self.player_id is None:
             return
         
         try:
-            # Convertit notre état en JSON et l'envoie au serveur
-            message = json.dumps(player_state.to_dict())
-            #self.socket.send(message.encode('utf-8'))
-            send_json(self.socket, player_state.to_dict())
+            # Encode notre état (binaire compact par défaut) et l'envoie au serveur
+            self._send(MessageType.PLAYER_STATE, player_state.to_dict(), unreliable=True)
         except Exception as e:
             print("Network error:", e)
             self.disconnect()
     
+    def send_inputs(self, commands: List[Tuple[int, int]]):
+        # (serveur autoritaire) Envoie nos inputs pas encore acquittés [(seq, touches)] au serveur
+        if not self.connected or self.player_id is None or not commands:
+            return
+        
+        # Un message en contient au plus MAX_INPUT_COMMANDS : s'il y en a plus (pas d'envoi depuis longtemps,
+        # voir SendRateController), on envoie plusieurs messages, les plus vieux d'abord, sinon le serveur
+        # ne verrait jamais les plus anciens. Le dernier message a toujours les MAX_INPUT_COMMANDS plus récents
+        batches = [commands[max(0, end - MAX_INPUT_COMMANDS):end] for end in range(len(commands), 0, -MAX_INPUT_COMMANDS)]
+        try:
+            for batch in reversed(batches):
+                self._send(MessageType.INPUT_COMMANDS, batch, unreliable=True)
+        except Exception as e:
+            print("Network error:", e)
+            self.disconnect()
+    
+    def send_ping(self):
+        # Envoie un ping au serveur si le dernier date de plus de PING_INTERVAL (on peut l'appeler à chaque frame)
+        # Par le même chemin que les états (UDP si possible), pour mesurer le vrai délai des snapshots
+        if not self.connected or self.player_id is None:
+            return
+        now = time.monotonic()
+        if not self.stats.ping_due(now):
+            return
+        
+        try:
+            self._send(MessageType.PING, now, unreliable=True)
+        except Exception as e:
+            print("Network error:", e)
+            self.disconnect()
+    
+    def server_time(self) -> Optional[float]:
+        # Heure actuelle du serveur (son time.monotonic()) estimée grâce aux pings, None tant qu'on a pas de mesure
+        offset = self.stats.clock_offset
+        return time.monotonic() + offset if offset is not None else None
+    
+    def pop_input_ack(self) -> Optional[Dict]:
+        # (serveur autoritaire) Dernière correction du serveur {'seq', 'state'} pas encore lue, sinon None
+        with self.lock:
+            ack = self.input_ack
+            self.input_ack = None
+            return ack
+    
     def get_remote_player_states(self) -> Dict[int, PlayerState]:
         # Retourne l'état de tous les joueurs
         with self.lock:
-            return dict(self.remote_player_states)  # Retourne une copie
\ No newline at end of file
+            return dict(self.remote_player_states)  # Retourne une copie
+    
+    def get_interpolated_states(self, now: Optional[float] = None) -> Dict[int, PlayerState]:
+        # Retourne l'état de tous les joueurs distants tel qu'il faut l'afficher maintenant :
+        # interpolé entre deux snapshots, interpolation_delay secondes dans le passé
+        # (ou un peu extrapolé si les paquets sont en retard)
+        if now is None:
+            now = time.monotonic()
+        render_time = now - self.interpolation_delay
+        
+        states = {}
+        with self.lock:
+            for player_id, buffer in self.snapshot_buffers.items():
+                sample = buffer.sample(render_time, MAX_EXTRAPOLATION)
+                if sample is None:
+                    continue
+                state = PlayerState(player_id)
+                state.from_dict(sample)
+                states[player_id] = state
+        return states
\ No newline at end of file
@@ -0,0 +1,286 @@
+import math
+import multiprocessing
+import struct
+import threading
+import time
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+
+from network.network_manager import NetworkClient
+from network.interpolation import INTERPOLATION_DELAY
+from network.net_stats import COUNTER_FIELDS
+from network.protocol import Codec, Transport, MessageType, INPUT_ACK, SIM_STATE_FIELDS, encode_message, decode_message
+from network.shared_ring import SharedRing, poll_delay
+from network.utils import pack_frame
+
+# Client réseau dans un process à part : les threads de réception (décodage, deltas, UDP...) ne prennent plus
+# le GIL au rendu. Le process réseau écrit les états décodés dans une table en mémoire partagée, le jeu la lit
+# une fois par frame (poll). Dans l'autre sens le jeu écrit ses messages (état, inputs, pings) dans un SharedRing
+
+# Joueurs distants max dans la table partagée
+MAX_SHARED_PLAYERS = 256
+# Le process réseau republie ses stats (débits, RTT) au moins toutes les N secondes
+STATS_PUBLISH_INTERVAL = 0.05
+# Temps max pour lancer le process réseau et se connecter au serveur (secondes)
+CONNECT_TIMEOUT = 10.0
+# Essais de lecture de la table avant d'abandonner pour cette frame (le process réseau est mort en pleine écriture)
+MAX_READ_ATTEMPTS = 1000
+
+# État de la connexion dans la table
+STATUS_CONNECTING = 0
+STATUS_CONNECTED = 1
+STATUS_CLOSED = 2
+
+# Table partagée : un compteur de version (seqlock : impair = écriture en cours), les infos du client,
+# la dernière correction du serveur (même format que le message INPUT_ACK), puis un emplacement par joueur distant
+# Ordre natif : les deux process sont sur la même machine. NaN = None pour les floats
+VERSION = struct.Struct("=Q")
+INFO_FIELDS = ('status', 'authoritative', 'player_id', 'snapshot_count', 'received_at', 'player_count') + COUNTER_FIELDS
+INFO = struct.Struct("=BBiIdIQQQQdddddQd")
+SNAPSHOT_COUNT_INDEX = INFO_FIELDS.index('snapshot_count')
+PLAYER_COUNT_INDEX = INFO_FIELDS.index('player_count')
+SLOT_FIELDS = ('player_id', 'x', 'y', 'velocity_x', 'velocity_y', 'health', 'direction')
+SLOT = struct.Struct("=Hddddib")
+INFO_OFFSET = VERSION.size
+ACK_OFFSET = INFO_OFFSET + INFO.size
+SLOTS_OFFSET = ACK_OFFSET + INPUT_ACK.size
+TABLE_SIZE = SLOTS_OFFSET + MAX_SHARED_PLAYERS * SLOT.size
+
+
+class SharedClientTable:
+    # Ce que le process réseau sait (connexion, stats, joueurs distants), lisible par le jeu sans lock ni copie réseau
+    # Un seul écrivain (le process réseau), un seul lecteur (le jeu)
+
+    def __init__(self, memory: shared_memory.SharedMemory, owner: bool):
+        self.memory = memory
+        self.owner = owner
+
+    @classmethod
+    def create(cls) -> 'SharedClientTable':
+        memory = shared_memory.SharedMemory(create=True, size=TABLE_SIZE)
+        memory.buf[:TABLE_SIZE] = bytes(TABLE_SIZE)
+        return cls(memory, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> 'SharedClientTable':
+        # Le process réseau est lancé en spawn par le jeu, il partage son resource_tracker : rien à désinscrire
+        return cls(shared_memory.SharedMemory(name=name), owner=False)
+
+    @property
+    def name(self) -> str:
+        return self.memory.name
+
+    def write(self, info: Dict, ack: Optional[tuple] = None, slots: Optional[List[tuple]] = None):
+        # Publie info (voir INFO_FIELDS), et si donnés la dernière correction et les joueurs distants
+        buffer = self.memory.buf
+        version = VERSION.unpack_from(buffer)[0] + 1
+        VERSION.pack_into(buffer, 0, version)  # Impair : le lecteur sait qu'il doit attendre
+        INFO.pack_into(buffer, INFO_OFFSET, *(math.nan if info[name] is None else info[name] for name in INFO_FIELDS))
+        if ack is not None:
+            INPUT_ACK.pack_into(buffer, ACK_OFFSET, *ack)
+        if slots is not None:
+            for index, slot in enumerate(slots):
+                SLOT.pack_into(buffer, SLOTS_OFFSET + index * SLOT.size, *slot)
+        VERSION.pack_into(buffer, 0, version + 1)
+
+    def read(self, known_snapshot: int) -> Optional[Tuple[Dict, tuple, Optional[List[tuple]]]]:
+        # Retourne (info, correction, joueurs distants), les joueurs seulement si le snapshot n'est plus known_snapshot
+        # None si la table est restée en cours d'écriture trop longtemps
+        buffer = self.memory.buf
+        for _ in range(MAX_READ_ATTEMPTS):
+            version = VERSION.unpack_from(buffer)[0]
+            if version & 1:
+                time.sleep(0)
+                continue
+            info = INFO.unpack_from(buffer, INFO_OFFSET)
+            ack = INPUT_ACK.unpack_from(buffer, ACK_OFFSET)
+            raw_slots = None
+            if info[SNAPSHOT_COUNT_INDEX] != known_snapshot:
+                raw_slots = bytes(buffer[SLOTS_OFFSET:SLOTS_OFFSET + info[PLAYER_COUNT_INDEX] * SLOT.size])
+            if VERSION.unpack_from(buffer)[0] != version:
+                continue  # Écrit pendant qu'on lisait, on recommence
+            info = {
+                name: None if isinstance(value, float) and math.isnan(value) else value
+                for name, value in zip(INFO_FIELDS, info)
+            }
+            slots = list(SLOT.iter_unpack(raw_slots)) if raw_slots is not None else None
+            return info, ack, slots
+        return None
+
+    def close(self):
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+
+class _NetworkProcessClient(NetworkClient):
+    # Le vrai client, dans le process réseau : publie dans la table tout ce qui change
+
+    def __init__(self, table: SharedClientTable, *args):
+        super().__init__(*args)
+        self.table = table
+        self.publish_lock = threading.Lock()  # Plusieurs threads de réception publient
+        self.snapshot_count = 0  # Snapshots appliqués (publiés)
+        self.published_players = 0
+
+    def _handle_message(self, msg_type: MessageType, data):
+        last_snapshot_time = self.stats.last_snapshot_time
+        super()._handle_message(msg_type, data)
+        if self.stats.last_snapshot_time != last_snapshot_time:
+            self.publish(states_changed=True)  # Un snapshot vient d'être appliqué
+        elif msg_type in (MessageType.INPUT_ACK, MessageType.PLAYER_ID, MessageType.SERVER_INFO, MessageType.PONG):
+            self.publish()
+
+    def publish(self, states_changed: bool = False):
+        # Écrit notre état actuel dans la table (et les joueurs distants si states_changed)
+        with self.publish_lock:
+            slots = None
+            with self.lock:
+                if states_changed:
+                    self.snapshot_count += 1
+                    slots = [
+                        (pid, state.x, state.y, state.velocity_x, state.velocity_y, state.health, state.direction)
+                        for pid, state in self.remote_player_states.items()
+                    ][:MAX_SHARED_PLAYERS]
+                    self.published_players = len(slots)
+                ack = self.input_ack
+                info = {
+                    'status': STATUS_CONNECTED if self.connected else STATUS_CLOSED,
+                    'authoritative': self.authoritative,
+                    'player_id': self.player_id if self.player_id is not None else -1,
+                    'snapshot_count': self.snapshot_count,
+                    'received_at': self.stats.last_snapshot_time or 0.0,
+                    'player_count': self.published_players,
+                    **self.stats.counters(),
+                }
+            ack_values = (ack['seq'], *(ack['state'][name] for name in SIM_STATE_FIELDS)) if ack else None
+            self.table.write(info, ack_values, slots)
+
+
+def _network_process_main(table_name: str, commands_name: str, stop_event, client_args: tuple):
+    # Point d'entrée du process réseau : connecte le client, puis envoie au serveur ce que le jeu écrit dans le ring
+    table = SharedClientTable.attach(table_name)
+    commands = SharedRing.attach(commands_name)
+    client = _NetworkProcessClient(table, *client_args)
+    try:
+        if not client.connect():
+            return
+        parent = multiprocessing.parent_process()
+        idle_polls = 0
+        next_publish = 0.0
+        while client.connected:
+            frames = commands.read_frames()
+            for frame in frames:
+                try:
+                    client._send(*decode_message(frame), unreliable=True)
+                except Exception as e:
+                    print("Network error:", e)
+                    client.disconnect()
+
+            now = time.monotonic()
+            if now >= next_publish:
+                # Le jeu a fermé le client (ou est mort sans prévenir) -> on s'arrête
+                if stop_event.is_set() or not parent.is_alive():
+                    break
+                client.publish()  # Pour les stats (ce qu'on vient d'envoyer)
+                next_publish = now + STATS_PUBLISH_INTERVAL
+            if frames:
+                idle_polls = 0
+            else:
+                time.sleep(poll_delay(idle_polls))
+                idle_polls += 1
+    except KeyboardInterrupt:
+        pass
+    finally:
+        client.disconnect()
+        client.publish()  # status = STATUS_CLOSED
+        commands.close()
+        table.close()
+
+
+class ProcessNetworkClient(NetworkClient):
+    # Même API que NetworkClient pour le jeu, mais le client tourne dans un process réseau à part
+    # Il faut appeler poll() une fois par frame : c'est là qu'on relit la table (états, corrections, stats)
+
+    def __init__(self, server_ip: str, port: int = 5555, codec: Codec = Codec.BINARY,
+                 transport: Transport = Transport.TCP, interpolation_delay: float = INTERPOLATION_DELAY,
+                 room: Optional[str] = None):
+        super().__init__(server_ip, port, codec, transport, interpolation_delay, room)
+        self.process: Optional[multiprocessing.Process] = None
+        self.table: Optional[SharedClientTable] = None
+        self.commands: Optional[SharedRing] = None  # Messages du jeu vers le process réseau
+        self.stop_event = None
+        self.snapshot_count = 0  # Dernier snapshot lu dans la table
+
+    def connect(self) -> bool:
+        # Lance le process réseau et attend qu'il soit connecté (ou qu'il ait échoué)
+        # spawn : on ne copie pas le process du jeu (pygame, fenêtre, threads)
+        context = multiprocessing.get_context("spawn")
+        self.table = SharedClientTable.create()
+        self.commands = SharedRing.create()
+        self.stop_event = context.Event()
+        client_args = (self.server_ip, self.server_port, self.codec, self.transport, self.interpolation_delay, self.room)
+        self.process = context.Process(
+            target=_network_process_main,
+            args=(self.table.name, self.commands.name, self.stop_event, client_args),
+            daemon=True
+        )
+        self.process.start()
+
+        deadline = time.monotonic() + CONNECT_TIMEOUT
+        while time.monotonic() < deadline:
+            status = self._read_table()
+            if status is not None and status != STATUS_CONNECTING:
+                break
+            if not self.process.is_alive():
+                break
+            time.sleep(0.01)
+        if not self.connected:
+            self.disconnect()  # Le process réseau a déjà affiché pourquoi
+            return False
+        return True
+
+    def disconnect(self):
+        self.connected = False
+        if self.process is None:
+            return
+        self.stop_event.set()
+        self.process.join(timeout=2)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process = None
+        self.commands.close()
+        self.table.close()
+
+    def poll(self):
+        # Récupère ce que le process réseau a reçu depuis la dernière frame
+        if self.process is None:
+            return
+        self._read_table()
+        if not self.process.is_alive():
+            self.connected = False
+
+    def _read_table(self) -> Optional[int]:
+        # Recopie la table dans nos attributs (ceux de NetworkClient), retourne l'état de la connexion
+        result = self.table.read(self.snapshot_count)
+        if result is None:
+            return None
+        info, ack, slots = result
+        with self.lock:
+            self.connected = info['status'] == STATUS_CONNECTED
+            self.player_id = info['player_id'] if info['player_id'] >= 0 else None
+            self.authoritative = bool(info['authoritative'])
+            if ack[0] > self.last_input_ack_seq:
+                self.last_input_ack_seq = ack[0]
+                self.input_ack = {'seq': ack[0], 'state': dict(zip(SIM_STATE_FIELDS, ack[1:]))}
+            if slots is not None:
+                self.snapshot_count = info['snapshot_count']
+                states = {slot[0]: dict(zip(SLOT_FIELDS, slot)) for slot in slots}
+                self._apply_states(states, info['received_at'])
+        self.stats.load_counters(info)
+        return info['status']
+
+    def _send(self, msg_type: MessageType, data, unreliable: bool = False):
+        # Tout passe par le process réseau (il choisit TCP / UDP / mémoire partagée)
+        # Ring plein = le process réseau ne suit plus, le message est perdu comme un paquet UDP
+        self.commands.write(pack_frame(encode_message(msg_type, data)))
@@ -0,0 +1,434 @@
+import json
+import struct
+from enum import Enum, IntEnum
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Protocole binaire du jeu
+# Chaque message = 1 byte de version + 1 byte de type + le contenu (schéma fixe par type)
+# Le mode JSON est gardé pour le debug : un message JSON commence toujours par '{'
+# donc le décodeur reconnaît tout seul le format, pas besoin que les deux côtés soient d'accord
+
+PROTOCOL_VERSION = 1
+
+
+class Codec(Enum):
+    BINARY = "binary"
+    JSON = "json"  # Lisible à l'oeil nu, pour debug
+
+
+class Transport(Enum):
+    TCP = "tcp"  # Tout passe par la connexion TCP
+    UDP = "udp"  # Les états des joueurs passent en UDP (pas de blocage si un paquet est perdu)
+
+
+class MessageType(IntEnum):
+    PLAYER_ID = 1      # Serveur -> client : ton ID
+    PLAYER_STATE = 2   # Client -> serveur : mon état
+    SNAPSHOT = 3       # Serveur -> clients : état de tous les joueurs
+    DELTA_SNAPSHOT = 4 # Serveur -> client : seulement ce qui a changé depuis un snapshot acquitté
+    SNAPSHOT_ACK = 5   # Client -> serveur : "j'ai bien reçu le snapshot n°seq"
+    UDP_HELLO = 6      # Client -> serveur (UDP) : "mon adresse UDP c'est celle-ci, je suis le joueur X (preuve : mon jeton)"
+    SERVER_INFO = 7    # Serveur -> client (à la connexion) : comment marche ce serveur
+    INPUT_COMMANDS = 8 # Client -> serveur : mes dernières touches appuyées, numérotées
+    INPUT_ACK = 9      # Serveur -> client : ton état après avoir simulé tes inputs jusqu'au n°seq
+    PING = 10          # Client -> serveur : l'heure qu'il est chez moi
+    PONG = 11          # Serveur -> client : réponse au ping, avec l'heure qu'il est chez le serveur
+    JOIN_ROOM = 12     # Client -> serveur de salles : je veux aller dans cette salle ("" = n'importe laquelle)
+    ROOM_REDIRECT = 13 # Serveur de salles -> client : ta salle est sur ce port (0 = pas de place)
+    SHM_OFFER = 14     # Serveur -> client (même machine) : noms des mémoires partagées à utiliser à la place d'UDP
+    SHM_HELLO = 15     # Client -> serveur (mémoire partagée) : "je suis le joueur X, je lis bien la mémoire partagée"
+
+
+class ProtocolError(Exception):
+    # Message illisible (mauvaise version, type inconnu, taille incorrecte ...)
+    pass
+
+
+# Quantification : on envoie des entiers au lieu de floats
+# position en 1/16 de pixel, vitesse en 1/256 de pixel par frame
+POSITION_SCALE = 16
+VELOCITY_SCALE = 256
+
+# ! = ordre réseau (big endian)
+HEADER = struct.Struct("!BB")          # version, type
+PLAYER_ID = struct.Struct("!H")        # player_id
+COUNT = struct.Struct("!H")            # nombre d'éléments qui suivent
+STATE = struct.Struct("!HiihhHb")      # player_id, x, y, velocity_x, velocity_y, health, direction
+SEQUENCE = struct.Struct("!I")         # numéro de snapshot
+DELTA_HEADER = struct.Struct("!IIH")   # seq, seq de la baseline (0 = keyframe complète), nombre de joueurs
+DELTA_PLAYER = struct.Struct("!HB")    # player_id, masque des champs présents
+DATAGRAM = struct.Struct("!IBB")       # (UDP) seq du paquet, numéro de la partie, nombre de parties
+SERVER_INFO = struct.Struct("!BQ")     # flags (bit 0 = serveur autoritaire), jeton UDP du client
+UDP_HELLO = struct.Struct("!HQ")       # player_id, jeton UDP reçu dans SERVER_INFO
+INPUT_COMMAND = struct.Struct("!IB")   # seq de l'input, touches (bitmask INPUT_* de entities/player.py)
+PING = struct.Struct("!d")             # heure du client à l'envoi (secondes)
+PONG = struct.Struct("!dd")            # heure du client renvoyée telle quelle, heure du serveur à la réception
+STRING_LENGTH = struct.Struct("!H")    # taille en bytes du texte UTF-8 qui suit
+ROOM_PORT = struct.Struct("!H")        # port de la salle, suivi de son nom (STRING_LENGTH + texte)
+# seq du dernier input simulé + état de simulation complet du joueur (voir Player.get_sim_state)
+# Les positions sont en double : le client rejoue ses inputs par dessus, il faut exactement la valeur du serveur
+INPUT_ACK = struct.Struct("!IddddHbBBBbBB")
+SIM_STATE_FIELDS = (
+    'x', 'y', 'velocity_x', 'velocity_y', 'health', 'direction', 'flags',
+    'coyote_counter', 'jump_buffer_counter', 'dash_direction', 'dash_counter', 'dash_cooldown_counter'
+)
+
+# Nombre max d'inputs dans un INPUT_COMMANDS (on renvoie ceux pas encore acquittés, au cas où un paquet est perdu)
+MAX_INPUT_COMMANDS = 32
+
+# Taille max d'un datagramme UDP, en dessous du MTU classique (1280 mini en IPv6) pour éviter la fragmentation
+MAX_DATAGRAM_SIZE = 1200
+
+# Champs d'un état dans l'ordre du masque des deltas (bit 0 = x, bit 1 = y ...)
+STATE_FIELDS = ('x', 'y', 'velocity_x', 'velocity_y', 'health', 'direction')
+_FIELD_STRUCTS = [struct.Struct(f"!{fmt}") for fmt in "iihhHb"]
+_FIELD_SCALES = [POSITION_SCALE, POSITION_SCALE, VELOCITY_SCALE, VELOCITY_SCALE, 1, 1]
+_FIELD_LIMITS = [(-0x80000000, 0x7FFFFFFF)] * 2 + [(-0x8000, 0x7FFF)] * 2 + [(0, 0xFFFF), (-1, 1)]
+_FIELD_DEFAULTS = [0, 0, 0, 0, 0, 1]
+
+
+def _clamp(value: int, low: int, high: int) -> int:
+    return max(low, min(high, value))
+
+
+def quantize_state(data: Dict) -> Tuple[int, int, int, int, int, int, int]:
+    # Convertit un dictionnaire d'état (PlayerState.to_dict) en tuple d'entiers prêts à être packés
+    return (_clamp(int(data.get('player_id', 0)), 0, 0xFFFF),) + quantize_fields(data)
+
+
+def quantize_fields(data: Dict) -> Tuple[int, int, int, int, int, int]:
+    # Pareil que quantize_state mais sans le player_id (dans l'ordre de STATE_FIELDS)
+    return tuple(
+        _quantize_field(i, data.get(name, _FIELD_DEFAULTS[i]))
+        for i, name in enumerate(STATE_FIELDS)
+    )
+
+
+def _quantize_field(index: int, value) -> int:
+    return _clamp(round(value * _FIELD_SCALES[index]), *_FIELD_LIMITS[index])
+
+
+def dequantize_state(values: Tuple) -> Dict:
+    # Inverse de quantize_state, retourne le même format que PlayerState.to_dict
+    player_id, x, y, velocity_x, velocity_y, health, direction = values
+    return {
+        'player_id': player_id,
+        'x': x / POSITION_SCALE,
+        'y': y / POSITION_SCALE,
+        'velocity_x': velocity_x / VELOCITY_SCALE,
+        'velocity_y': velocity_y / VELOCITY_SCALE,
+        'health': health,
+        'direction': direction
+    }
+
+
+def _dequantize_field(index: int, value: int):
+    scale = _FIELD_SCALES[index]
+    return value / scale if scale != 1 else value
+
+
+def diff_states(base: Optional[Dict[int, Tuple]], current: Dict[int, Tuple]) -> Tuple[Dict[int, Dict], List[int]]:
+    # Compare deux snapshots quantifiés {player_id: quantize_fields(...)}
+    # Retourne (champs modifiés par joueur, joueurs supprimés)
+    # base=None -> keyframe, on met tous les champs de tous les joueurs
+    players = {}
+    for player_id, values in current.items():
+        old = base.get(player_id) if base is not None else None
+        changed = {
+            STATE_FIELDS[i]: _dequantize_field(i, value)
+            for i, value in enumerate(values)
+            if old is None or old[i] != value
+        }
+        if changed:
+            players[player_id] = changed
+
+    removed = [player_id for player_id in base if player_id not in current] if base is not None else []
+    return players, removed
+
+
+# Encodeurs / décodeurs binaires par type de message
+# Un décodeur reçoit le buffer et l'offset où commence le contenu (après le header)
+
+def _encode_player_id(player_id: int) -> bytes:
+    return PLAYER_ID.pack(player_id)
+
+
+def _decode_player_id(buffer, offset: int) -> int:
+    return PLAYER_ID.unpack_from(buffer, offset)[0]
+
+
+def _encode_player_state(state: Dict) -> bytes:
+    return STATE.pack(*quantize_state(state))
+
+
+def _decode_player_state(buffer, offset: int) -> Dict:
+    return dequantize_state(STATE.unpack_from(buffer, offset))
+
+
+def _encode_snapshot(states: Dict[int, Dict]) -> bytes:
+    parts = [COUNT.pack(len(states))]
+    for player_id, state in states.items():
+        values = quantize_state(state)
+        # L'id de la clé fait foi (au cas où le dictionnaire d'état n'a pas le bon)
+        parts.append(STATE.pack(_clamp(int(player_id), 0, 0xFFFF), *values[1:]))
+    return b"".join(parts)
+
+
+def _decode_snapshot(buffer, offset: int) -> Dict[int, Dict]:
+    count = COUNT.unpack_from(buffer, offset)[0]
+    offset += COUNT.size
+    states = {}
+    for _ in range(count):
+        state = dequantize_state(STATE.unpack_from(buffer, offset))
+        offset += STATE.size
+        states[state['player_id']] = state
+    return states
+
+
+def _encode_delta(delta: Dict) -> bytes:
+    # delta = {'seq', 'base', 'players': {player_id: {champ: valeur}}, 'removed': [player_id]}
+    players = delta['players']
+    parts = [DELTA_HEADER.pack(delta['seq'], delta['base'], len(players))]
+    for player_id, fields in players.items():
+        mask = 0
+        packed = []
+        for i, name in enumerate(STATE_FIELDS):
+            if name in fields:
+                mask |= 1 << i
+                packed.append(_FIELD_STRUCTS[i].pack(_quantize_field(i, fields[name])))
+        parts.append(DELTA_PLAYER.pack(player_id, mask))
+        parts.extend(packed)
+    removed = delta['removed']
+    parts.append(COUNT.pack(len(removed)))
+    parts.extend(PLAYER_ID.pack(player_id) for player_id in removed)
+    return b"".join(parts)
+
+
+def _decode_delta(buffer, offset: int) -> Dict:
+    seq, base, count = DELTA_HEADER.unpack_from(buffer, offset)
+    offset += DELTA_HEADER.size
+    players = {}
+    for _ in range(count):
+        player_id, mask = DELTA_PLAYER.unpack_from(buffer, offset)
+        offset += DELTA_PLAYER.size
+        fields = {}
+        for i, name in enumerate(STATE_FIELDS):
+            if mask & (1 << i):
+                fields[name] = _dequantize_field(i, _FIELD_STRUCTS[i].unpack_from(buffer, offset)[0])
+                offset += _FIELD_STRUCTS[i].size
+        players[player_id] = fields
+    removed_count = COUNT.unpack_from(buffer, offset)[0]
+    offset += COUNT.size
+    removed = [PLAYER_ID.unpack_from(buffer, offset + i * PLAYER_ID.size)[0] for i in range(removed_count)]
+    return {'seq': seq, 'base': base, 'players': players, 'removed': removed}
+
+
+def _encode_sequence(seq: int) -> bytes:
+    return SEQUENCE.pack(seq)
+
+
+def _decode_sequence(buffer, offset: int) -> int:
+    return SEQUENCE.unpack_from(buffer, offset)[0]
+
+
+def _encode_server_info(info: Dict) -> bytes:
+    return SERVER_INFO.pack(1 if info.get('authoritative') else 0, info.get('udp_token', 0))
+
+
+def _decode_server_info(buffer, offset: int) -> Dict:
+    flags, udp_token = SERVER_INFO.unpack_from(buffer, offset)
+    return {'authoritative': bool(flags & 1), 'udp_token': udp_token}
+
+
+def _encode_udp_hello(hello: Dict) -> bytes:
+    # hello = {'player_id': notre ID, 'token': jeton reçu dans SERVER_INFO}
+    return UDP_HELLO.pack(hello['player_id'], hello['token'])
+
+
+def _decode_udp_hello(buffer, offset: int) -> Dict:
+    player_id, token = UDP_HELLO.unpack_from(buffer, offset)
+    return {'player_id': player_id, 'token': token}
+
+
+def _encode_input_commands(commands: List) -> bytes:
+    # commands = [(seq, touches), ...]
+    commands = commands[-MAX_INPUT_COMMANDS:]
+    return COUNT.pack(len(commands)) + b"".join(INPUT_COMMAND.pack(seq, buttons) for seq, buttons in commands)
+
+
+def _decode_input_commands(buffer, offset: int) -> List:
+    count = COUNT.unpack_from(buffer, offset)[0]
+    offset += COUNT.size
+    return [INPUT_COMMAND.unpack_from(buffer, offset + i * INPUT_COMMAND.size) for i in range(count)]
+
+
+def _encode_input_ack(ack: Dict) -> bytes:
+    # ack = {'seq': n, 'state': Player.get_sim_state()}
+    state = ack['state']
+    return INPUT_ACK.pack(ack['seq'], *(state[name] for name in SIM_STATE_FIELDS))
+
+
+def _decode_input_ack(buffer, offset: int) -> Dict:
+    seq, *values = INPUT_ACK.unpack_from(buffer, offset)
+    return {'seq': seq, 'state': dict(zip(SIM_STATE_FIELDS, values))}
+
+
+def _encode_ping(client_time: float) -> bytes:
+    return PING.pack(client_time)
+
+
+def _decode_ping(buffer, offset: int) -> float:
+    return PING.unpack_from(buffer, offset)[0]
+
+
+def _encode_pong(pong: Dict) -> bytes:
+    # pong = {'client_time': heure du ping, 'server_time': heure du serveur}
+    return PONG.pack(pong['client_time'], pong['server_time'])
+
+
+def _decode_pong(buffer, offset: int) -> Dict:
+    client_time, server_time = PONG.unpack_from(buffer, offset)
+    return {'client_time': client_time, 'server_time': server_time}
+
+
+def _encode_string(text: str) -> bytes:
+    raw = text.encode("utf-8")
+    return STRING_LENGTH.pack(len(raw)) + raw
+
+
+def _decode_string(buffer, offset: int) -> str:
+    length = STRING_LENGTH.unpack_from(buffer, offset)[0]
+    offset += STRING_LENGTH.size
+    raw = bytes(buffer[offset:offset + length])
+    if len(raw) != length:
+        raise ProtocolError("Truncated string")
+    return raw.decode("utf-8")
+
+
+def _encode_room_redirect(redirect: Dict) -> bytes:
+    # redirect = {'room': nom de la salle, 'port': port où se connecter}
+    return ROOM_PORT.pack(redirect['port']) + _encode_string(redirect['room'])
+
+
+def _decode_room_redirect(buffer, offset: int) -> Dict:
+    port = ROOM_PORT.unpack_from(buffer, offset)[0]
+    return {'room': _decode_string(buffer, offset + ROOM_PORT.size), 'port': port}
+
+
+def _encode_shm_offer(offer: Dict) -> bytes:
+    # offer = {'to_client': nom de l'anneau serveur -> client, 'to_server': nom de l'anneau client -> serveur}
+    return _encode_string(offer['to_client']) + _encode_string(offer['to_server'])
+
+
+def _decode_shm_offer(buffer, offset: int) -> Dict:
+    to_client = _decode_string(buffer, offset)
+    offset += STRING_LENGTH.size + len(to_client.encode("utf-8"))
+    return {'to_client': to_client, 'to_server': _decode_string(buffer, offset)}
+
+
+_ENCODERS: Dict[MessageType, Callable[[Any], bytes]] = {
+    MessageType.PLAYER_ID: _encode_player_id,
+    MessageType.PLAYER_STATE: _encode_player_state,
+    MessageType.SNAPSHOT: _encode_snapshot,
+    MessageType.DELTA_SNAPSHOT: _encode_delta,
+    MessageType.SNAPSHOT_ACK: _encode_sequence,
+    MessageType.UDP_HELLO: _encode_udp_hello,
+    MessageType.SERVER_INFO: _encode_server_info,
+    MessageType.INPUT_COMMANDS: _encode_input_commands,
+    MessageType.INPUT_ACK: _encode_input_ack,
+    MessageType.PING: _encode_ping,
+    MessageType.PONG: _encode_pong,
+    MessageType.JOIN_ROOM: _encode_string,
+    MessageType.ROOM_REDIRECT: _encode_room_redirect,
+    MessageType.SHM_OFFER: _encode_shm_offer,
+    MessageType.SHM_HELLO: _encode_player_id,
+}
+
+_DECODERS: Dict[MessageType, Callable[[Any, int], Any]] = {
+    MessageType.PLAYER_ID: _decode_player_id,
+    MessageType.PLAYER_STATE: _decode_player_state,
+    MessageType.SNAPSHOT: _decode_snapshot,
+    MessageType.DELTA_SNAPSHOT: _decode_delta,
+    MessageType.SNAPSHOT_ACK: _decode_sequence,
+    MessageType.UDP_HELLO: _decode_udp_hello,
+    MessageType.SERVER_INFO: _decode_server_info,
+    MessageType.INPUT_COMMANDS: _decode_input_commands,
+    MessageType.INPUT_ACK: _decode_input_ack,
+    MessageType.PING: _decode_ping,
+    MessageType.PONG: _decode_pong,
+    MessageType.JOIN_ROOM: _decode_string,
+    MessageType.ROOM_REDIRECT: _decode_room_redirect,
+    MessageType.SHM_OFFER: _decode_shm_offer,
+    MessageType.SHM_HELLO: _decode_player_id,
+}
+
+
+def _int_keys(data: Dict) -> Dict:
+    return {int(key): value for key, value in data.items()}
+
+
+# En JSON les clés de dictionnaire deviennent des strings, on les remet en int au décodage
+_JSON_FIXUPS: Dict[MessageType, Callable[[Any], Any]] = {
+    MessageType.SNAPSHOT: _int_keys,
+    MessageType.DELTA_SNAPSHOT: lambda data: {**data, 'players': _int_keys(data['players'])},
+}
+
+
+def encode_message(msg_type: MessageType, data: Any, codec: Codec = Codec.BINARY) -> bytes:
+    # Transforme un message en bytes (sans le préfixe de taille, ça c'est le rôle de utils.send_frame)
+    if codec == Codec.JSON:
+        return json.dumps({'type': int(msg_type), 'data': data}).encode("utf-8")
+    return HEADER.pack(PROTOCOL_VERSION, msg_type) + _ENCODERS[msg_type](data)
+
+
+def decode_message(payload) -> Tuple[MessageType, Any]:
+    # Transforme des bytes en (type, contenu), le format (binaire ou JSON) est détecté automatiquement
+    if len(payload) == 0:
+        raise ProtocolError("Empty message")
+
+    try:
+        if payload[0] == ord('{'):
+            message = json.loads(bytes(payload).decode("utf-8"))
+            msg_type = MessageType(message['type'])
+            data = message['data']
+            if msg_type in _JSON_FIXUPS:
+                data = _JSON_FIXUPS[msg_type](data)
+            return msg_type, data
+
+        version, raw_type = HEADER.unpack_from(payload, 0)
+        if version != PROTOCOL_VERSION:
+            raise ProtocolError(f"Unsupported protocol version {version}")
+        msg_type = MessageType(raw_type)
+        return msg_type, _DECODERS[msg_type](payload, HEADER.size)
+    except (struct.error, ValueError, KeyError, TypeError) as e:
+        # ValueError couvre aussi le JSON invalide et l'UTF-8 invalide
+        raise ProtocolError(f"Malformed message: {e}") from e
+
+
+def _delta_player_size(player_id: int, fields: Dict, codec: Codec) -> int:
+    # Taille (approximative en JSON, exacte en binaire) d'un joueur dans un delta encodé
+    if codec == Codec.JSON:
+        return len(json.dumps({str(player_id): fields})) + 2
+    return DELTA_PLAYER.size + sum(_FIELD_STRUCTS[STATE_FIELDS.index(name)].size for name in fields)
+
+
+def split_delta(delta: Dict, max_size: int, codec: Codec = Codec.BINARY) -> List[bytes]:
+    # Encode un delta en un ou plusieurs messages de max_size bytes maximum (pour UDP)
+    # Chaque partie est un DELTA_SNAPSHOT valide avec le même seq et une partie des joueurs,
+    # les joueurs supprimés sont mis seulement dans la première partie
+    parts = []
+    players: Dict[int, Dict] = {}
+    removed = delta['removed']
+    empty_size = len(encode_message(MessageType.DELTA_SNAPSHOT, {**delta, 'players': {}}, codec))
+    size = empty_size
+    for player_id, fields in delta['players'].items():
+        cost = _delta_player_size(player_id, fields, codec)
+        if players and size + cost > max_size:
+            parts.append(encode_message(MessageType.DELTA_SNAPSHOT, {**delta, 'players': players, 'removed': removed}, codec))
+            players = {}
+            removed = []
+            size = len(encode_message(MessageType.DELTA_SNAPSHOT, {**delta, 'players': {}, 'removed': []}, codec))
+        players[player_id] = fields
+        size += cost
+    parts.append(encode_message(MessageType.DELTA_SNAPSHOT, {**delta, 'players': players, 'removed': removed}, codec))
+    return parts
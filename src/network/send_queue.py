@@ -0,0 +1,85 @@
+import socket
+import threading
+from collections import deque
+from typing import Deque, List, Optional
+
+# Messages importants (ID, infos serveur...) en attente max pour un client avant de le considérer comme mort
+MAX_PENDING_MESSAGES = 64
+# Nombre de snapshots d'affilée remplacés avant d'avoir pu partir : au-delà le client est trop lent, on le déconnecte
+# (à 20 snapshots/s, 40 = 2 secondes sans rien pouvoir lui envoyer)
+MAX_DROPPED_SNAPSHOTS = 40
+
+
+class ClientSendQueue:
+    # File d'envoi d'UN client, vidée par son propre thread
+    # Le jeu ne fait que déposer les messages (jamais bloquant), c'est ce thread qui bloque si le client est lent
+    # Les snapshots ne s'accumulent pas : un nouveau remplace celui qui n'est pas encore parti
+
+    def __init__(self, sock: socket.socket, max_messages: int = MAX_PENDING_MESSAGES,
+                 max_dropped: int = MAX_DROPPED_SNAPSHOTS):
+        self.sock = sock
+        self.max_messages = max_messages
+        self.max_dropped = max_dropped
+        self.messages: Deque[bytes] = deque()  # Trames à envoyer dans l'ordre, jamais jetées
+        self.snapshot: Optional[List[bytes]] = None  # Dernier snapshot (ses trames) pas encore envoyé
+        self.dropped = 0  # Snapshots remplacés d'affilée
+        self.condition = threading.Condition()
+        self.running = False
+
+    def start(self):
+        self.running = True
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def put(self, frame: bytes) -> bool:
+        # Ajoute une trame à envoyer, retourne False si le client a trop de retard (il faut le déconnecter)
+        with self.condition:
+            if len(self.messages) >= self.max_messages:
+                return False
+            self.messages.append(frame)
+            self.condition.notify()
+        return True
+
+    def put_snapshot(self, frames: List[bytes]) -> bool:
+        # Remplace le snapshot en attente par celui-ci, retourne False si le client a trop de retard
+        # (pas de souci pour les deltas : chacun part de la baseline acquittée, pas du précédent)
+        with self.condition:
+            if self.snapshot is not None:
+                self.dropped += 1
+                if self.dropped > self.max_dropped:
+                    return False
+            self.snapshot = frames
+            self.condition.notify()
+        return True
+
+    def close(self):
+        # Arrête le thread et coupe la connexion (ça réveille aussi le thread de réception du client)
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass  # Déjà fermé
+
+    def _run(self):
+        # Envoie les trames en attente au fur et à mesure
+        while True:
+            with self.condition:
+                while self.running and not self.messages and self.snapshot is None:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                if self.messages:
+                    frames = [self.messages.popleft()]
+                else:
+                    frames = self.snapshot
+                    self.snapshot = None
+                    self.dropped = 0
+            try:
+                for frame in frames:
+                    self.sock.sendall(frame)
+            except OSError as e:
+                if self.running:
+                    print("Network error:", e)
+                self.close()
+                return
@@ -0,0 +1,72 @@
+from typing import Optional
+
+# Au-delà de ce RTT (secondes) on considère que le lien sature et on envoie moins souvent
+RTT_BACKOFF_THRESHOLD = 0.15
+# backlog = éléments en attente au-delà de ce que le RTT explique (ex : inputs que le serveur n'a toujours pas acquittés)
+# Il réduit la fréquence d'un facteur 1 + backlog / BACKLOG_SCALE
+BACKLOG_SCALE = 8
+# Vitesse (pixels/frame) en dessous de laquelle le joueur est considéré immobile
+IDLE_SPEED = 0.1
+# On peut envoyer en rafale jusqu'à BUDGET_BURST secondes de budget d'un coup (ex : au début d'un dash)
+BUDGET_BURST = 0.5
+
+
+class SendRateController:
+    # Décide à chaque frame s'il faut envoyer notre état / nos inputs au serveur
+    # La fréquence suit le mouvement (lent à l'arrêt, max pendant un dash), baisse si le lien sature
+    # (RTT ou messages en retard), et ne dépasse jamais un budget en bytes/s (seau à jetons)
+
+    def __init__(self, min_rate: float, max_rate: float, budget: float, max_speed: float,
+                 max_interval: Optional[float] = None):
+        # min_rate / max_rate = fréquences d'envoi (par seconde) à l'arrêt et en mouvement rapide
+        # budget = bytes/s max envoyés par ce client (tout compris : états, inputs, acks, pings)
+        # max_speed = vitesse (pixels/frame) à partir de laquelle on envoie à max_rate
+        # max_interval = on envoie au moins toutes les max_interval secondes, même budget épuisé
+        #                (ex : les inputs, qu'un message ne peut porter que par paquets de MAX_INPUT_COMMANDS)
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.budget = budget
+        self.max_speed = max_speed
+        self.max_interval = max_interval
+        self.rate = min_rate  # Fréquence actuelle
+        self.elapsed = 0.0  # Temps depuis le dernier envoi
+        self.tokens = budget * BUDGET_BURST  # Bytes qu'on a le droit d'envoyer tout de suite
+        self.last_bytes_out: Optional[int] = None
+
+    def target_rate(self, speed: float, dashing: bool, rtt: Optional[float] = None, backlog: int = 0) -> float:
+        # Fréquence voulue pour ce mouvement et cet état du lien
+        if dashing:
+            rate = self.max_rate
+        elif speed < IDLE_SPEED:
+            rate = self.min_rate
+        else:
+            ratio = min(speed / self.max_speed, 1)
+            rate = self.min_rate + (self.max_rate - self.min_rate) * ratio
+
+        # Le lien sature : inutile d'en rajouter, on ralentit proportionnellement
+        if rtt is not None and rtt > RTT_BACKOFF_THRESHOLD:
+            rate *= RTT_BACKOFF_THRESHOLD / rtt
+        rate /= 1 + backlog / BACKLOG_SCALE
+        return max(self.min_rate, min(self.max_rate, rate))
+
+    def update(self, dt: float, bytes_out: int, speed: float, dashing: bool = False, urgent: bool = False,
+               rtt: Optional[float] = None, backlog: int = 0) -> bool:
+        # Une frame de dt secondes, retourne True s'il faut envoyer maintenant
+        # bytes_out = total de bytes envoyés par le client depuis la connexion (NetStats.bytes_out)
+        # urgent = quelque chose vient de changer (touche appuyée / relâchée), on envoie sans attendre
+        if self.last_bytes_out is not None:
+            self.tokens -= bytes_out - self.last_bytes_out
+        self.last_bytes_out = bytes_out
+        self.tokens = min(self.tokens + self.budget * dt, self.budget * BUDGET_BURST)
+
+        self.rate = self.target_rate(speed, dashing, rtt, backlog)
+        self.elapsed += dt
+        if self.max_interval is not None and self.elapsed >= self.max_interval:
+            self.elapsed = 0.0
+            return True  # Plancher : trop longtemps sans rien envoyer, tant pis pour le budget
+        if self.tokens <= 0:
+            return False  # Budget épuisé, on attend qu'il se remplisse
+        if urgent or self.elapsed >= 1 / self.rate:
+            self.elapsed = 0.0
+            return True
+        return False
@@ -0,0 +1,196 @@
+import ipaddress
+import os
+import struct
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+from typing import Callable, Dict, List, Optional
+
+from network.utils import FRAME_LENGTH
+
+# Taille des données de chaque anneau (bytes), il y en a un par sens et par client
+RING_SIZE = 256 * 1024
+# En-tête : position d'écriture (head) et de lecture (tail) chacune sur sa propre ligne de cache (64 bytes),
+# pour que l'écrivain et le lecteur ne se gênent pas, puis la taille des données
+# Les positions comptent les bytes depuis la création (jamais remises à zéro), l'index dans l'anneau = position % taille
+POSITION = struct.Struct("Q")
+HEAD_OFFSET = 0
+TAIL_OFFSET = 64
+CAPACITY_OFFSET = 8  # Sur la ligne de head : écrite une seule fois, à la création
+DATA_OFFSET = 128
+# Attente entre deux lectures quand l'anneau est vide : très courte au début, puis on ralentit pour ne pas
+# manger un coeur quand il ne se passe rien (on repart au minimum dès qu'un message arrive)
+POLL_MIN_DELAY = 0.00005
+POLL_MAX_DELAY = 0.0005
+
+
+class SharedRing:
+    # Anneau de trames (même format qu'en TCP : 4 bytes de taille + message) dans une mémoire partagée entre 2 process
+    # Un seul process écrit, l'autre lit : l'écrivain n'avance que head, le lecteur que tail, pas besoin de lock
+    # entre les process. head n'avance qu'une fois la trame entière écrite, donc entre tail et head il n'y a
+    # que des trames complètes. Anneau plein = la trame est jetée (comme un paquet UDP perdu)
+
+    def __init__(self, memory: shared_memory.SharedMemory, owner: bool):
+        self.memory = memory
+        self.owner = owner  # C'est le créateur qui supprime la mémoire partagée à la fin
+        self.capacity = POSITION.unpack_from(memory.buf, CAPACITY_OFFSET)[0]
+        self.lock = threading.Lock()  # Entre les threads de CE process (le serveur écrit depuis plusieurs threads)
+        self.closed = False
+
+    @classmethod
+    def create(cls, size: int = RING_SIZE) -> 'SharedRing':
+        # Nouvel anneau vide (le nom est choisi par le système, à donner à l'autre process)
+        memory = shared_memory.SharedMemory(create=True, size=DATA_OFFSET + size)
+        memory.buf[:DATA_OFFSET] = bytes(DATA_OFFSET)
+        POSITION.pack_into(memory.buf, CAPACITY_OFFSET, size)
+        return cls(memory, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> 'SharedRing':
+        # Ouvre l'anneau créé par l'autre process
+        memory = shared_memory.SharedMemory(name=name)
+        if os.name == "posix":
+            # Chaque process qui ouvre une mémoire partagée l'inscrit auprès de son resource_tracker,
+            # qui la supprime (avec un warning) quand ce process quitte, même s'il ne l'a pas créée
+            # C'est au créateur de la supprimer (voir close)
+            resource_tracker.unregister(memory._name, "shared_memory")
+        return cls(memory, owner=False)
+
+    @property
+    def name(self) -> str:
+        return self.memory.name
+
+    def write(self, frame: bytes) -> bool:
+        # Ajoute une trame complète, False (et rien n'est écrit) si l'anneau est plein ou fermé
+        with self.lock:
+            if self.closed:
+                return False
+            buffer = self.memory.buf
+            head = POSITION.unpack_from(buffer, HEAD_OFFSET)[0]
+            tail = POSITION.unpack_from(buffer, TAIL_OFFSET)[0]
+            if len(frame) > self.capacity - (head - tail):
+                return False  # Le lecteur ne suit pas
+            self._copy_in(head, frame)
+            POSITION.pack_into(buffer, HEAD_OFFSET, head + len(frame))
+            return True
+
+    def read_frames(self) -> List[memoryview]:
+        # Retire toutes les trames disponibles et retourne leurs messages (sans la taille), [] si rien
+        # Une seule copie pour tout le lot, les memoryviews restent valides (elles ne pointent plus sur l'anneau)
+        with self.lock:
+            if self.closed:
+                return []
+            buffer = self.memory.buf
+            head = POSITION.unpack_from(buffer, HEAD_OFFSET)[0]
+            tail = POSITION.unpack_from(buffer, TAIL_OFFSET)[0]
+            if head == tail:
+                return []
+            data = memoryview(self._copy_out(tail, head - tail))
+            POSITION.pack_into(buffer, TAIL_OFFSET, head)  # La place est libre pour l'écrivain
+
+        frames = []
+        offset = 0
+        while offset < len(data):
+            length = FRAME_LENGTH.unpack_from(data, offset)[0]
+            offset += FRAME_LENGTH.size
+            frames.append(data[offset:offset + length])
+            offset += length
+        return frames
+
+    def close(self):
+        # Détache l'anneau (et le supprime si c'est nous qui l'avons créé), les write / read suivants ne font rien
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.memory.close()
+            if not self.owner:
+                return
+            if os.name == "posix":
+                # Un client du même process (ou qui partage notre resource_tracker) l'a peut-être désinscrit
+                # en s'y attachant, on la réinscrit pour que unlink() puisse la désinscrire sans erreur
+                resource_tracker.register(self.memory._name, "shared_memory")
+            try:
+                self.memory.unlink()
+            except FileNotFoundError:
+                pass
+
+    def _copy_in(self, position: int, data: bytes):
+        # Écrit data à la position donnée, en deux morceaux si on arrive au bout de l'anneau
+        start = position % self.capacity
+        first = min(len(data), self.capacity - start)
+        view = memoryview(data)
+        buffer = self.memory.buf
+        buffer[DATA_OFFSET + start:DATA_OFFSET + start + first] = view[:first]
+        if first < len(data):
+            buffer[DATA_OFFSET:DATA_OFFSET + len(data) - first] = view[first:]
+
+    def _copy_out(self, position: int, size: int) -> bytes:
+        start = position % self.capacity
+        first = min(size, self.capacity - start)
+        buffer = self.memory.buf
+        data = bytes(buffer[DATA_OFFSET + start:DATA_OFFSET + start + first])
+        if first < size:
+            data += bytes(buffer[DATA_OFFSET:DATA_OFFSET + size - first])
+        return data
+
+
+class RingPoller:
+    # Lit des anneaux pour le compte de plusieurs clients avec UN seul thread par process
+    # (un thread qui se réveille toutes les ~0.5 ms par client, ça coûte cher avec des dizaines de bots)
+    # Le thread s'arrête quand il n'y a plus d'anneau à lire, et repart au prochain add()
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.callbacks: Dict[SharedRing, Callable[[List[memoryview]], None]] = {}
+        self.thread: Optional[threading.Thread] = None
+
+    def add(self, ring: SharedRing, callback: Callable[[List[memoryview]], None]):
+        # callback(trames) sera appelé depuis le thread du poller à chaque lot de trames lues dans ring
+        with self.lock:
+            self.callbacks[ring] = callback
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+
+    def remove(self, ring: SharedRing):
+        with self.lock:
+            self.callbacks.pop(ring, None)
+
+    def _run(self):
+        idle_polls = 0
+        while True:
+            with self.lock:
+                if not self.callbacks:
+                    self.thread = None
+                    return
+                callbacks = list(self.callbacks.items())
+            received = False
+            for ring, callback in callbacks:
+                frames = ring.read_frames()
+                if frames:
+                    received = True
+                    callback(frames)
+            if received:
+                idle_polls = 0
+            else:
+                time.sleep(poll_delay(idle_polls))
+                idle_polls += 1
+
+
+# Partagé par tous les NetworkClient du process
+client_poller = RingPoller()
+
+
+def poll_delay(idle_polls: int) -> float:
+    # Temps à attendre avant de relire après idle_polls lectures vides d'affilée
+    return min(POLL_MAX_DELAY, POLL_MIN_DELAY * 2 ** min(idle_polls, 4))
+
+
+def is_local_peer(peer_host: str, local_host: str) -> bool:
+    # Vrai si l'autre bout d'une connexion est sur la même machine que nous (il peut lire notre mémoire partagée) :
+    # connexion en loopback, ou vers notre propre adresse (l'hôte qui se connecte à son IP de réseau local)
+    try:
+        return ipaddress.ip_address(peer_host).is_loopback or peer_host == local_host
+    except ValueError:
+        return False
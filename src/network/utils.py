@@ -1,6 +1,16 @@
 import struct
 import json
 import socket
+from typing import List, Optional
+
+from network.protocol import MessageType, Codec, ProtocolError, encode_message, decode_message
+
+# Préfixe de taille devant chaque message TCP
+FRAME_LENGTH = struct.Struct("!I")
+# Taille de départ du buffer de réception de FrameReader (il grandit si un message ne rentre pas)
+RECV_BUFFER_SIZE = 64 * 1024
+# Au-delà c'est forcément un flux corrompu (ou malveillant), on ne va pas allouer des Go pour ça
+MAX_FRAME_SIZE = 16 * 1024 * 1024
 
 def send_json(sock: socket.socket, data: dict):
     # Cette fonction envoie un dictionnaire Python sur un socket TCP de façon SÉCURISÉE
@@ -58,19 +68,121 @@ def recvall(sock: socket.socket, size: int):
     # sock.recv(n) peut retourner MOINS de n bytes
     # Il faut donc boucler jusqu'à tout recevoir
     
-    data = b""  # Buffer vide pour stocker les bytes reçus
+    # On prépare directement un buffer de la bonne taille et recv_into() écrit dedans,
+    # au lieu de faire data += packet (qui recopie tout le buffer à chaque morceau reçu)
+    data = bytearray(size)
+    view = memoryview(data)
+    received = 0
     
-    while len(data) < size:
-        # On demande les bytes manquants
-        packet = sock.recv(size - len(data))
+    while received < size:
+        # On demande les bytes manquants, écrits à la suite de ceux déjà reçus
+        count = sock.recv_into(view[received:])
         
-        # Si recv() retourne b"" → la connexion est fermée
-        if not packet:
+        # Si recv_into() retourne 0 → la connexion est fermée
+        if count == 0:
             return None
         
-        # On ajoute les bytes reçus au buffer
-        data += packet
+        received += count
     
     # Quand on a reçu exactement "size" bytes, on les retourne
     return data
 
+
+def pack_frame(payload: bytes) -> bytes:
+    # Ajoute le préfixe de taille devant un message encodé
+    # Le résultat est immutable, on peut l'envoyer tel quel à plusieurs sockets
+    return struct.pack("!I", len(payload)) + payload
+
+
+def send_frame(sock: socket.socket, payload: bytes):
+    # Envoie des bytes déjà encodés, précédés de leur taille (même principe que send_json)
+    sock.sendall(pack_frame(payload))
+
+
+def recv_frame(sock: socket.socket):
+    # Reçoit un message complet (sans le préfixe de taille), None si la connexion est fermée
+    raw_length = recvall(sock, 4)
+    if raw_length is None:
+        return None
+    return recvall(sock, struct.unpack("!I", raw_length)[0])
+
+
+def send_message(sock: socket.socket, msg_type: MessageType, data, codec: Codec = Codec.BINARY):
+    # Encode un message avec le protocole (binaire par défaut) et l'envoie
+    send_frame(sock, encode_message(msg_type, data, codec))
+
+
+def recv_message(sock: socket.socket):
+    # Reçoit un message du protocole, retourne (type, contenu) ou None si la connexion est fermée
+    payload = recv_frame(sock)
+    if payload is None:
+        return None
+    return decode_message(payload)
+
+
+class FrameReader:
+    # Lit les messages (4 bytes de taille + message) d'un socket TCP, sans recopier les données
+    # Un seul recv_into() remplit un buffer réutilisé, qui peut contenir plusieurs messages d'un coup :
+    # on les découpe avec des memoryview (pas de copie) au lieu de faire 2 recv par message
+    
+    def __init__(self, sock: socket.socket, buffer_size: int = RECV_BUFFER_SIZE):
+        self.sock = sock
+        self.buffer = bytearray(buffer_size)
+        self.view = memoryview(self.buffer)
+        self.start = 0  # Début des données reçues pas encore découpées
+        self.end = 0  # Fin des données reçues
+    
+    def read_frames(self) -> Optional[List[memoryview]]:
+        # Attend au moins un message complet et retourne tous ceux qui sont arrivés, None si la connexion est fermée
+        # ATTENTION : les messages pointent dans le buffer, ils ne sont valides que jusqu'au prochain appel
+        # (il faut les décoder avant, decode_message ne garde aucune référence dessus)
+        while True:
+            frames = self._split_frames()
+            if frames:
+                return frames
+            if not self._fill():
+                return None
+    
+    def _split_frames(self) -> List[memoryview]:
+        # Découpe tous les messages complets déjà présents dans le buffer
+        frames = []
+        while self.end - self.start >= FRAME_LENGTH.size:
+            length = FRAME_LENGTH.unpack_from(self.buffer, self.start)[0]
+            if length > MAX_FRAME_SIZE:
+                raise ProtocolError(f"Frame too large ({length} bytes)")
+            frame_end = self.start + FRAME_LENGTH.size + length
+            if frame_end > self.end:
+                break  # Message pas encore arrivé en entier
+            frames.append(self.view[self.start + FRAME_LENGTH.size:frame_end])
+            self.start = frame_end
+        return frames
+    
+    def _fill(self) -> bool:
+        # Reçoit des données à la suite du buffer, False si la connexion est fermée
+        # Appelé seulement quand il n'y a plus de message complet, les messages déjà rendus ne servent plus
+        pending = self.end - self.start
+        if pending == 0:
+            self.start = self.end = 0  # Tout a été lu, on repart du début du buffer
+        
+        # Place nécessaire pour finir le message en cours (sa taille si on la connaît déjà)
+        needed = FRAME_LENGTH.size
+        if pending >= FRAME_LENGTH.size:
+            needed += FRAME_LENGTH.unpack_from(self.buffer, self.start)[0]
+        
+        if self.start + needed > len(self.buffer):
+            # Plus assez de place à la fin : on ramène le début du message en cours au début du buffer
+            # (on ne recopie que ce morceau), et on agrandit si le message est plus grand que le buffer
+            if needed > len(self.buffer):
+                buffer = bytearray(max(needed, len(self.buffer) * 2))
+                buffer[:pending] = self.view[self.start:self.end]
+                self.buffer = buffer
+                self.view = memoryview(buffer)
+            else:
+                self.buffer[:pending] = self.buffer[self.start:self.end]
+            self.start, self.end = 0, pending
+        
+        count = self.sock.recv_into(self.view[self.end:])
+        if count == 0:
+            return False
+        self.end += count
+        return True
@@ -0,0 +1,43 @@
+# Simulation autoritaire côté serveur : le serveur fait bouger les joueurs des clients
+# à partir de leurs inputs, au lieu de croire la position qu'ils envoient
+from typing import Dict, Iterable, List, Tuple
+
+from entities.player import Player
+from network.network_manager import NetworkServer
+from world.tilemap import TileMap
+
+
+class GameState:
+    # Les joueurs simulés par le serveur (un Player headless par client)
+
+    def __init__(self, tilemap: TileMap, spawn_x: float = 100, spawn_y: float = 100):
+        self.tilemap = tilemap
+        self.spawn_x = spawn_x
+        self.spawn_y = spawn_y
+        self.players: Dict[int, Player] = {}  # {id_joueur: Player}
+
+    def add_player(self, player_id: int):
+        self.players[player_id] = Player(self.spawn_x, self.spawn_y, headless=True)
+
+    def remove_player(self, player_id: int):
+        self.players.pop(player_id, None)
+
+    def apply_inputs(self, player_id: int, commands: List[Tuple[int, int]], dt: float):
+        # Simule une frame par input reçu, exactement comme le client l'a fait de son côté
+        player = self.players.get(player_id)
+        if player is None:
+            return
+        for _, buttons in commands:
+            player.apply_input(buttons)
+            player.update(dt, self.tilemap)
+
+    def update(self, server: NetworkServer, dt: float, focus: Iterable[Tuple[float, float]] = ()):
+        # Une mise à jour côté serveur : joueurs arrivés / partis, inputs reçus, résultat renvoyé au serveur
+        # (à appeler après avoir lu server.get_new_players() / get_left_players())
+        # focus = autres positions autour desquelles garder le niveau chargé (le joueur de l'hôte)
+        self.tilemap.update_focus([*focus, *((player.x, player.y) for player in self.players.values())])
+        for player_id, commands in server.pop_inputs().items():
+            if player_id not in self.players:
+                continue
+            self.apply_inputs(player_id, commands, dt)
+            server.set_simulated_state(player_id, self.players[player_id].get_sim_state(), commands[-1][0])
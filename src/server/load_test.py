@@ -0,0 +1,276 @@
+# Test de charge : un serveur + N faux clients (bots) sur la même machine, sans fenêtre
+# Les bots envoient des PlayerState comme de vrais joueurs, on mesure ce que ça coûte au serveur
+# et on sort un rapport JSON (pour comparer deux versions du protocole / du serveur)
+# Lancement depuis la racine du projet :
+#   python src/server/load_test.py --bots 200 --duration 20 --processes 4 --output report.json
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import random
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+# Le script est dans src/server/, on ajoute src/ au path pour pouvoir importer network et settings
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+from settings import (
+    NETWORK_CODEC, NETWORK_TRANSPORT, NETWORK_SERVER_BACKEND, NETWORK_SHARED_MEMORY,
+    SERVER_TICK_RATE, SERVER_SNAPSHOT_RATE, SERVER_INTEREST_RADIUS
+)
+from network.network_manager import NetworkServer, NetworkClient, PlayerState
+from network.async_server import AsyncNetworkServer
+from network.protocol import Codec, Transport, MessageType
+
+# Temps max laissé aux bots pour se connecter avant de commencer à mesurer (secondes)
+WARMUP_TIMEOUT = 15.0
+# Les bots se baladent sur une bande de cette largeur (pixels), pour que la zone d'intérêt serve à quelque chose
+BOT_AREA_WIDTH = 4000
+
+
+class BotClient(NetworkClient):
+    # Faux joueur : un NetworkClient normal qui note à quel moment chaque snapshot arrive
+
+    def __init__(self, server_ip: str, port: int, codec: Codec, transport: Transport):
+        super().__init__(server_ip, port, codec, transport)
+        self.received_at: Dict[int, float] = {}  # {seq du snapshot: date de réception (time.monotonic)}
+        self.state = PlayerState(0)
+        # Chaque bot fait des allers-retours autour d'un point à lui, avec sa propre vitesse
+        self.home_x = random.uniform(0, BOT_AREA_WIDTH)
+        self.phase = random.uniform(0, 2 * math.pi)
+        self.speed = random.uniform(0.5, 2.0)
+
+    def _handle_message(self, msg_type: MessageType, data):
+        # time.monotonic() est la même horloge pour tous les process de la machine, on peut comparer avec le serveur
+        if msg_type == MessageType.DELTA_SNAPSHOT:
+            self.received_at.setdefault(data['seq'], time.monotonic())
+        super()._handle_message(msg_type, data)
+
+    def move(self, now: float):
+        # Mouvement plausible : va-et-vient horizontal avec des petits sauts, 7 pixels/frame max comme un joueur
+        angle = now * self.speed + self.phase
+        self.state.x = self.home_x + 300 * math.sin(angle)
+        self.state.y = 360 - abs(80 * math.sin(angle * 3))
+        self.state.velocity_x = 300 * self.speed * math.cos(angle) / 60
+        self.state.velocity_y = -80 * 3 * self.speed * math.cos(angle * 3) / 60
+        self.state.direction = 1 if self.state.velocity_x >= 0 else -1
+        self.send_state(self.state)
+
+
+def run_bots(host: str, port: int, count: int, send_rate: float, stop_event,
+             codec: str, transport: str, seed: int = 0) -> Dict:
+    # Lance count bots (dans ce process), les fait envoyer leur état send_rate fois par seconde jusqu'à stop_event
+    # Retourne ce qu'ils ont mesuré (sérialisable, pour passer d'un process à l'autre)
+    random.seed(seed)
+    bots = [BotClient(host, port, Codec(codec), Transport(transport)) for _ in range(count)]
+    failed = sum(1 for bot in bots if not bot.connect())
+
+    # Un seul thread envoie pour tous les bots du process (les réceptions ont déjà leurs threads)
+    interval = 1 / send_rate
+    next_send = time.monotonic()
+    while not stop_event.is_set():
+        now = time.monotonic()
+        for bot in bots:
+            if bot.connected:
+                bot.move(now)
+        next_send += interval
+        time.sleep(max(0.0, next_send - time.monotonic()))
+
+    dropped = sum(1 for bot in bots if not bot.connected)
+    for bot in bots:
+        bot.disconnect()
+    return {
+        'failed': failed,
+        'dropped': dropped - failed,
+        'received': [bot.received_at for bot in bots if bot.received_at],
+    }
+
+
+def _make_jobs(args, counts: List[int], stop_event) -> List[tuple]:
+    # Arguments de run_bots pour chaque groupe de bots
+    return [
+        ('127.0.0.1', args.port, count, args.send_rate, stop_event, args.codec, args.transport, i)
+        for i, count in enumerate(counts) if count
+    ]
+
+
+def _run_bots_job(args: tuple) -> Dict:
+    # Pour le pool de process (qui ne passe qu'un seul argument)
+    return run_bots(*args)
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    # Résumé d'une liste de mesures (en millisecondes)
+    if not values:
+        return {'count': 0, 'mean': None, 'p50': None, 'p90': None, 'p99': None, 'max': None}
+    values = sorted(values)
+
+    def pick(fraction: float) -> float:
+        return round(values[min(len(values) - 1, int(fraction * len(values)))] * 1000, 3)
+
+    return {
+        'count': len(values),
+        'mean': round(sum(values) / len(values) * 1000, 3),
+        'p50': pick(0.50),
+        'p90': pick(0.90),
+        'p99': pick(0.99),
+        'max': round(values[-1] * 1000, 3),
+    }
+
+
+def run_load_test(args) -> Dict:
+    # Démarre le serveur, les bots, fait tourner les ticks en mesurant tout, et retourne le rapport
+    server_class = AsyncNetworkServer if args.backend == "asyncio" else NetworkServer
+    # Les bots envoient leur état : serveur en mode relais (pas de simulation des inputs)
+    server = server_class(
+        host='127.0.0.1', port=args.port,
+        codec=Codec(args.codec), transport=Transport(args.transport),
+        authoritative=False, interest_radius=args.interest_radius or None, shared_memory=args.shared_memory
+    )
+    if not server.start():
+        raise SystemExit(1)
+
+    # Répartit les bots entre les process (ou tout dans ce process si --processes 0)
+    workers = max(1, args.processes)
+    counts = [args.bots // workers + (1 if i < args.bots % workers else 0) for i in range(workers)]
+    results: List[Dict] = []
+    pool = None
+    if args.processes > 0:
+        # spawn : pas de fork d'un process qui a déjà des threads (ceux du serveur)
+        context = multiprocessing.get_context("spawn")
+        manager = context.Manager()
+        stop_event = manager.Event()
+        jobs = _make_jobs(args, counts, stop_event)
+        pool = context.Pool(len(jobs))
+        pending = pool.map_async(_run_bots_job, jobs)
+    else:
+        stop_event = threading.Event()
+        jobs = _make_jobs(args, counts, stop_event)
+        threading.Thread(target=lambda: results.extend(_run_bots_job(job) for job in jobs), daemon=True).start()
+
+    # On attend que tous les bots soient connectés (les process mettent un moment à démarrer)
+    warmup_end = time.monotonic() + WARMUP_TIMEOUT
+    while len(server.clients) < args.bots and time.monotonic() < warmup_end:
+        time.sleep(0.05)
+    time.sleep(0.5)  # Le temps que les premiers snapshots / acks fassent un aller-retour
+
+    # Boucle à pas fixe comme DedicatedServer.run, mais on chronomètre chaque tick
+    # (même travail que DedicatedServer.tick en mode relais, sans afficher chaque arrivée de bot)
+    tick_interval = 1 / args.tick_rate
+    snapshot_interval = 1 / args.snapshot_rate
+    snapshot_accumulator = 0.0
+    tick_times = []
+    broadcast_times: Dict[int, float] = {}  # {seq: date du début de l'envoi} (pendant la mesure seulement)
+    measure_start = time.monotonic()
+    measure_end = measure_start + args.duration
+    with server.lock:
+        bytes_start = (server.bytes_sent, server.bytes_received)
+    connected_start = len(server.clients)
+    next_tick = time.perf_counter()
+    while time.monotonic() < measure_end:
+        tick_start = time.perf_counter()
+        sent_at = time.monotonic()
+        server.get_new_players()
+        server.get_left_players()
+        server.swap_states()
+        snapshot_accumulator += tick_interval
+        broadcast = snapshot_accumulator >= snapshot_interval
+        if broadcast:
+            snapshot_accumulator -= snapshot_interval
+            server.broadcast_state()
+        tick_times.append(time.perf_counter() - tick_start)
+        if broadcast:
+            broadcast_times[server.snapshot_seq] = sent_at
+        next_tick += tick_interval
+        time.sleep(max(0.0, next_tick - time.perf_counter()))
+    elapsed = time.monotonic() - measure_start
+    with server.lock:
+        bytes_sent = server.bytes_sent - bytes_start[0]
+        bytes_received = server.bytes_received - bytes_start[1]
+    connected_end = len(server.clients)
+
+    # Arrête les bots et attend leurs mesures
+    stop_event.set()
+    if pool:
+        results = pending.get()
+        pool.close()
+        pool.join()
+        manager.shutdown()
+    else:
+        while len(results) < len(jobs):
+            time.sleep(0.05)
+    server.stop()
+
+    latencies = [
+        received[seq] - broadcast_times[seq]
+        for result in results for received in result['received']
+        for seq in received if seq in broadcast_times
+    ]
+    expected = len(broadcast_times) * connected_start
+    return {
+        'config': {
+            'bots': args.bots, 'processes': args.processes, 'send_rate': args.send_rate,
+            'duration': args.duration, 'backend': args.backend, 'transport': args.transport,
+            'codec': args.codec, 'tick_rate': args.tick_rate, 'snapshot_rate': args.snapshot_rate,
+            'interest_radius': args.interest_radius, 'shared_memory': args.shared_memory,
+        },
+        'clients': {
+            'connected_at_start': connected_start,
+            'connected_at_end': connected_end,
+            'failed_to_connect': sum(result['failed'] for result in results),
+            'dropped': sum(result['dropped'] for result in results),
+        },
+        'tick_ms': percentiles(tick_times),
+        'broadcast_latency_ms': percentiles(latencies),
+        'snapshots': {
+            'broadcast': len(broadcast_times),
+            'received': len(latencies),
+            'missed': max(0, expected - len(latencies)),
+        },
+        'bandwidth': {
+            'bytes_out_per_s': round(bytes_sent / elapsed),
+            'bytes_in_per_s': round(bytes_received / elapsed),
+            'bytes_out_per_client_per_s': round(bytes_sent / elapsed / max(1, connected_end)),
+        },
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Abyssal Ascension - server load test")
+    parser.add_argument("--bots", type=int, default=50, help="number of simulated clients")
+    parser.add_argument("--processes", type=int, default=0, help="spread bots over N processes (0: same process)")
+    parser.add_argument("--send-rate", type=float, default=30, help="states sent per second by each bot")
+    parser.add_argument("--duration", type=float, default=10, help="measured seconds (after warmup)")
+    parser.add_argument("--port", type=int, default=5599)
+    parser.add_argument("--tick-rate", type=int, default=SERVER_TICK_RATE)
+    parser.add_argument("--snapshot-rate", type=int, default=SERVER_SNAPSHOT_RATE)
+    parser.add_argument("--backend", choices=["asyncio", "threads"], default=NETWORK_SERVER_BACKEND)
+    parser.add_argument("--transport", choices=[t.value for t in Transport], default=NETWORK_TRANSPORT)
+    parser.add_argument("--codec", choices=[c.value for c in Codec], default=NETWORK_CODEC)
+    parser.add_argument("--interest-radius", type=float, default=SERVER_INTEREST_RADIUS,
+                        help="only send players within this many pixels of each client (0: send everyone)")
+    parser.add_argument("--shared-memory", action=argparse.BooleanOptionalAction, default=NETWORK_SHARED_MEMORY,
+                        help="bots exchange states with the server through shared memory instead of sockets")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args(argv)
+    if args.bots < 1:
+        parser.error("--bots must be at least 1")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = run_load_test(args)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(text)
+
+
+if __name__ == "__main__":
+    main()
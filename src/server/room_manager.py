@@ -0,0 +1,336 @@
+# Serveur multi-salles : beaucoup de parties indépendantes sur une seule machine
+# Un process "front" écoute sur le port principal et dit à chaque joueur sur quel port est sa salle,
+# des process workers font tourner les salles (un DedicatedServer par salle, avec son port et sa boucle de ticks)
+# Plusieurs process = on utilise tous les coeurs malgré le GIL
+# Lancement depuis la racine du projet :
+#   python src/server/room_manager.py --port 5555 --workers 4 --max-rooms 64 --max-players 16
+# Les clients s'y connectent avec NetworkClient(..., room="nom") (room="" pour n'importe quelle salle)
+import argparse
+import multiprocessing
+import os
+import socket
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+# Le script est dans src/server/, on ajoute src/ au path pour pouvoir importer network et settings
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+from settings import SERVER_WORKERS, SERVER_MAX_ROOMS
+from network.protocol import Codec, MessageType
+from network.utils import send_message, recv_message
+from server.server_main import DedicatedServer, add_server_arguments, create_dedicated_server
+
+# Une salle vide depuis plus de N secondes est fermée (son port est réutilisé)
+ROOM_IDLE_TIMEOUT = 60.0
+# Les workers envoient le nombre de joueurs de leurs salles toutes les N secondes
+STATUS_INTERVAL = 1.0
+# Temps max pour qu'un client dise quelle salle il veut, et pour qu'une nouvelle salle démarre
+JOIN_TIMEOUT = 5.0
+
+
+class _Room:
+    # Une salle qui tourne dans un worker
+
+    def __init__(self, name: str, dedicated: DedicatedServer):
+        self.name = name
+        self.dedicated = dedicated
+        self.thread = threading.Thread(target=dedicated.run, daemon=True)
+        self.empty_since: Optional[float] = time.monotonic()
+
+    def stop(self):
+        self.dedicated.running = False  # DedicatedServer.run arrête le serveur en sortant
+        self.thread.join(timeout=2)
+
+
+def _worker_main(connection, args):
+    # Process worker : crée / fait tourner / ferme les salles que le manager lui demande
+    # Messages reçus : ('create', nom, port), ('close', nom, port), ('stop',)
+    # Messages envoyés : ('created', nom, port, ok), ('status', {nom: joueurs}), ('closed', nom)
+    rooms: Dict[str, _Room] = {}
+    try:
+        while True:
+            if connection.poll(STATUS_INTERVAL):
+                command = connection.recv()
+                if command[0] == 'stop':
+                    break
+                if command[0] == 'create':
+                    _, name, port = command
+                    if name in rooms:
+                        rooms.pop(name).stop()  # Ancienne salle de ce nom que le manager a abandonnée (voir 'close')
+                    try:
+                        dedicated = create_dedicated_server(args, port)
+                        started = dedicated.server.start()
+                    except Exception as e:
+                        # Niveau illisible, port déjà pris... : cette salle ne démarre pas, mais le worker
+                        # continue (sinon toutes ses autres salles tomberaient avec lui)
+                        print("Server error:", e)
+                        started = False
+                    if started:
+                        rooms[name] = _Room(name, dedicated)
+                        rooms[name].thread.start()
+                    connection.send(('created', name, port, started))
+                elif command[0] == 'close':
+                    # Salle qui a démarré trop tard, le manager l'a déjà oubliée (et a rendu son port)
+                    _, name, port = command
+                    room = rooms.get(name)
+                    if room is not None and room.dedicated.server.port == port:
+                        room.stop()
+                        del rooms[name]
+
+            # Ferme les salles vides depuis trop longtemps, et donne des nouvelles des autres au manager
+            now = time.monotonic()
+            status = {}
+            for name, room in list(rooms.items()):
+                players = len(room.dedicated.server.clients)
+                if players:
+                    room.empty_since = None
+                elif room.empty_since is None:
+                    room.empty_since = now
+                elif now - room.empty_since > ROOM_IDLE_TIMEOUT:
+                    room.stop()
+                    del rooms[name]
+                    connection.send(('closed', name))
+                    continue
+                status[name] = players
+            connection.send(('status', status))
+    except (EOFError, ConnectionError, KeyboardInterrupt):
+        pass  # Le manager est parti
+    finally:
+        for room in rooms.values():
+            room.stop()
+
+
+class _Worker:
+    # Ce que le manager sait d'un worker
+
+    def __init__(self, process, connection):
+        self.process = process
+        self.connection = connection
+        self.send_lock = threading.Lock()  # Plusieurs threads du front peuvent lui parler en même temps
+        self.rooms: List[str] = []
+
+    def send(self, message: tuple):
+        with self.send_lock:
+            self.connection.send(message)
+
+
+class RoomManager:
+    # Le front : écoute sur le port principal, choisit une salle pour chaque joueur et le redirige
+
+    def __init__(self, args):
+        self.args = args
+        self.codec = Codec(args.codec)
+        self.socket: Optional[socket.socket] = None
+        self.running = False
+        self.workers: List[_Worker] = []
+        # {nom: {'worker', 'port', 'players', 'pending'}}, pending = dates des redirections pas encore vues par le worker
+        self.rooms: Dict[str, Dict] = {}
+        self.free_ports = list(range(args.port + 1, args.port + 1 + args.max_rooms))
+        self.room_counter = 0  # Pour nommer les salles créées automatiquement
+        # Salles en cours de création {nom: {'event', 'worker', 'port'}}, l'event est levé quand elle est prête
+        # (ou n'a pas pu démarrer), après l'avoir ajoutée à self.rooms
+        self.created: Dict[str, Dict] = {}
+        self.lock = threading.Lock()
+
+    def start(self) -> bool:
+        # Lance les workers puis ouvre le port principal
+        context = multiprocessing.get_context("spawn")
+        for _ in range(self.args.workers or os.cpu_count() or 1):
+            parent_connection, child_connection = context.Pipe()
+            process = context.Process(target=_worker_main, args=(child_connection, self.args), daemon=True)
+            process.start()
+            worker = _Worker(process, parent_connection)
+            self.workers.append(worker)
+            threading.Thread(target=self._read_worker, args=(worker,), daemon=True).start()
+
+        try:
+            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.socket.bind((self.args.host, self.args.port))
+            self.socket.listen(64)
+        except Exception as e:
+            print(f"Server error: {e}")
+            self.stop()
+            return False
+        self.running = True
+        return True
+
+    def stop(self):
+        self.running = False
+        if self.socket:
+            self.socket.close()
+        for worker in self.workers:
+            try:
+                worker.send(('stop',))
+            except OSError:
+                pass
+        for worker in self.workers:
+            worker.process.join(timeout=3)
+
+    def run(self):
+        # Accepte les joueurs jusqu'à Ctrl+C, chacun est traité dans son thread (un échange puis on ferme)
+        try:
+            while self.running:
+                try:
+                    client_socket, _ = self.socket.accept()
+                except OSError:
+                    break
+                threading.Thread(target=self._handle_join, args=(client_socket,), daemon=True).start()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def _handle_join(self, client_socket: socket.socket):
+        # Lit la demande du joueur et lui répond avec le port de sa salle
+        try:
+            client_socket.settimeout(JOIN_TIMEOUT)
+            message = recv_message(client_socket)
+            if message is None or message[0] != MessageType.JOIN_ROOM:
+                return
+            room = self.assign_room(message[1])
+            redirect = {'room': room['name'], 'port': room['port']} if room else {'room': message[1], 'port': 0}
+            send_message(client_socket, MessageType.ROOM_REDIRECT, redirect, self.codec)
+        except Exception as e:
+            print("Network error:", e)
+        finally:
+            client_socket.close()
+
+    def assign_room(self, name: str) -> Optional[Dict]:
+        # Trouve (ou crée) la salle du joueur, None si c'est impossible (plus de ports libres, salle pleine...)
+        # name = "" -> la salle la plus remplie qui a encore de la place, pour faire des parties complètes
+        with self.lock:
+            if name:
+                if name in self.rooms:
+                    if self._room_load(name) >= self.args.max_players:
+                        return None
+                    return self._reserve(name)
+            else:
+                candidates = [
+                    (self._room_load(room_name), room_name) for room_name in self.rooms
+                    if self._room_load(room_name) < self.args.max_players
+                ]
+                if candidates:
+                    _, name = max(candidates)
+                    return self._reserve(name)
+                self.room_counter += 1
+                name = f"room-{self.room_counter}"
+        return self._create_room(name)
+
+    def _create_room(self, name: str) -> Optional[Dict]:
+        # Demande au worker le moins chargé de lancer la salle et attend qu'elle écoute
+        # C'est _read_worker qui l'enregistre : tous ceux qui attendent la trouvent dans self.rooms en se réveillant
+        with self.lock:
+            creation = self.created.get(name)  # Quelqu'un d'autre la crée peut-être déjà, on attend avec lui
+            if creation is None:
+                if not self.free_ports:
+                    return None
+                worker = min(self.workers, key=lambda w: len(w.rooms))
+                worker.rooms.append(name)
+                creation = self.created[name] = {'event': threading.Event(), 'worker': worker,
+                                                 'port': self.free_ports.pop(0)}
+                send = True
+            else:
+                send = False
+        if send:
+            creation['worker'].send(('create', name, creation['port']))
+
+        creation['event'].wait(JOIN_TIMEOUT)
+        with self.lock:
+            if self.created.get(name) is creation:
+                # Pas démarrée à temps : on l'oublie et on rend son port, si elle démarre plus tard
+                # _read_worker la fera arrêter (sinon le nom resterait bloqué pour toujours)
+                print(f"Room {name} did not start in time")
+                del self.created[name]
+                creation['worker'].rooms.remove(name)
+                self.free_ports.append(creation['port'])
+                return None
+            if name not in self.rooms or self._room_load(name) >= self.args.max_players:
+                return None
+            return self._reserve(name)
+
+    def _room_load(self, name: str) -> int:
+        # Joueurs dans la salle + joueurs qu'on vient d'y envoyer (le worker ne les a peut-être pas encore vus)
+        room = self.rooms[name]
+        return room['players'] + len(room['pending'])
+
+    def _reserve(self, name: str) -> Dict:
+        # Réserve une place pour un joueur qu'on redirige vers la salle (à appeler avec self.lock)
+        room = self.rooms[name]
+        room['pending'].append(time.monotonic())
+        return {'name': name, 'port': room['port']}
+
+    def _read_worker(self, worker: _Worker):
+        # Reçoit les messages d'un worker (un thread par worker)
+        while True:
+            try:
+                message = worker.connection.recv()
+            except (EOFError, OSError):
+                return  # Worker arrêté
+            abandoned = None
+            with self.lock:
+                if message[0] == 'created':
+                    _, name, port, ok = message
+                    creation = self.created.get(name)
+                    if creation is None or creation['port'] != port:
+                        if ok:
+                            abandoned = ('close', name, port)  # Plus personne ne l'attend (voir _create_room)
+                    else:
+                        del self.created[name]
+                        if ok:
+                            self.rooms[name] = {'worker': self.workers.index(worker), 'port': port,
+                                                'players': 0, 'pending': []}
+                        else:
+                            print(f"Room {name} could not start on port {port}")
+                            worker.rooms.remove(name)
+                            self.free_ports.append(port)
+                        creation['event'].set()
+                elif message[0] == 'status':
+                    expired = time.monotonic() - JOIN_TIMEOUT
+                    for name, players in message[1].items():
+                        room = self.rooms.get(name)
+                        if room is None:
+                            continue
+                        # Les nouveaux joueurs vus par le worker sont ceux qu'on a redirigés en premier,
+                        # et un joueur redirigé depuis trop longtemps ne viendra plus
+                        joined = max(0, players - room['players'])
+                        room['pending'] = [t for t in room['pending'][joined:] if t > expired]
+                        room['players'] = players
+                elif message[0] == 'closed':
+                    room = self.rooms.pop(message[1], None)
+                    if room:
+                        worker.rooms.remove(message[1])
+                        self.free_ports.append(room['port'])
+                        print(f"Room {message[1]} closed (empty)")
+            if abandoned:
+                try:
+                    worker.send(abandoned)
+                except OSError:
+                    return  # Worker arrêté
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Abyssal Ascension - multi-room server")
+    add_server_arguments(parser)
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS, help="room processes (0: one per CPU core)")
+    parser.add_argument("--max-rooms", type=int, default=SERVER_MAX_ROOMS,
+                        help="rooms open at once, they use the ports right after --port")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    manager = RoomManager(args)
+    if not manager.start():
+        sys.exit(1)
+
+    print(f"Room server listening on {args.host}:{args.port} ({len(manager.workers)} workers, "
+          f"rooms on ports {args.port + 1}-{args.port + args.max_rooms}, max {args.max_players} players per room)")
+    manager.run()
+
+
+if __name__ == "__main__":
+    main()
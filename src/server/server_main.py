@@ -0,0 +1,150 @@
+# Serveur dédié sans fenêtre : pas d'affichage, pas de son, pas de joueur 0
+# (pygame est seulement utilisé pour la physique des joueurs en mode autoritaire, sans jamais ouvrir de fenêtre)
+# Lancement depuis la racine du projet :
+#   python src/server/server_main.py --port 5555 --tick-rate 60 --snapshot-rate 20 --max-players 16
+import argparse
+import os
+import sys
+import time
+from typing import Optional
+
+# Le script est dans src/server/, on ajoute src/ au path pour pouvoir importer network et settings
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+from settings import (
+    NETWORK_PORT, NETWORK_CODEC, NETWORK_TRANSPORT, NETWORK_SERVER_BACKEND, NETWORK_SHARED_MEMORY,
+    SERVER_TICK_RATE, SERVER_SNAPSHOT_RATE, SERVER_MAX_PLAYERS, SERVER_AUTHORITATIVE,
+    SERVER_INTEREST_RADIUS, LEVEL_FILE, LEVEL_STREAMING
+)
+from network.network_manager import NetworkServer
+from network.async_server import AsyncNetworkServer
+from network.protocol import Codec, Transport
+
+# Si on a plus de N ticks de retard (machine surchargée), on arrête d'essayer de rattraper
+MAX_TICK_LAG = 5
+
+
+class DedicatedServer:
+    # Fait tourner un NetworkServer à une fréquence fixe (tick rate),
+    # les snapshots sont envoyés à leur propre fréquence (snapshot rate)
+
+    def __init__(self, server: NetworkServer, tick_rate: int = SERVER_TICK_RATE,
+                 snapshot_rate: int = SERVER_SNAPSHOT_RATE, game_state=None):
+        # game_state = server.game_state.GameState si le serveur est autoritaire (il simule les inputs)
+        self.server = server
+        self.game_state = game_state
+        self.tick_interval = 1 / tick_rate
+        self.snapshot_interval = 1 / snapshot_rate
+        self.snapshot_accumulator = 0.0  # Temps écoulé depuis le dernier snapshot
+        self.tick_count = 0
+        self.running = False
+
+    def tick(self):
+        # Une mise à jour du serveur
+        for player_id in self.server.get_new_players():
+            print(f"Player {player_id} joined! ({len(self.server.clients)} connected)")
+            if self.game_state:
+                self.game_state.add_player(player_id)
+        for player_id in self.server.get_left_players():
+            print(f"Player {player_id} left! ({len(self.server.clients)} connected)")
+            if self.game_state:
+                self.game_state.remove_player(player_id)
+        
+        if self.game_state:
+            self.game_state.update(self.server, self.tick_interval)
+        # Publie les états reçus / simulés pendant ce tick, c'est cette version qui part dans les snapshots
+        self.server.swap_states()
+
+        # Les snapshots ont leur propre fréquence, indépendante du tick rate
+        self.snapshot_accumulator += self.tick_interval
+        if self.snapshot_accumulator >= self.snapshot_interval:
+            self.snapshot_accumulator -= self.snapshot_interval
+            self.server.broadcast_state()
+
+        self.tick_count += 1
+
+    def run(self):
+        # Boucle à pas fixe : on programme chaque tick à une date précise au lieu de dormir
+        # un temps fixe, comme ça le temps passé dans tick() ne décale pas la fréquence
+        self.running = True
+        next_tick = time.perf_counter()
+        try:
+            while self.running:
+                self.tick()
+                next_tick += self.tick_interval
+                delay = next_tick - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                elif -delay > MAX_TICK_LAG * self.tick_interval:
+                    next_tick = time.perf_counter()  # Trop en retard, on repart de maintenant
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.running = False
+            self.server.stop()
+            if self.game_state:
+                self.game_state.tilemap.close()
+
+
+def add_server_arguments(parser: argparse.ArgumentParser):
+    # Options communes à tous les serveurs (aussi utilisées par server/room_manager.py pour chaque salle)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=NETWORK_PORT)
+    parser.add_argument("--tick-rate", type=int, default=SERVER_TICK_RATE, help="server updates per second")
+    parser.add_argument("--snapshot-rate", type=int, default=SERVER_SNAPSHOT_RATE, help="snapshots sent per second")
+    parser.add_argument("--max-players", type=int, default=SERVER_MAX_PLAYERS)
+    parser.add_argument("--backend", choices=["asyncio", "threads"], default=NETWORK_SERVER_BACKEND)
+    parser.add_argument("--transport", choices=[t.value for t in Transport], default=NETWORK_TRANSPORT)
+    parser.add_argument("--codec", choices=[c.value for c in Codec], default=NETWORK_CODEC)
+    parser.add_argument("--authoritative", action=argparse.BooleanOptionalAction, default=SERVER_AUTHORITATIVE,
+                        help="simulate player inputs on the server (--no-authoritative: clients send their own state)")
+    parser.add_argument("--interest-radius", type=float, default=SERVER_INTEREST_RADIUS,
+                        help="only send players within this many pixels of each client (0: send everyone)")
+    parser.add_argument("--shared-memory", action=argparse.BooleanOptionalAction, default=NETWORK_SHARED_MEMORY,
+                        help="clients on this machine exchange states through shared memory instead of sockets")
+    parser.add_argument("--level", default=LEVEL_FILE,
+                        help="level file (.csv, .json, .tmj, .tmx or compiled .lvl), default: built-in test level")
+    parser.add_argument("--streaming", action=argparse.BooleanOptionalAction, default=LEVEL_STREAMING,
+                        help="only keep the level chunks around players in memory (for very large levels)")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Abyssal Ascension - dedicated server")
+    add_server_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def create_dedicated_server(args, port: Optional[int] = None) -> DedicatedServer:
+    # Crée le serveur (pas encore démarré) décrit par les options, sur port si donné (sinon args.port)
+    server_class = AsyncNetworkServer if args.backend == "asyncio" else NetworkServer
+    server = server_class(
+        host=args.host, port=args.port if port is None else port,
+        codec=Codec(args.codec), transport=Transport(args.transport),
+        max_players=args.max_players, authoritative=args.authoritative,
+        interest_radius=args.interest_radius or None, shared_memory=args.shared_memory
+    )
+    
+    game_state = None
+    if args.authoritative:
+        # Importé seulement ici : le mode relais n'a pas besoin de pygame du tout
+        from server.game_state import GameState
+        from world.level import load_tilemap
+        tilemap, spawn = load_tilemap(args.level, args.streaming)
+        game_state = GameState(tilemap, *(spawn or (100, 100)))
+    return DedicatedServer(server, args.tick_rate, args.snapshot_rate, game_state)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    dedicated = create_dedicated_server(args)
+    if not dedicated.server.start():
+        sys.exit(1)
+
+    print(f"Dedicated server listening on {args.host}:{args.port} "
+          f"({args.tick_rate} ticks/s, {args.snapshot_rate} snapshots/s, max {args.max_players} players)")
+    dedicated.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,13 @@ import os
 # Dimensions de la fenêtre
 WINDOW_WIDTH = 1500
 WINDOW_HEIGHT = 800
-FPS = 60
+FPS = 60  # Images par seconde max (0 = pas de limite)
+RENDER_VSYNC = False  # Calé sur le rafraîchissement de l'écran (remplace la limite FPS)
+
+# Simulation à pas fixe : le jeu avance toujours de 1 / SIM_RATE seconde par tick, quel que soit le nombre d'images
+# Les durées du joueur en "frames" (coyote time, dash...) sont des ticks de simulation, réglées pour 60
+SIM_RATE = 60
+MAX_SIM_STEPS = 5  # Ticks max rattrapés par image, au delà le jeu ralentit au lieu de geler (spirale de la mort)
 
 # Couleurs (R, G, B)
 BLACK = (0, 0, 0)
@@ -43,6 +49,13 @@ ENEMY_AGGRO_RANGE = 200
 
 # Taille des tiles (pour tilemap)
 TILE_SIZE = 32
+# Niveau à charger : .csv, .json, .tmj ou .tmx (compilé en .lvl à côté au premier chargement, voir world/level.py)
+# None = niveau de test intégré
+LEVEL_FILE = None
+LEVEL_STREAMING = False  # Pour les très grands niveaux : seuls les chunks autour des joueurs sont en mémoire
+# (la compilation aussi travaille par bandes de chunks, mais seule une source .csv n'est jamais lue en entier)
+CHUNK_LOAD_DISTANCE = 2  # En streaming, on charge les chunks à moins de N chunks d'un joueur
+CHUNK_UNLOAD_DISTANCE = 3  # et on les jette à plus de N chunks de tous les joueurs
 
 # Chemins vers les assets
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -54,6 +67,29 @@ FONTS_DIR = os.path.join(ASSETS_DIR, 'fonts')
 # Animation
 ANIMATION_SPEED = 0.15  # Vitesse par défaut des animations
 
+# Réseau
+NETWORK_PORT = 5555
+NETWORK_CODEC = "binary"  # "binary" (compact) ou "json" (lisible, pour debug)
+NETWORK_TRANSPORT = "udp"  # "udp" (états des joueurs en UDP, connexion en TCP) ou "tcp" (tout en TCP)
+NETWORK_SERVER_BACKEND = "asyncio"  # "asyncio" (un seul thread pour tous les clients) ou "threads" (un thread par client)
+NETWORK_SEND_RATE_MIN = 5  # Envois par seconde du client quand il ne bouge pas
+NETWORK_SEND_RATE_MAX = 60  # Envois par seconde du client pendant un dash / une chute rapide
+NETWORK_SEND_BUDGET = 8 * 1024  # Bytes/s max envoyés par un client
+NETWORK_SHARED_MEMORY = True  # Les clients sur la même machine que le serveur passent par la mémoire partagée
+NETWORK_CLIENT_PROCESS = False  # Le client réseau tourne dans son propre process (le réseau ne ralentit plus le rendu)
+NETWORK_ROOM = None  # Salle à rejoindre sur un serveur multi-salles ("" = n'importe laquelle, None = serveur simple)
+
+# Serveur dédié (server/server_main.py)
+SERVER_TICK_RATE = 60  # Mises à jour par seconde
+SERVER_SNAPSHOT_RATE = 20  # Snapshots envoyés aux clients par seconde
+SERVER_MAX_PLAYERS = 16
+SERVER_AUTHORITATIVE = True  # Le serveur simule les inputs des joueurs (sinon il relaie les états envoyés)
+SERVER_INTEREST_RADIUS = 1000  # Chaque client ne reçoit que les joueurs à moins de N pixels de lui (None = tous)
+
+# Serveur multi-salles (server/room_manager.py)
+SERVER_WORKERS = 0  # Process qui font tourner les salles (0 = un par coeur)
+SERVER_MAX_ROOMS = 64  # Salles ouvertes en même temps (sur les ports qui suivent NETWORK_PORT)
+
 # Camera
 CAMERA_SMOOTHING = 0.1  # Plus c'est petit, plus c'est smooth
 
@@ -0,0 +1,376 @@
+# Chargement des niveaux : les sources (CSV, JSON, Tiled) sont lues une seule fois et compilées
+# en un fichier binaire .lvl à côté de la source, qu'on ouvre ensuite en mmap
+# (pas de parsing, pas de liste Python par case : les tiles et les colliders sont lus tels quels dans le fichier)
+# Le .lvl est recompilé tout seul quand la source change
+import base64
+import csv
+import gzip
+import json
+import mmap
+import os
+import struct
+import sys
+import xml.etree.ElementTree as ElementTree
+import zlib
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import pygame
+
+from world.tilemap import TileMap, CHUNK_SIZE, TILE_SIZE, SOLID_TILES, merge_solid_tiles
+from world.streaming import StreamingTileMap
+
+COMPILED_EXTENSION = ".lvl"
+# Format du .lvl (little endian) :
+#   en-tête
+#   table des chunks : (premier collider, nombre de colliders) par chunk, ligne de chunks par ligne de chunks
+#   tiles : 1 byte par case, ligne par ligne (exactement TileMap.tiles)
+#   index des colliders : 2 bytes par case, ligne par ligne (exactement TileMap.collider_index)
+#   colliders : (x, y, largeur, hauteur) en pixels, rangés par chunk
+#   points de spawn : (x, y) en pixels
+#   métadonnées : JSON
+MAGIC = b"AALV"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIIHHIIQQ")
+CHUNK_ENTRY = struct.Struct("<II")
+COLLIDER = struct.Struct("<iiii")
+SPAWN = struct.Struct("<ff")
+
+
+class Level:
+    # Un niveau compilé, ouvert en mmap : rien n'est lu du disque tant qu'on ne le demande pas
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as file:
+            self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            (magic, version, self.tile_size, self.width, self.height, self.chunk_size, spawn_count,
+             collider_count, metadata_size, self.source_mtime, self.source_size) = HEADER.unpack_from(self.data)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"{path}: not a compiled level (version {VERSION})")
+
+            self.chunks_x = (self.width + self.chunk_size - 1) // self.chunk_size
+            self.chunks_y = (self.height + self.chunk_size - 1) // self.chunk_size
+            self.chunk_table_offset = HEADER.size
+            self.tiles_offset = self.chunk_table_offset + self.chunks_x * self.chunks_y * CHUNK_ENTRY.size
+            self.index_offset = self.tiles_offset + self.width * self.height
+            self.colliders_offset = self.index_offset + self.width * self.height * 2
+            self.collider_count = collider_count
+            spawns_offset = self.colliders_offset + collider_count * COLLIDER.size
+            metadata_offset = spawns_offset + spawn_count * SPAWN.size
+
+            self.spawns: List[Tuple[float, float]] = [
+                SPAWN.unpack_from(self.data, spawns_offset + i * SPAWN.size) for i in range(spawn_count)
+            ]
+            if len(self.data) < metadata_offset + metadata_size:
+                raise ValueError(f"{path}: truncated compiled level")
+            self.metadata: Dict = json.loads(self.data[metadata_offset:metadata_offset + metadata_size] or b"{}")
+        except (ValueError, struct.error):
+            # Fichier tronqué ou d'un autre format : on ne garde pas le mmap ouvert
+            self.data.close()
+            raise
+        self.file = None  # Pour read_chunk, ouvert au premier appel
+
+    @classmethod
+    def load(cls, source: str) -> 'Level':
+        # Ouvre le niveau compilé de source (un .csv, .json, .tmj, .tmx, ou directement un .lvl),
+        # en le compilant d'abord s'il n'existe pas ou si la source a changé depuis
+        if source.endswith(COMPILED_EXTENSION):
+            return cls(source)
+        compiled = os.path.splitext(source)[0] + COMPILED_EXTENSION
+        if not os.path.exists(source):
+            return cls(compiled)  # Distribué sans la source
+
+        stat = os.stat(source)
+        if os.path.exists(compiled):
+            try:
+                level = cls(compiled)
+                if (level.source_mtime, level.source_size, level.chunk_size) == (stat.st_mtime_ns, stat.st_size, CHUNK_SIZE):
+                    return level
+                level.close()
+            except (ValueError, struct.error):
+                pass  # Vieux format ou fichier tronqué, on recompile
+        compile_level(source, compiled)
+        return cls(compiled)
+
+    def close(self):
+        self.data.close()
+        if self.file is not None:
+            self.file.close()
+
+    @property
+    def spawn(self) -> Optional[Tuple[float, float]]:
+        # Premier point de spawn du niveau (None si la source n'en a pas)
+        return self.spawns[0] if self.spawns else None
+
+    def read_tiles(self) -> bytearray:
+        # Toutes les tiles, ligne par ligne (index = y * width + x), comme TileMap.tiles : une seule copie
+        return bytearray(self.data[self.tiles_offset:self.index_offset])
+
+    def read_collider_index(self) -> array:
+        # Comme TileMap.collider_index
+        index = array('h')
+        index.frombytes(self.data[self.index_offset:self.colliders_offset])
+        if sys.byteorder != "little":
+            index.byteswap()
+        return index
+
+    def read_colliders(self) -> Dict[Tuple[int, int], List[pygame.Rect]]:
+        # Les colliders fusionnés de chaque chunk, comme TileMap.chunk_colliders
+        end = self.colliders_offset + self.collider_count * COLLIDER.size
+        rects = [pygame.Rect(collider) for collider in COLLIDER.iter_unpack(self.data[self.colliders_offset:end])]
+        colliders = {}
+        for i, (first, count) in enumerate(CHUNK_ENTRY.iter_unpack(self.data[self.chunk_table_offset:self.tiles_offset])):
+            colliders[(i % self.chunks_x, i // self.chunks_x)] = rects[first:first + count]
+        return colliders
+
+    def read_chunk(self, chunk_x: int, chunk_y: int) -> Tuple[bytearray, array, List[pygame.Rect]]:
+        # Tiles, index des colliders (CHUNK_SIZE x CHUNK_SIZE, complétés au bord du niveau) et colliders d'un chunk
+        # Lu avec read() et pas dans le mmap : une lecture de fichier libère le GIL pendant qu'elle attend
+        # le disque, un défaut de page dans le mmap non (appelé depuis le thread de chargement de StreamingTileMap)
+        if self.file is None:
+            self.file = open(self.path, "rb")
+        size = self.chunk_size
+        left, top = chunk_x * size, chunk_y * size
+        columns = min(size, self.width - left)
+        tiles = bytearray(size * size)
+        index = array('h', [-1]) * (size * size)
+        line = array('h')
+        for row in range(min(size, self.height - top)):
+            cell = (top + row) * self.width + left
+            self.file.seek(self.tiles_offset + cell)
+            tiles[row * size:row * size + columns] = self.file.read(columns)
+            self.file.seek(self.index_offset + cell * 2)
+            del line[:]
+            line.frombytes(self.file.read(columns * 2))
+            if sys.byteorder != "little":
+                line.byteswap()
+            index[row * size:row * size + columns] = line
+
+        self.file.seek(self.chunk_table_offset + (chunk_y * self.chunks_x + chunk_x) * CHUNK_ENTRY.size)
+        first, count = CHUNK_ENTRY.unpack(self.file.read(CHUNK_ENTRY.size))
+        self.file.seek(self.colliders_offset + first * COLLIDER.size)
+        colliders = [pygame.Rect(collider) for collider in COLLIDER.iter_unpack(self.file.read(count * COLLIDER.size))]
+        return tiles, index, colliders
+
+
+def load_tilemap(source: Optional[str] = None,
+                 streaming: bool = False) -> Tuple[TileMap, Optional[Tuple[float, float]]]:
+    # Tilemap + point de spawn du niveau source (None = niveau de test intégré, sans spawn)
+    # streaming=True -> StreamingTileMap : seuls les chunks autour des joueurs sont chargés
+    # (le niveau reste ouvert, la fermer avec tilemap.close())
+    if source is None:
+        return TileMap(), None
+    level = Level.load(source)
+    if streaming:
+        tilemap = StreamingTileMap(level)
+        tilemap.preload([level.spawn or (0, 0)])
+        return tilemap, level.spawn
+    try:
+        return TileMap.from_level(level), level.spawn
+    finally:
+        level.close()
+
+
+def compile_level(source: str, compiled: str):
+    # Lit la source et écrit le .lvl (dans un fichier temporaire renommé à la fin : un autre process
+    # qui charge le même niveau en même temps ne voit jamais un fichier à moitié écrit)
+    # Le niveau est compilé par bandes de CHUNK_SIZE lignes (une ligne de chunks) : chaque partie du fichier
+    # est écrite à sa place au fur et à mesure, on n'a jamais tout le niveau en mémoire
+    # (sauf ce que read_source garde de la source : rien pour un .csv, tout le document pour du JSON / Tiled)
+    width, height, rows, tile_size, spawns, metadata = read_source(source)
+    if not width or not height:
+        raise ValueError(f"{source}: empty level")
+    stat = os.stat(source)
+    metadata_bytes = json.dumps(metadata).encode()
+
+    chunks_x = (width + CHUNK_SIZE - 1) // CHUNK_SIZE
+    tiles_offset = HEADER.size + chunks_x * ((height + CHUNK_SIZE - 1) // CHUNK_SIZE) * CHUNK_ENTRY.size
+    index_offset = tiles_offset + width * height
+    colliders_offset = index_offset + width * height * 2
+    collider_count = 0
+    temporary = f"{compiled}.{os.getpid()}.tmp"
+    try:
+        with open(temporary, "wb") as file:
+            for chunk_y, strip in enumerate(_strips(source, rows, width, height)):
+                # Même fusion que TileMap._build_chunk_colliders, sur la bande au lieu de tout le niveau
+                strip_height = len(strip) // width
+                solid = strip.translate(SOLID_TILES)
+                collider_index = array('h', [-1]) * len(strip)
+                chunk_table = bytearray()
+                colliders = bytearray()
+                first_collider = collider_count
+                for chunk_x in range(chunks_x):
+                    left = chunk_x * CHUNK_SIZE
+                    chunk_colliders = merge_solid_tiles(
+                        solid, collider_index, width, tile_size, left, 0, min(width, left + CHUNK_SIZE), strip_height,
+                        origin=(0, chunk_y * CHUNK_SIZE * tile_size)
+                    )
+                    chunk_table += CHUNK_ENTRY.pack(collider_count, len(chunk_colliders))
+                    for collider in chunk_colliders:
+                        colliders += COLLIDER.pack(collider.x, collider.y, collider.width, collider.height)
+                    collider_count += len(chunk_colliders)
+                if sys.byteorder != "little":
+                    collider_index.byteswap()
+
+                first_cell = chunk_y * CHUNK_SIZE * width
+                file.seek(HEADER.size + chunk_y * chunks_x * CHUNK_ENTRY.size)
+                file.write(chunk_table)
+                file.seek(tiles_offset + first_cell)
+                file.write(strip)
+                file.seek(index_offset + first_cell * 2)
+                file.write(collider_index.tobytes())
+                file.seek(colliders_offset + first_collider * COLLIDER.size)
+                file.write(colliders)
+
+            file.seek(colliders_offset + collider_count * COLLIDER.size)
+            for x, y in spawns:
+                file.write(SPAWN.pack(x, y))
+            file.write(metadata_bytes)
+            file.seek(0)
+            file.write(HEADER.pack(
+                MAGIC, VERSION, tile_size, width, height, CHUNK_SIZE, len(spawns),
+                collider_count, len(metadata_bytes), stat.st_mtime_ns, stat.st_size
+            ))
+        os.replace(temporary, compiled)
+    except BaseException:
+        # Pas de fichier temporaire orphelin si la compilation échoue
+        try:
+            os.remove(temporary)
+        except OSError:
+            pass
+        raise
+
+
+def _strips(source: str, rows: Iterable[List[int]], width: int, height: int) -> Iterator[bytearray]:
+    # Regroupe les lignes de tiles par CHUNK_SIZE (la dernière bande peut être plus petite)
+    strip = bytearray()
+    count = 0
+    for row in rows:
+        if len(row) != width:
+            raise ValueError(f"{source}: row {count + 1} has {len(row)} tiles, expected {width}")
+        strip += bytes(row)
+        count += 1
+        if count % CHUNK_SIZE == 0:
+            yield strip
+            strip = bytearray()
+    if count != height:
+        raise ValueError(f"{source}: {count} rows, expected {height}")
+    if strip:
+        yield strip
+
+
+def read_source(source: str) -> Tuple[int, int, Iterable[List[int]], int, List[Tuple[float, float]], Dict]:
+    # Lit une source de niveau -> (largeur, hauteur, tiles ligne par ligne, taille des tiles, spawns en pixels,
+    # métadonnées). Les lignes sont données une par une, à parcourir une seule fois
+    # .csv : une ligne de tiles par ligne (0 = vide, 1 = solide), lu deux fois (taille, puis tiles)
+    #        sans jamais garder plus d'une ligne : c'est le format pour les niveaux qui ne tiennent pas en mémoire
+    # .json : {"tiles": [[...]], "tile_size": 32, "spawns": [[x, y]], "metadata": {...}},
+    #         ou une map Tiled exportée en JSON (reconnue à son champ "layers")
+    # .tmj : map Tiled en JSON, .tmx : map Tiled en XML (calques en CSV ou en base64, compressés ou non)
+    # Les formats JSON et Tiled sont lus en entier (json / ElementTree ne savent pas lire un document par morceaux)
+    extension = os.path.splitext(source)[1].lower()
+    if extension == ".csv":
+        width = height = 0
+        with open(source, newline="") as file:
+            for row in csv.reader(file):
+                if row:
+                    width = width or len(row)
+                    height += 1
+        return width, height, _read_csv_rows(source), TILE_SIZE, [], {}
+    if extension in (".json", ".tmj"):
+        with open(source) as file:
+            data = json.load(file)
+        if "layers" in data:
+            return _read_tiled_json(source, data)
+        tiles = data["tiles"]
+        return (len(tiles[0]) if tiles else 0, len(tiles), tiles, data.get("tile_size", TILE_SIZE),
+                [tuple(spawn) for spawn in data.get("spawns", [])], data.get("metadata", {}))
+    if extension == ".tmx":
+        return _read_tiled_xml(source)
+    raise ValueError(f"{source}: unknown level format")
+
+
+def _read_csv_rows(source: str) -> Iterator[List[int]]:
+    with open(source, newline="") as file:
+        for row in csv.reader(file):
+            if row:
+                yield [int(tile) for tile in row]
+
+
+def _read_tiled_json(source: str, data: Dict) -> Tuple[int, int, Iterable[List[int]], int, List[Tuple[float, float]], Dict]:
+    # Map Tiled : le premier calque de tiles donne le niveau (toute tile non vide est solide),
+    # les objets de type / nom "spawn" donnent les points de spawn, les propriétés de la map les métadonnées
+    width = data["width"]
+    layer = next(layer for layer in data["layers"] if layer["type"] == "tilelayer")
+    if data.get("infinite") or "data" not in layer:
+        raise ValueError(f"{source}: infinite Tiled maps are not supported")
+    if layer.get("encoding") == "base64":
+        gids = _decode_tiled_base64(source, layer["data"], layer.get("compression", ""))
+    elif layer.get("encoding", "csv") == "csv":
+        gids = layer["data"]
+    else:
+        raise ValueError(f"{source}: unknown Tiled layer encoding {layer['encoding']!r}")
+    rows = _tiled_rows(source, gids, width, data["height"])
+    spawns = [
+        (obj["x"], obj["y"])
+        for group in data["layers"] if group["type"] == "objectgroup"
+        for obj in group["objects"] if "spawn" in (obj.get("type"), obj.get("class"), obj.get("name"))
+    ]
+    metadata = {prop["name"]: prop["value"] for prop in data.get("properties", [])}
+    return width, data["height"], rows, data["tilewidth"], spawns, metadata
+
+
+def _read_tiled_xml(source: str) -> Tuple[int, int, Iterable[List[int]], int, List[Tuple[float, float]], Dict]:
+    # Même chose que _read_tiled_json pour le format .tmx (sans pytmx)
+    root = ElementTree.parse(source).getroot()
+    if root.get("infinite") == "1":
+        raise ValueError(f"{source}: infinite Tiled maps are not supported")
+    layer_data = root.find("layer/data")
+    if layer_data is None:
+        raise ValueError(f"{source}: no tile layer")
+    encoding = layer_data.get("encoding")
+    if encoding == "csv":
+        gids = [int(gid) for gid in layer_data.text.replace("\n", "").split(",") if gid.strip()]
+    elif encoding == "base64":
+        gids = _decode_tiled_base64(source, layer_data.text.strip(), layer_data.get("compression", ""))
+    else:
+        raise ValueError(f"{source}: only CSV or base64 Tiled layers are supported")
+    width, height = int(root.get("width")), int(root.get("height"))
+    rows = _tiled_rows(source, gids, width, height)
+    spawns = [
+        (float(obj.get("x")), float(obj.get("y")))
+        for obj in root.iter("object") if "spawn" in (obj.get("type"), obj.get("class"), obj.get("name"))
+    ]
+    metadata = {prop.get("name"): prop.get("value") for prop in root.findall("properties/property")}
+    return width, height, rows, int(root.get("tilewidth")), spawns, metadata
+
+
+def _decode_tiled_base64(source: str, text: str, compression: str) -> array:
+    # Calque Tiled en base64 : un uint32 little endian par case (le gid, avec les bits de retournement en haut),
+    # compressé ou non avec zlib / gzip (zstd demanderait une dépendance en plus)
+    raw = base64.b64decode(text)
+    if compression == "zlib":
+        raw = zlib.decompress(raw)
+    elif compression == "gzip":
+        raw = gzip.decompress(raw)
+    elif compression:
+        raise ValueError(f"{source}: unsupported Tiled layer compression {compression!r}")
+    if len(raw) % 4:
+        raise ValueError(f"{source}: truncated Tiled layer")
+    gids = array('I')
+    if gids.itemsize != 4:
+        gids = array('L')
+    gids.frombytes(raw)
+    if sys.byteorder != "little":
+        gids.byteswap()
+    return gids
+
+
+def _tiled_rows(source: str, gids, width: int, height: int) -> Iterator[List[int]]:
+    # gids du calque -> lignes de tiles du niveau (toute tile non vide est solide),
+    # en vérifiant qu'il y en a bien width x height
+    if len(gids) != width * height:
+        raise ValueError(f"{source}: Tiled layer has {len(gids)} tiles, expected {width} x {height}")
+    return ([1 if gid else 0 for gid in gids[y * width:(y + 1) * width]] for y in range(height))
@@ -0,0 +1,51 @@
+from typing import Dict, Hashable, List, Set, Tuple
+
+
+class SpatialGrid:
+    # Grille de cases carrées pour retrouver vite ce qui est proche d'un point
+    # Au lieu de comparer chaque objet avec tous les autres (N²), on ne regarde que les cases autour
+
+    def __init__(self, cell_size: float):
+        # cell_size = taille d'une case en pixels (idéalement proche du rayon des recherches)
+        self.cell_size = cell_size
+        self.cells: Dict[Tuple[int, int], List[Hashable]] = {}  # {(colonne, ligne): [objets]}
+        self.positions: Dict[Hashable, Tuple[float, float]] = {}  # {objet: (x, y)}
+
+    def _cell(self, x: float, y: float) -> Tuple[int, int]:
+        return int(x // self.cell_size), int(y // self.cell_size)
+
+    def clear(self):
+        self.cells.clear()
+        self.positions.clear()
+
+    def insert(self, key: Hashable, x: float, y: float):
+        # Ajoute un objet à la position (x, y), une clé ne doit être ajoutée qu'une fois
+        self.cells.setdefault(self._cell(x, y), []).append(key)
+        self.positions[key] = (x, y)
+
+    def query(self, x: float, y: float, radius: float) -> Set[Hashable]:
+        # Retourne tous les objets à moins de radius pixels de (x, y)
+        min_col, min_row = self._cell(x - radius, y - radius)
+        max_col, max_row = self._cell(x + radius, y + radius)
+        radius_sq = radius * radius
+        found = set()
+        for col in range(min_col, max_col + 1):
+            for row in range(min_row, max_row + 1):
+                for key in self.cells.get((col, row), ()):
+                    key_x, key_y = self.positions[key]
+                    if (key_x - x) ** 2 + (key_y - y) ** 2 <= radius_sq:
+                        found.add(key)
+        return found
+
+    def query_rect(self, left: float, top: float, right: float, bottom: float) -> Set[Hashable]:
+        # Retourne tous les objets dont la position est dans le rectangle [left, right] x [top, bottom]
+        min_col, min_row = self._cell(left, top)
+        max_col, max_row = self._cell(right, bottom)
+        found = set()
+        for col in range(min_col, max_col + 1):
+            for row in range(min_row, max_row + 1):
+                for key in self.cells.get((col, row), ()):
+                    key_x, key_y = self.positions[key]
+                    if left <= key_x <= right and top <= key_y <= bottom:
+                        found.add(key)
+        return found
@@ -0,0 +1,238 @@
+# Niveaux en streaming, pour les niveaux trop grands pour être gardés entiers en mémoire :
+# seuls les chunks autour des joueurs sont chargés. Un thread les lit dans le .lvl (world/level.py)
+# quand un joueur s'approche, et ils sont jetés quand plus aucun joueur n'est à côté
+# La boucle de jeu ne touche jamais au disque : elle demande des chunks (update_focus) et installe
+# ceux que le thread a fini de lire
+import queue
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Set, Tuple
+
+import pygame
+
+from world.tilemap import TileMap, CHUNK_SIZE, SOLID_TILES, BACKGROUND_COLOR, merge_solid_tiles
+
+if TYPE_CHECKING:
+    from world.level import Level
+
+try:
+    from settings import CHUNK_LOAD_DISTANCE, CHUNK_UNLOAD_DISTANCE
+except ImportError:
+    CHUNK_LOAD_DISTANCE = 2
+    CHUNK_UNLOAD_DISTANCE = 3
+
+# Un chunk pas encore chargé est considéré comme plein : on bute dessus au lieu de tomber à travers
+UNLOADED_TILE = 1
+# Temps max (secondes) qu'on attend les chunks du spawn avant de lancer la partie quand même
+PRELOAD_TIMEOUT = 10.0
+
+
+class _Chunk:
+    # Un chunk chargé (grilles de CHUNK_SIZE x CHUNK_SIZE cases, ligne par ligne)
+
+    def __init__(self, tiles: bytearray, collider_index: array, colliders: List[pygame.Rect]):
+        self.tiles = tiles
+        self.solid = tiles.translate(SOLID_TILES)
+        self.collider_index = collider_index
+        self.colliders = colliders
+
+
+class StreamingTileMap(TileMap):
+    # Même interface que TileMap (collisions, set_tile, draw), mais les chunks arrivent et partent
+    # selon les positions données à update_focus, à appeler une fois par tick
+
+    def __init__(self, level: 'Level', load_distance: int = CHUNK_LOAD_DISTANCE,
+                 unload_distance: int = CHUNK_UNLOAD_DISTANCE):
+        # load_distance = on charge les chunks à moins de N chunks d'un joueur
+        # unload_distance = on les jette à plus de N chunks de tous les joueurs (plus grand, pour ne pas
+        # charger / jeter en boucle un chunk quand un joueur fait des allers-retours sur une bordure)
+        if level.chunk_size != CHUNK_SIZE:
+            raise ValueError(f"{level.path}: compiled with {level.chunk_size}-tile chunks, expected {CHUNK_SIZE}")
+        self.level = level
+        self.tile_size = level.tile_size
+        self.width = level.width
+        self.height = level.height
+        self.load_distance = load_distance
+        self.unload_distance = max(unload_distance, load_distance)
+        self.chunks_x = level.chunks_x
+        self.chunks_y = level.chunks_y
+
+        self.chunks: Dict[Tuple[int, int], _Chunk] = {}
+        # Tiles changées par set_tile, par chunk : réappliquées quand le chunk est rechargé depuis le disque
+        self.edits: Dict[Tuple[int, int], Dict[Tuple[int, int], int]] = {}
+        self.requested: Set[Tuple[int, int]] = set()  # Demandés au thread, pas encore installés
+        self.failed: Set[Tuple[int, int]] = set()  # Illisibles, on ne redemande pas
+        self.keep: Set[Tuple[int, int]] = set()  # Chunks à moins de unload_distance d'un joueur
+        self.chunk_surfaces: 'OrderedDict[Tuple[int, int], pygame.Surface]' = OrderedDict()
+
+        self.requests: 'queue.Queue[Optional[Tuple[int, int]]]' = queue.Queue()
+        self.loaded: queue.Queue = queue.Queue()  # (chunk, données lues ou None si erreur)
+        self.thread = threading.Thread(target=self._load_chunks, daemon=True)
+        self.thread.start()
+
+    def _load_chunks(self):
+        # Thread de chargement : le seul à lire le fichier du niveau
+        while True:
+            key = self.requests.get()
+            if key is None:
+                return
+            try:
+                self.loaded.put((key, self.level.read_chunk(*key)))
+            except Exception as e:
+                # Toute erreur (fichier tronqué, struct.error...) : le chunk est marqué illisible,
+                # le thread doit survivre sinon les chunks demandés n'arriveraient jamais
+                print("Level error:", e)
+                self.loaded.put((key, None))
+
+    def close(self):
+        # Arrête le thread et ferme le fichier du niveau
+        self.requests.put(None)
+        self.thread.join(timeout=2)
+        self.level.close()
+
+    def preload(self, points: Iterable[Tuple[float, float]], timeout: float = PRELOAD_TIMEOUT):
+        # Charge tout de suite (en attendant le thread, au plus timeout secondes) les chunks autour de points
+        # Pour le spawn, avant que la partie commence : pas pendant la boucle de jeu
+        # Les chunks pas arrivés à temps seront installés par update_focus quand le thread les aura lus
+        self.update_focus(points)
+        deadline = time.monotonic() + timeout
+        while self.requested:
+            try:
+                self._install(*self.loaded.get(timeout=max(0.0, deadline - time.monotonic())))
+            except queue.Empty:
+                print(f"Level error: {len(self.requested)} chunks still loading after {timeout} s")
+                return
+
+    def update_focus(self, points: Iterable[Tuple[float, float]]):
+        # points = positions des joueurs (pixels) : installe les chunks lus par le thread,
+        # jette ceux qui sont trop loin de tout le monde et demande ceux qui manquent (les plus proches d'abord)
+        chunk_pixels = CHUNK_SIZE * self.tile_size
+        centers = [(int(x // chunk_pixels), int(y // chunk_pixels)) for x, y in points]
+        self.keep = self._chunks_around(centers, self.unload_distance)
+
+        while True:
+            try:
+                self._install(*self.loaded.get_nowait())
+            except queue.Empty:
+                break
+
+        for key in [key for key in self.chunks if key not in self.keep]:
+            del self.chunks[key]
+            self.chunk_surfaces.pop(key, None)
+
+        missing = self._chunks_around(centers, self.load_distance) - self.chunks.keys() - self.requested - self.failed
+        for key in sorted(missing, key=lambda key: min(
+                max(abs(key[0] - x), abs(key[1] - y)) for x, y in centers)):
+            self.requested.add(key)
+            self.requests.put(key)
+
+    def _chunks_around(self, centers: List[Tuple[int, int]], distance: int) -> Set[Tuple[int, int]]:
+        # Chunks du niveau à moins de distance chunks (en carré) d'un des centres
+        chunks = set()
+        for center_x, center_y in centers:
+            for chunk_y in range(max(0, center_y - distance), min(self.chunks_y, center_y + distance + 1)):
+                for chunk_x in range(max(0, center_x - distance), min(self.chunks_x, center_x + distance + 1)):
+                    chunks.add((chunk_x, chunk_y))
+        return chunks
+
+    def _install(self, key: Tuple[int, int], data):
+        # Met en place un chunk lu par le thread (s'il sert encore)
+        self.requested.discard(key)
+        if data is None:
+            self.failed.add(key)
+            return
+        if key not in self.keep:
+            return  # Le joueur est reparti entre temps
+        chunk = _Chunk(*data)
+        self.chunks[key] = chunk
+        edits = self.edits.get(key)
+        if edits:
+            for (x, y), tile in edits.items():
+                chunk.tiles[y * CHUNK_SIZE + x] = tile
+                chunk.solid[y * CHUNK_SIZE + x] = SOLID_TILES[tile]
+            self._build_chunk_colliders(*key)
+
+    def _build_chunk_colliders(self, chunk_x: int, chunk_y: int):
+        chunk = self.chunks[(chunk_x, chunk_y)]
+        chunk.colliders = merge_solid_tiles(
+            chunk.solid, chunk.collider_index, CHUNK_SIZE, self.tile_size,
+            0, 0, min(CHUNK_SIZE, self.width - chunk_x * CHUNK_SIZE), min(CHUNK_SIZE, self.height - chunk_y * CHUNK_SIZE),
+            origin=(chunk_x * CHUNK_SIZE * self.tile_size, chunk_y * CHUNK_SIZE * self.tile_size)
+        )
+
+    def _chunk_rect(self, chunk_x: int, chunk_y: int) -> pygame.Rect:
+        # Rectangle (pixels) d'un chunk, coupé au bord du niveau
+        left, top = chunk_x * CHUNK_SIZE, chunk_y * CHUNK_SIZE
+        return pygame.Rect(
+            left * self.tile_size, top * self.tile_size,
+            (min(self.width, left + CHUNK_SIZE) - left) * self.tile_size,
+            (min(self.height, top + CHUNK_SIZE) - top) * self.tile_size
+        )
+
+    def get_colliders(self) -> List[pygame.Rect]:
+        # Colliders des chunks chargés seulement
+        return [collider for chunk in self.chunks.values() for collider in chunk.colliders]
+
+    def get_tile(self, x: int, y: int) -> int:
+        chunk = self.chunks.get((x // CHUNK_SIZE, y // CHUNK_SIZE))
+        if chunk is None:
+            return UNLOADED_TILE
+        return chunk.tiles[y % CHUNK_SIZE * CHUNK_SIZE + x % CHUNK_SIZE]
+
+    def set_tile(self, x: int, y: int, tile: int):
+        # Comme TileMap.set_tile, le changement est gardé même si le chunk est déchargé puis rechargé
+        key = (x // CHUNK_SIZE, y // CHUNK_SIZE)
+        local_x, local_y = x % CHUNK_SIZE, y % CHUNK_SIZE
+        self.edits.setdefault(key, {})[(local_x, local_y)] = tile
+        chunk = self.chunks.get(key)
+        if chunk is None or chunk.tiles[local_y * CHUNK_SIZE + local_x] == tile:
+            return
+        chunk.tiles[local_y * CHUNK_SIZE + local_x] = tile
+        chunk.solid[local_y * CHUNK_SIZE + local_x] = SOLID_TILES[tile]
+        self._build_chunk_colliders(*key)
+
+        surface = self.chunk_surfaces.get(key)
+        if surface is not None:
+            self._draw_tile(surface, local_x * self.tile_size, local_y * self.tile_size, SOLID_TILES[tile])
+
+    def _cells(self, rect: pygame.Rect):
+        # Cases du niveau sous rect : (x, y, chunk ou None s'il n'est pas chargé, index de la case dans le chunk)
+        size = self.tile_size
+        for y in range(max(0, rect.top // size), min(self.height, (rect.bottom - 1) // size + 1)):
+            for x in range(max(0, rect.left // size), min(self.width, (rect.right - 1) // size + 1)):
+                chunk = self.chunks.get((x // CHUNK_SIZE, y // CHUNK_SIZE))
+                yield x, y, chunk, y % CHUNK_SIZE * CHUNK_SIZE + x % CHUNK_SIZE
+
+    def colliders_overlapping(self, rect: pygame.Rect) -> List[pygame.Rect]:
+        colliders = []
+        for x, y, chunk, cell in self._cells(rect):
+            if chunk is None:
+                collider = self._chunk_rect(x // CHUNK_SIZE, y // CHUNK_SIZE)
+            elif chunk.collider_index[cell] != -1:
+                collider = chunk.colliders[chunk.collider_index[cell]]
+            else:
+                continue
+            if collider not in colliders:
+                colliders.append(collider)
+        return colliders
+
+    def overlaps_solid(self, rect: pygame.Rect) -> bool:
+        return any(chunk is None or chunk.solid[cell] for _, _, chunk, cell in self._cells(rect))
+
+    def _render_chunk(self, chunk_x: int, chunk_y: int) -> Optional[pygame.Surface]:
+        # Comme TileMap._render_chunk, None si le chunk n'est pas chargé (on ne dessine rien à sa place)
+        chunk = self.chunks.get((chunk_x, chunk_y))
+        if chunk is None:
+            return None
+        rect = self._chunk_rect(chunk_x, chunk_y)
+        surface = pygame.Surface(rect.size)
+        if pygame.display.get_surface() is not None:
+            surface = surface.convert()
+        surface.fill(BACKGROUND_COLOR)
+        for y in range(rect.height // self.tile_size):
+            for x in range(rect.width // self.tile_size):
+                if chunk.solid[y * CHUNK_SIZE + x]:
+                    self._draw_tile(surface, x * self.tile_size, y * self.tile_size, True)
+        return surface
@@ -1,36 +1,82 @@
 import pygame
-from typing import List, Tuple
+from array import array
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, Iterable, List, Tuple
 
 try:
     from settings import TILE_SIZE
 except ImportError:
     TILE_SIZE = 32
 
+if TYPE_CHECKING:
+    from world.level import Level
+
+# Le niveau est découpé en chunks de CHUNK_SIZE x CHUNK_SIZE tiles
+# Les colliders sont fusionnés chunk par chunk : modifier une tile ne recalcule que son chunk
+CHUNK_SIZE = 16
+# Nombre max de chunks gardés dessinés en mémoire (les moins récemment affichés sont jetés)
+# Un chunk de 16 x 16 tiles de 32 px = 512 x 512 px, l'écran en montre une douzaine à la fois
+CHUNK_CACHE_SIZE = 32
+# Couleurs des tiles
+BACKGROUND_COLOR = (20, 20, 30)
+TILE_COLOR = (100, 100, 100)
+TILE_BORDER_COLOR = (150, 150, 150)
+# Type de tile -> 1 si solide, pour construire la grille d'occupation d'un coup (bytes.translate)
+SOLID_TILES = bytes(1 if tile == 1 else 0 for tile in range(256))
+
 
 class TileMap:    
     def __init__(self, level_data: List[List[int]] = None, tile_size: int = TILE_SIZE):
         # Initilise un tilemap à partir de données
         # level_data: Données 2D du niveau (0 = vide, 1 = solide)
         # tile_size: Taille des tiles en pixels
-        self.tile_size = tile_size
-        
         if level_data is None:
             # Créer un niveau par défaut
             level_data = self._create_default_level()
         
-        self.level_data = level_data
-        self.height = len(level_data)
-        self.width = len(level_data[0]) if level_data else 0
+        width = len(level_data[0]) if level_data else 0
+        self._setup(width, len(level_data), bytearray(tile for row in level_data for tile in row), tile_size)
+    
+    @classmethod
+    def from_level(cls, level: 'Level') -> 'TileMap':
+        # Tilemap d'un niveau compilé (world/level.py) : les tiles et les colliders sont copiés tels quels
+        # depuis le fichier, sans repasser par des listes Python ni refaire la fusion des colliders
+        tilemap = cls.__new__(cls)
+        if level.chunk_size == CHUNK_SIZE:
+            tilemap._setup(level.width, level.height, level.read_tiles(), level.tile_size,
+                           level.read_colliders(), level.read_collider_index())
+        else:
+            # Des colliders fusionnés avec une autre taille de chunk ne peuvent pas servir, on les refait
+            tilemap._setup(level.width, level.height, level.read_tiles(), level.tile_size)
+        return tilemap
+    
+    def _setup(self, width: int, height: int, tiles: bytearray, tile_size: int,
+               chunk_colliders: Dict[Tuple[int, int], List[pygame.Rect]] = None, collider_index: array = None):
+        # tiles = type de chaque case, ligne par ligne (index = y * width + x)
+        # chunk_colliders + collider_index = colliders déjà fusionnés (sinon on les calcule)
+        self.tile_size = tile_size
+        self.width = width
+        self.height = height
+        self.tiles = tiles
+        # Grille d'occupation : 1 byte par case (1 = solide), dans le même ordre que tiles
+        # C'est ce qu'utilisent les collisions, pour ne regarder que les quelques cases sous une entité
+        self.solid = tiles.translate(SOLID_TILES)
         
-        # Créer une surface contenant le rendu du tilemap
-        self.image = pygame.Surface((
-            self.width * self.tile_size,
-            self.height * self.tile_size
-        ))
-        self.image.fill((20, 20, 30))  # Fond sombre
+        # Colliders : les tiles solides voisines fusionnées en grands rectangles (voir _build_chunk_colliders)
+        # collider_index donne pour chaque case l'index de son rectangle dans la liste de son chunk (-1 = vide)
+        if chunk_colliders is not None:
+            self.chunk_colliders = chunk_colliders
+            self.collider_index = collider_index
+        else:
+            self.chunk_colliders: Dict[Tuple[int, int], List[pygame.Rect]] = {}
+            self.collider_index = array('h', [-1]) * (self.width * self.height)
+            for chunk_y in range((self.height + CHUNK_SIZE - 1) // CHUNK_SIZE):
+                for chunk_x in range((self.width + CHUNK_SIZE - 1) // CHUNK_SIZE):
+                    self._build_chunk_colliders(chunk_x, chunk_y)
         
-        # Dessiner tous les tiles
-        self._draw_tiles()
+        # Rendu : une surface par chunk, dessinée seulement quand le chunk passe à l'écran (voir draw)
+        # Une seule surface pour tout le niveau prendrait une mémoire proportionnelle à sa taille
+        self.chunk_surfaces: 'OrderedDict[Tuple[int, int], pygame.Surface]' = OrderedDict()
     
     def _create_default_level(self) -> List[List[int]]:
         # Créer un niveau de test par défaut
@@ -58,44 +104,159 @@ class TileMap:
             level.append(row)
         return level
     
-    def _draw_tiles(self):
-        # Dessine tous les tiles solides sur l'image du tilemap
-        for y, row in enumerate(self.level_data):
-            for x, tile in enumerate(row):
-                if tile == 1:  # Tile solide
-                    rect = pygame.Rect(
-                        x * self.tile_size,
-                        y * self.tile_size,
-                        self.tile_size,
-                        self.tile_size
-                    )
-                    # Remplir le tile avec couleur grise
-                    pygame.draw.rect(self.image, (100, 100, 100), rect)
-                    # Ajouter une bordure claire pour visibilité
-                    pygame.draw.rect(self.image, (150, 150, 150), rect, 2)
+    def _render_chunk(self, chunk_x: int, chunk_y: int) -> pygame.Surface:
+        # Dessine les tiles d'un chunk sur une nouvelle surface (fond sombre + tiles solides)
+        chunk_pixels = CHUNK_SIZE * self.tile_size
+        left, top = chunk_x * CHUNK_SIZE, chunk_y * CHUNK_SIZE
+        right, bottom = min(self.width, left + CHUNK_SIZE), min(self.height, top + CHUNK_SIZE)
+        surface = pygame.Surface(((right - left) * self.tile_size, (bottom - top) * self.tile_size))
+        if pygame.display.get_surface() is not None:
+            surface = surface.convert()  # Même format que l'écran, le blit est plus rapide
+        surface.fill(BACKGROUND_COLOR)
+        for y in range(top, bottom):
+            for x in range(left, right):
+                if self.solid[y * self.width + x]:
+                    self._draw_tile(surface, x * self.tile_size - chunk_x * chunk_pixels,
+                                    y * self.tile_size - chunk_y * chunk_pixels, True)
+        return surface
+    
+    def _draw_tile(self, surface: pygame.Surface, x: int, y: int, solid: bool):
+        # Dessine une tile à la position (x, y) de surface
+        rect = pygame.Rect(x, y, self.tile_size, self.tile_size)
+        surface.fill(BACKGROUND_COLOR, rect)
+        if solid:
+            # Remplir le tile avec couleur grise
+            pygame.draw.rect(surface, TILE_COLOR, rect)
+            # Ajouter une bordure claire pour visibilité
+            pygame.draw.rect(surface, TILE_BORDER_COLOR, rect, 2)
     
     def get_colliders(self) -> List[pygame.Rect]:
-        # Retourne la liste des rectangles de collision pour les tiles solides
-        colliders = []
-        
-        for y, row in enumerate(self.level_data):
-            for x, tile in enumerate(row):
-                if tile == 1:  # Tile solide
-                    rect = pygame.Rect(
-                        x * self.tile_size,
-                        y * self.tile_size,
-                        self.tile_size,
-                        self.tile_size
-                    )
-                    colliders.append(rect)
+        # Retourne la liste des rectangles de collision (les tiles solides fusionnées, chunk par chunk)
+        return [collider for colliders in self.chunk_colliders.values() for collider in colliders]
+    
+    def get_tile(self, x: int, y: int) -> int:
+        return self.tiles[y * self.width + x]
+    
+    def set_tile(self, x: int, y: int, tile: int):
+        # Change une tile (casser / poser un bloc) : met à jour le rendu, la grille et les colliders de son chunk
+        if self.tiles[y * self.width + x] == tile:
+            return
+        self.tiles[y * self.width + x] = tile
+        self.solid[y * self.width + x] = 1 if tile == 1 else 0
+        self._build_chunk_colliders(x // CHUNK_SIZE, y // CHUNK_SIZE)
         
+        # Si le chunk est déjà dessiné on redessine juste cette tile (sinon il le sera quand il s'affichera)
+        surface = self.chunk_surfaces.get((x // CHUNK_SIZE, y // CHUNK_SIZE))
+        if surface is not None:
+            self._draw_tile(surface, x % CHUNK_SIZE * self.tile_size, y % CHUNK_SIZE * self.tile_size, tile == 1)
+    
+    def _build_chunk_colliders(self, chunk_x: int, chunk_y: int):
+        # (Re)fusionne les colliders d'un chunk, dans la grille de tout le niveau
+        left, top = chunk_x * CHUNK_SIZE, chunk_y * CHUNK_SIZE
+        self.chunk_colliders[(chunk_x, chunk_y)] = merge_solid_tiles(
+            self.solid, self.collider_index, self.width, self.tile_size,
+            left, top, min(self.width, left + CHUNK_SIZE), min(self.height, top + CHUNK_SIZE)
+        )
+    
+    def colliders_overlapping(self, rect: pygame.Rect) -> List[pygame.Rect]:
+        # Retourne les colliders (fusionnés) qui touchent rect, chacun une seule fois
+        # On ne parcourt que les cases sous rect : le coût ne dépend pas de la taille du niveau
+        colliders = []
+        size = self.tile_size
+        for y in range(max(0, rect.top // size), min(self.height, (rect.bottom - 1) // size + 1)):
+            start = y * self.width
+            for x in range(max(0, rect.left // size), min(self.width, (rect.right - 1) // size + 1)):
+                index = self.collider_index[start + x]
+                if index != -1:
+                    collider = self.chunk_colliders[(x // CHUNK_SIZE, y // CHUNK_SIZE)][index]
+                    if collider not in colliders:
+                        colliders.append(collider)
         return colliders
     
+    def overlaps_solid(self, rect: pygame.Rect) -> bool:
+        # Vrai si rect touche au moins une tile solide (sans créer les rectangles)
+        size = self.tile_size
+        for y in range(max(0, rect.top // size), min(self.height, (rect.bottom - 1) // size + 1)):
+            start = y * self.width
+            for x in range(max(0, rect.left // size), min(self.width, (rect.right - 1) // size + 1)):
+                if self.solid[start + x]:
+                    return True
+        return False
+    
+    def update_focus(self, points: Iterable[Tuple[float, float]]):
+        # Positions des joueurs, à donner une fois par tick : sert aux niveaux en streaming
+        # (world/streaming.py), ici tout le niveau est déjà en mémoire
+        pass
+    
+    def close(self):
+        pass
+    
     def get_size(self) -> Tuple[int, int]:
         # Retourne la taille totale du tilemap en pixels
         return (self.width * self.tile_size, self.height * self.tile_size)
     
     def draw(self, surface: pygame.Surface, offset: Tuple[float, float] = (0, 0)):
-        # Dessine le tilemap sur une surface
-        rect = self.image.get_rect(topleft=offset)
-        surface.blit(self.image, rect)
+        # Dessine le tilemap sur une surface, offset = décalage de la caméra (comme pour les entités)
+        # Seuls les chunks visibles sont dessinés, le coût dépend de la taille de l'écran, pas du niveau
+        chunk_pixels = CHUNK_SIZE * self.tile_size
+        offset = (int(offset[0]), int(offset[1]))  # Tous les chunks décalés pareil, sans trou entre eux
+        view_left, view_top = -offset[0], -offset[1]
+        first_x, first_y = max(0, int(view_left // chunk_pixels)), max(0, int(view_top // chunk_pixels))
+        last_x = min((self.width - 1) // CHUNK_SIZE, int((view_left + surface.get_width()) // chunk_pixels))
+        last_y = min((self.height - 1) // CHUNK_SIZE, int((view_top + surface.get_height()) // chunk_pixels))
+        
+        for chunk_y in range(first_y, last_y + 1):
+            for chunk_x in range(first_x, last_x + 1):
+                key = (chunk_x, chunk_y)
+                chunk = self.chunk_surfaces.get(key)
+                if chunk is None:
+                    chunk = self._render_chunk(chunk_x, chunk_y)
+                    if chunk is None:
+                        continue  # Pas encore chargé (StreamingTileMap)
+                    self.chunk_surfaces[key] = chunk
+                    if len(self.chunk_surfaces) > CHUNK_CACHE_SIZE:
+                        self.chunk_surfaces.popitem(last=False)  # Le moins récemment affiché
+                else:
+                    self.chunk_surfaces.move_to_end(key)
+                surface.blit(chunk, (chunk_x * chunk_pixels + offset[0], chunk_y * chunk_pixels + offset[1]))
+
+
+def merge_solid_tiles(solid: bytearray, index: array, width: int, tile_size: int,
+                      left: int, top: int, right: int, bottom: int,
+                      origin: Tuple[int, int] = (0, 0)) -> List[pygame.Rect]:
+    # Fusionne les tiles solides de la zone [left, right[ x [top, bottom[ en rectangles (greedy meshing) :
+    # ligne par ligne, chaque case solide pas encore prise démarre un rectangle qu'on étend d'abord
+    # vers la droite tant que c'est solide, puis vers le bas tant que toute la ligne du dessous l'est
+    # Le sol du niveau par défaut passe de ~80 tiles à quelques rectangles
+    # solid / index = grilles de largeur width (index est rempli avec le numéro du rectangle de chaque case),
+    # origin = position en pixels de la case (0, 0) de ces grilles
+    for y in range(top, bottom):
+        index[y * width + left:y * width + right] = array('h', [-1]) * (right - left)
+    
+    def is_free_span(start: int, end: int) -> bool:
+        # Vrai si les cases [start, end[ sont toutes solides et pas encore dans un rectangle
+        return 0 not in solid[start:end] and index[start:end].count(-1) == end - start
+    
+    colliders = []
+    for y in range(top, bottom):
+        x = left
+        while x < right:
+            cell = y * width + x
+            if not solid[cell] or index[cell] != -1:
+                x += 1
+                continue
+            end = x + 1
+            while end < right and solid[y * width + end] and index[y * width + end] == -1:
+                end += 1
+            last = y + 1
+            while last < bottom and is_free_span(last * width + x, last * width + end):
+                last += 1
+            
+            for row in range(y, last):
+                index[row * width + x:row * width + end] = array('h', [len(colliders)]) * (end - x)
+            colliders.append(pygame.Rect(
+                origin[0] + x * tile_size, origin[1] + y * tile_size,
+                (end - x) * tile_size, (last - y) * tile_size
+            ))
+            x = end
+    return colliders